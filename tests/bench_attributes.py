@@ -0,0 +1,27 @@
+#!/usr/bin/env python2
+"""Measure the cost of checking attribute names during element construction.
+
+Run this directly; it prints the time per constructed element with checking
+off and on, and the relative overhead.
+"""
+
+import timeit
+
+SETUP = """
+import xmlcomposer
+from xmlcomposer.formats import html5
+xmlcomposer.Element.check_attributes = %s
+"""
+
+STATEMENT = "html5.A('link', href='/index.html', class_='nav', id_='home')"
+
+def measure(checked, number=100000, repeat=5):
+    timer = timeit.Timer(STATEMENT, SETUP % checked)
+    return min(timer.repeat(repeat, number)) / number
+
+if __name__ == '__main__':
+    unchecked = measure(False)
+    checked = measure(True)
+    print 'unchecked: %.2f usec per element' % (unchecked * 1e6)
+    print 'checked:   %.2f usec per element' % (checked * 1e6)
+    print 'overhead:  %.1f%%' % ((checked - unchecked) / unchecked * 100)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python2
+"""Measure the throughput of serving a large page through a WSGI server.
+
+Run this directly; it serves a page of many short lines with the wsgiref
+server, once with the generator from generate() as the response body and
+once with a StreamingResponse, and prints the time per request and the
+throughput of each.
+"""
+
+import httplib
+import threading
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import xmlcomposer
+from xmlcomposer import wsgi
+
+class Page(xmlcomposer.Element): pass
+class Item(xmlcomposer.Element): pass
+
+PAGE = xmlcomposer.Document(Page(*[
+    Item('Item number %d' % n) for n in range(20000)
+    ]))
+SIZE = len(PAGE.render())
+
+def by_line(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/html')])
+    return PAGE.generate()
+
+def coalesced(environ, start_response):
+    return wsgi.respond(start_response, PAGE)
+
+
+class QuietHandler(WSGIRequestHandler):
+    
+    def log_message(self, *args):
+        pass
+
+
+def measure(app, requests=20):
+    server = make_server('127.0.0.1', 0, app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        start = time.time()
+        for n in range(requests):
+            connection = httplib.HTTPConnection(*server.server_address)
+            connection.request('GET', '/')
+            assert len(connection.getresponse().read()) == SIZE
+            connection.close()
+        return (time.time() - start) / requests
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+if __name__ == '__main__':
+    for name, app in (('by line', by_line), ('coalesced', coalesced)):
+        seconds = measure(app)
+        print '%-10s %7.2f ms per request, %6.1f MB/s' % (
+            name, seconds * 1000, SIZE / seconds / 1e6
+            )
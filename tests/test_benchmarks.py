@@ -0,0 +1,86 @@
+#!/usr/bin/env python2
+"""Unit tests for the benchmark suite.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from xmlcomposer import benchmarks
+from xmlcomposer.benchmarks import baselines
+
+
+class TestBenchmarks(unittest.TestCase):
+    
+    def test_every_benchmark_runs(self):
+        # A single operation of each, to catch benchmarks that have broken.
+        for name in benchmarks.names():
+            operation = benchmarks.BENCHMARKS[name]()
+            operation()
+    
+    def test_run(self):
+        results = benchmarks.run(
+            ['construct.wide', 'layout.call'], 0.001, 1, isolate=False
+            )
+        assert [r['name'] for r in results] == ['construct.wide', 'layout.call']
+        for result in results:
+            assert result['ops_per_sec'] > 0
+            assert result['group'] == result['name'].split('.')[0]
+        # The tree of 1000 items, each with its contents list.
+        assert results[0]['objects'] >= 2000
+    
+    def test_isolated(self):
+        result, = benchmarks.run(['layout.wrap'], 0.001, 1)
+        assert result['name'] == 'layout.wrap'
+        if benchmarks.resource is not None:
+            assert result['peak_kb'] > 0
+    
+    def test_save_and_compare(self):
+        export_dir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(export_dir, 'results.json')
+            old = [
+                {'name': 'a', 'ops_per_sec': 100.0, 'memory_kb': 100},
+                {'name': 'b', 'ops_per_sec': 100.0, 'memory_kb': 100},
+                {'name': 'c', 'ops_per_sec': 100.0, 'memory_kb': 100},
+                ]
+            benchmarks.save(old, file_name)
+            assert benchmarks.load(file_name) == old
+        finally:
+            shutil.rmtree(export_dir)
+        new = [
+            {'name': 'a', 'ops_per_sec': 95.0, 'memory_kb': 100},
+            {'name': 'b', 'ops_per_sec': 120.0, 'memory_kb': 5000},
+            {'name': 'c', 'ops_per_sec': 50.0, 'memory_kb': 100},
+            {'name': 'd', 'ops_per_sec': 10.0, 'memory_kb': 100},
+            ]
+        rows = benchmarks.compare(old, new)
+        assert [(row[0], row[4]) for row in rows] == [
+            ('a', False), ('b', True), ('c', True),
+            ]
+    
+    
+    def test_baselines_equivalent(self):
+        # The tools make the same table, byte for byte.
+        outputs = set()
+        for tool in baselines.TOOLS:
+            operation = benchmarks.BENCHMARKS['baseline.table.' + tool]()
+            outputs.add(operation())
+        assert len(outputs) == 1
+    
+    def test_side_by_side(self):
+        results = [
+            {'name': 'baseline.table.sax', 'ops_per_sec': 30.0,
+                'memory_kb': None},
+            {'name': 'baseline.table.xmlcomposer', 'ops_per_sec': 20.0,
+                'memory_kb': None},
+            ]
+        assert baselines.side_by_side(results) == [
+            ('table', 'xmlcomposer', 20.0, 1.0, None),
+            ('table', 'sax', 30.0, 1.5, None),
+            ]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python2
+"""Unit tests for fragment caching.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+
+import xmlcomposer
+
+class Menu(xmlcomposer.Element): pass
+class Entry(xmlcomposer.Element): pass
+
+
+class DictStore(object):
+    """A minimal stand-in for a shared store, such as memcached.
+    """
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(repr(key))
+    
+    def set(self, key, value, ttl=None):
+        self.data[repr(key)] = value
+
+
+class TestFragmentCache(unittest.TestCase):
+    
+    def test_lru_eviction(self):
+        cache = xmlcomposer.FragmentCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+    
+    def test_expiry(self):
+        cache = xmlcomposer.FragmentCache(default_ttl=0.05)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=60)
+        assert cache.get('a') == 1
+        time.sleep(0.1)
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        stats = cache.stats()
+        assert stats['expirations'] == 1
+        assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+class TestCachedBlocks(unittest.TestCase):
+    
+    def setUp(self):
+        self.store = xmlcomposer.FragmentCache()
+        self.calls = []
+    
+    def menu(self, **kwargs):
+        def entries(session):
+            self.calls.append(session['locale'])
+            return Entry('Home (%s)' % session['locale'])
+        return Menu(xmlcomposer.CallBack(entries, Entry)).cache(
+            'menu', key=lambda session: session['locale'], store=self.store,
+            **kwargs
+            )
+    
+    def test_keyed_by_session(self):
+        menu = self.menu()
+        page = xmlcomposer.Document(menu)
+        english = page.render(session={'locale': 'en', 'user': 1})
+        assert page.render(session={'locale': 'en', 'user': 2}) == english
+        french = page.render(session={'locale': 'fr', 'user': 1})
+        assert 'Home (fr)' in french
+        assert self.calls == ['en', 'fr']
+        assert (self.store.hits, self.store.misses) == (1, 2)
+    
+    def test_keyed_by_layout_and_scope(self):
+        menu = self.menu()
+        session = {'locale': 'en'}
+        default = menu.render(session=session)
+        minimal = menu.render(xmlcomposer.MINIMAL_LAYOUT, session=session)
+        assert default != minimal
+        assert minimal == '<menu><entry>Home (en)</entry></menu>'
+        assert menu.render(session=session) == default
+        assert len(self.calls) == 2
+    
+    def test_ttl(self):
+        menu = self.menu(ttl=0.05)
+        menu.render(session={'locale': 'en'})
+        time.sleep(0.1)
+        menu.render(session={'locale': 'en'})
+        assert self.calls == ['en', 'en']
+    
+    def test_pluggable_store(self):
+        shared = DictStore()
+        first = Menu(Entry('Static')).cache('menu', store=shared)
+        second = Menu(Entry('Changed')).cache('menu', store=shared)
+        assert first.render() == second.render()
+    
+    def test_rebuilt_blocks(self):
+        # Blocks built for each request share output by name, and blocks
+        # under other names never get it, even once the first is dropped.
+        def build(text, name):
+            return Menu(Entry(text)).cache(name, store=self.store)
+        for n in range(3):
+            assert 'Home' in build('Home', 'home').render()
+        assert (self.store.hits, self.store.misses) == (2, 1)
+        for n in range(20):
+            text = 'Request %d' % n
+            assert text in build(text, 'request-%d' % n).render()
+        self.assertRaises(TypeError, Menu().cache)
+
+
+class TestTemplateCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = xmlcomposer.TemplateCache(check_interval=0)
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+    
+    def text(self, path):
+        return str(xmlcomposer.Template(path, cache=self.cache))
+    
+    def test_shared_lines(self):
+        path = self.write('page.xml', '<p>%NAME%</p>')
+        first = xmlcomposer.Template(path, cache=self.cache)
+        second = xmlcomposer.Template(
+            os.path.relpath(path), cache=self.cache
+            )
+        assert first._contents is second._contents
+        assert self.cache.stats()['hits'] == 1
+        
+        name = xmlcomposer.PCData('Bob')
+        first.substitute('%NAME%', lambda session: name)
+        second.substitute('%NAME%', lambda session: name)
+        assert first.render() == second.render() == '<p>Bob</p>\n'
+        assert first.plan() is second.plan()
+    
+    def test_reload_on_change(self):
+        path = self.write('page.xml', '<p>Old</p>', mtime=1000)
+        assert self.text(path) == '<p>Old</p>'
+        self.write('page.xml', '<p>New</p>', mtime=2000)
+        assert self.text(path) == '<p>New</p>'
+        assert self.cache.stats()['reloads'] == 1
+    
+    def test_same_size_and_mtime(self):
+        path = self.write('page.xml', '<p>Old</p>', mtime=1000)
+        assert self.text(path) == '<p>Old</p>'
+        # A rewrite that keeps the size and mtime still changes the ctime,
+        # and one renamed into place has a new inode.
+        time.sleep(0.01)
+        self.write('page.xml', '<p>New</p>', mtime=1000)
+        assert self.text(path) == '<p>New</p>'
+        other = self.write('other.xml', '<p>Now</p>')
+        os.utime(other, (1000, 1000))
+        os.rename(other, path)
+        assert self.text(path) == '<p>Now</p>'
+    
+    def test_opt_in(self):
+        path = self.write('page.xml', '<p>Old</p>')
+        default = xmlcomposer.DEFAULT_TEMPLATE_CACHE
+        misses = default.stats()['misses']
+        assert str(xmlcomposer.Template(path)) == '<p>Old</p>'
+        self.write('page.xml', '<p>New</p>')
+        assert str(xmlcomposer.Template(path)) == '<p>New</p>'
+        assert default.stats()['misses'] == misses
+        xmlcomposer.Template(path, cache=True)
+        assert default.stats()['misses'] == misses + 1
+    
+    def test_check_interval(self):
+        self.cache.check_interval = 60
+        path = self.write('page.xml', '<p>Old</p>', mtime=1000)
+        xmlcomposer.Template(path, cache=self.cache)
+        self.write('page.xml', '<p>New</p>', mtime=2000)
+        # The change is not noticed until the file is checked again.
+        assert self.text(path) == '<p>Old</p>'
+        self.cache.check_interval = 0
+        assert self.text(path) == '<p>New</p>'
+    
+    def test_bounded(self):
+        cache = xmlcomposer.TemplateCache(max_entries=3, max_bytes=25)
+        paths = [self.write('%d.xml' % n, 'x' * 10) for n in range(4)]
+        for path in paths:
+            cache.load(path)
+        stats = cache.stats()
+        assert (stats['entries'], stats['bytes']) == (2, 20)
+        assert stats['evictions'] == 2
+        cache.load(paths[3])
+        assert cache.stats()['hits'] == 1
+    
+    def test_uncached(self):
+        path = self.write('page.xml', '<p>Hello</p>')
+        template = xmlcomposer.Template(path, cache=False)
+        assert str(template) == '<p>Hello</p>'
+        assert len(self.cache) == 0
+    
+    def test_mapped(self):
+        text = ''.join('<p>Line %d of %%NAME%%</p>\n' % n for n in range(1000))
+        path = self.write('big.xml', text + '<p>End</p>')
+        name = xmlcomposer.PCData('Bob')
+        templates = []
+        for n in range(2):
+            template = xmlcomposer.Template(
+                path, iterator=True, cache=self.cache
+                )
+            template.substitute('%NAME%', lambda session: name)
+            templates.append(template)
+        assert templates[0]._file is templates[1]._file
+        assert templates[0]._file.lines is None
+        assert self.cache.stats()['bytes'] == 0
+        
+        expected = xmlcomposer.Template(path, cache=False)
+        expected.substitute('%NAME%', lambda session: name)
+        expected = expected.render()
+        assert '<p>Line 999 of Bob</p>' in expected
+        for template in templates:
+            assert template.render() == expected
+        
+        pool = ThreadPool(8)
+        try:
+            outputs = pool.map(lambda n: templates[n % 2].render(), range(16))
+        finally:
+            pool.terminate()
+        assert outputs == [expected] * 16
+    
+    def test_mapped_shared_by_default(self):
+        path = self.write('big.xml', '<p>Big</p>\n' * 100)
+        first = xmlcomposer.Template(path, iterator=True)
+        second = xmlcomposer.Template(path, iterator=True)
+        assert first._file is second._file
+        assert first._file.data is not None
+        unshared = xmlcomposer.Template(path, iterator=True, cache=False)
+        assert unshared._file is not first._file
+        assert str(first) == str(unshared)
+    
+    def test_mapped_empty_file(self):
+        path = self.write('empty.xml', '')
+        template = xmlcomposer.Template(path, iterator=True, cache=False)
+        assert template.render() == ''
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -92,7 +92,93 @@ class TestElementInternalMethods(unittest.TestCase):
         e = Empty(class_='test')
         expected = '<empty class="test"/>\n'
         assert e.render() == expected
+
+
+class TestAttributeChecking(unittest.TestCase):
+    """Demonstrate that permitted attribute names are enforced on request.
+    """
+    def setUp(self):
+        class Link(xmlcomposer.Element):
+            allowed_attributes = frozenset(['href', 'class'])
+        self.Link = Link
+    
+    def test_unchecked_by_default(self):
+        assert self.Link(hre='x').format_attributes() == ' hre="x"'
+    
+    def test_checked(self):
+        self.Link.check_attributes = True
+        self.Link(href='x', class_='y')['xmlns:x'] = 'urn:x'
+        self.assertRaises(KeyError, self.Link, clas_='y')
+        link = self.Link()
+        self.assertRaises(KeyError, link.__setitem__, 'hre', 'x')
+    
+    def test_checked_globally(self):
+        from xmlcomposer.formats import html5
+        xmlcomposer.Element.check_attributes = True
+        try:
+            a = html5.A(href='x', class_='y')
+            a['data-id'] = '1'
+            self.assertRaises(KeyError, html5.A, clas_='y')
+            # Elements without a set of permitted names are not checked.
+            html5.Svg(viewBox='0 0 10 10')
+        finally:
+            xmlcomposer.Element.check_attributes = False
+
+
+class TestFootprint(unittest.TestCase):
     
+    def setUp(self):
+        class Page(xmlcomposer.Element): pass
+        class Item(xmlcomposer.Element): pass
+        self.Page = Page
+        self.Item = Item
+    
+    def test_counts(self):
+        def lookup(session):
+            return xmlcomposer.PCData('Not counted')
+        page = xmlcomposer.Document(
+            xmlcomposer.DocType('page'),
+            self.Page(
+                self.Item('A & B', class_='first'),
+                xmlcomposer.PCData('Hi %NAME%').substitute(
+                    '%NAME%', xmlcomposer.CallBack(lookup)
+                    ),
+                ),
+            )
+        footprint = page.footprint()
+        assert footprint['nodes'] == 7
+        assert footprint['classes'] == {
+            'Document': 1, 'DocType': 1, 'Page': 1, 'Item': 1, 'PCData': 2,
+            'CallBack': 1,
+            }
+        assert footprint['text_bytes'] == (
+            len('<!DOCTYPE page>') + len('A &amp; B') + len('Hi %NAME%')
+            + len('%NAME%')
+            )
+        assert footprint['attribute_bytes'] == len('class') + len('first')
+    
+    def test_shared_counted_once(self):
+        item = self.Item('Shared text')
+        once = self.Page(item).footprint()
+        twice = self.Page(item, item).footprint()
+        assert once['nodes'] == twice['nodes'] == 3
+        assert once['text_bytes'] == twice['text_bytes']
+    
+    def test_estimated_bytes_grow(self):
+        small = self.Page(self.Item('x')).footprint()
+        large = self.Page(*[self.Item('x' * 100) for n in range(100)])
+        large = large.footprint()
+        assert small['estimated_bytes'] > 0
+        assert large['estimated_bytes'] > 100 * 100
+        assert large['estimated_bytes'] > 50 * small['estimated_bytes']
+    
+    def test_deep_tree(self):
+        node = self.Item('Leaf')
+        for depth in range(5000):
+            node = self.Item(node)
+        assert node.footprint()['nodes'] == 5002
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -1,11 +1,22 @@
 
+import BaseHTTPServer
+import gzip
 import os
+import shutil
+import SocketServer
 import tempfile
+import threading
 import unittest
 
 import xmlcomposer
 import xmlcomposer.export as export
 
+class Page(xmlcomposer.Element): pass
+
+def greeting(session):
+    return xmlcomposer.PCData('Hello %s!' % session)
+
+
 class TestExport(unittest.TestCase):
     
     def test_export_to_file(self):
@@ -35,3 +46,538 @@ class TestExport(unittest.TestCase):
                 os.remove(backup_name)
 
 
+class TestToFiles(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def jobs(self, count=20):
+        jobs = []
+        for n in range(count):
+            path = os.path.join(self.dir, 'sub%d' % (n % 3), 'page%d.xml' % n)
+            page = Page(xmlcomposer.CallBack(greeting, xmlcomposer.PCData))
+            jobs.append((page, path, {'session': n}))
+        return jobs
+    
+    def check(self, results, count=20):
+        assert len(results) == count
+        for file_name, status, seconds, error in results:
+            assert (status, error) == ('exported', None)
+        for n in range(count):
+            path = os.path.join(self.dir, 'sub%d' % (n % 3), 'page%d.xml' % n)
+            with open(path) as f:
+                assert f.read() == '<page>Hello %d!</page>\n' % n
+    
+    def test_pool(self):
+        reported = []
+        results = export.to_files(self.jobs(), 2, report=reported.append)
+        self.check(results)
+        assert sorted(reported) == sorted(results)
+    
+    def test_group_sync(self):
+        self.check(export.to_files(self.jobs(), 2, group_sync=True))
+        # No temporary files are left behind.
+        for dir_path, dir_names, file_names in os.walk(self.dir):
+            assert all(name.endswith('.xml') for name in file_names)
+    
+    def group_sync(self, report=None):
+        # Returns the results, and how many files and filesystems were
+        # flushed.
+        counts = {'fsync': 0, 'syncfs': 0}
+        fsync, syncfs = os.fsync, export._syncfs
+        def counting(name, sync):
+            def counting_sync(fileno):
+                counts[name] += 1
+                return sync(fileno)
+            return counting_sync
+        os.fsync = counting('fsync', fsync)
+        if syncfs is not None:
+            export._syncfs = counting('syncfs', syncfs)
+        try:
+            results = export.to_files(
+                self.jobs(5), 0, group_sync=True, report=report
+                )
+        finally:
+            os.fsync, export._syncfs = fsync, syncfs
+        return results, counts['fsync'], counts['syncfs']
+    
+    def test_group_sync_progress(self):
+        # Each file is reported as it is written, then once it is in place.
+        reported = []
+        def report(result):
+            if result[1] == 'written':
+                assert not os.path.exists(result[0])
+            reported.append(result[:2])
+        results, synced, filesystems = self.group_sync(report)
+        self.check(results, 5)
+        statuses = [status for file_name, status in reported]
+        assert statuses == ['written'] * 5 + ['exported'] * 5
+        if export._syncfs is not None:
+            # One flush of the filesystem, and one of each directory.
+            assert (filesystems, synced) == (1, 3)
+    
+    def test_group_sync_without_syncfs(self):
+        syncfs = export._syncfs
+        export._syncfs = None
+        try:
+            results, synced, filesystems = self.group_sync()
+        finally:
+            export._syncfs = syncfs
+        self.check(results, 5)
+        # A flush of each file, then one of each directory.
+        assert (filesystems, synced) == (0, 5 + 3)
+    
+    def test_in_process(self):
+        unpicklable = Page(xmlcomposer.CallBack(
+            lambda session: xmlcomposer.PCData('Hello %s!' % session),
+            xmlcomposer.PCData,
+            ))
+        jobs = self.jobs(3)
+        jobs[1] = (unpicklable,) + jobs[1][1:]
+        results = export.to_files(jobs, 0, group_sync=True)
+        self.check(results, 3)
+    
+    def test_errors(self):
+        jobs = self.jobs(5)
+        unpicklable = Page(xmlcomposer.CallBack(lambda session: None))
+        jobs[1] = (unpicklable, jobs[1][1], None)
+        # Rendering fails, since the CallBack returns a string.
+        jobs[3] = (Page(xmlcomposer.CallBack(str)), jobs[3][1], None)
+        results = dict((r[0], r) for r in export.to_files(jobs, 2))
+        assert len(results) == 5
+        file_name, status, seconds, error = results[jobs[1][1]]
+        assert status == 'failed' and 'pickled' in error
+        assert results[jobs[3][1]][1] == 'failed'
+        assert not os.path.exists(jobs[3][1])
+        assert [r[1] for r in results.values()].count('exported') == 3
+
+
+class TestUnchanged(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.dir, 'page.xml')
+        self.backup_name = self.file_name + '.bak'
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def write(self, text, **kwargs):
+        return export.to_file(
+            [text], self.file_name, self.backup_name, **kwargs
+            )
+    
+    def test_same_output_skipped(self):
+        assert self.write('<p>One</p>')
+        os.utime(self.file_name, (1000, 1000))
+        assert not self.write('<p>One</p>')
+        assert os.path.getmtime(self.file_name) == 1000
+        assert not os.path.exists(self.backup_name)
+        assert os.listdir(self.dir) == ['page.xml']
+        assert self.write('<p>Two</p>')
+        with open(self.backup_name) as f:
+            assert f.read() == '<p>One</p>'
+    
+    def test_metrics(self):
+        metrics = xmlcomposer.Metrics(caches={}).enable()
+        try:
+            self.write('<p>One</p>')
+            self.write('<p>One</p>')
+        finally:
+            metrics.disable()
+        snapshot = metrics.snapshot()
+        assert snapshot['exports'] == {'written': 1, 'unchanged': 1}
+        assert snapshot['export_seconds']['count'] == 2
+    
+    def test_gzip_sidecar(self):
+        text = '<p>%s</p>' % ('Compressible text. ' * 100)
+        assert self.write(text, gzip_level=9)
+        with open(self.file_name) as f:
+            assert f.read() == text
+        gzip_name = self.file_name + '.gz'
+        with open(gzip_name, 'rb') as f:
+            compressed = f.read()
+        assert len(compressed) < len(text) / 10
+        assert gzip.GzipFile(gzip_name).read() == text
+        assert sorted(os.listdir(self.dir)) == ['page.xml', 'page.xml.gz']
+        
+        # An unchanged file keeps its sidecar.
+        os.utime(gzip_name, (1000, 1000))
+        assert not self.write(text, gzip_level=9)
+        assert os.path.getmtime(gzip_name) == 1000
+        
+        # A small output needs no sidecar, and a stale one is removed.
+        assert self.write('<p/>', gzip_level=9)
+        assert not os.path.exists(gzip_name)
+        assert not os.path.exists(self.backup_name + '.gz')
+    
+    def test_gzip_batch(self):
+        text = 'x' * 2000
+        jobs = [
+            (xmlcomposer.PCData(text), self.file_name, {'gzip_level': 1}),
+            (xmlcomposer.PCData('small'), self.file_name + '2',
+                {'gzip_level': 1, 'gzip_min_size': 10}),
+            ]
+        for group_sync in (False, True):
+            export.to_files(jobs, 0, group_sync)
+            assert gzip.GzipFile(self.file_name + '.gz').read() == text + '\n'
+            assert not os.path.exists(self.file_name + '2.gz')
+            assert len(os.listdir(self.dir)) == 3
+    
+    def test_manifest(self):
+        manifest = export.Manifest(os.path.join(self.dir, 'manifest.json'))
+        assert self.write('<p>One</p>', manifest=manifest)
+        manifest.save()
+        manifest = export.Manifest(manifest.file_name)
+        # The manifest is trusted over the file itself.
+        with open(self.file_name, 'w') as f:
+            f.write('<p>Edited</p>')
+        assert not self.write('<p>One</p>', manifest=manifest)
+        assert self.write('<p>Two</p>', manifest=manifest)
+    
+    def test_batch(self):
+        manifest = export.Manifest(os.path.join(self.dir, 'manifest.json'))
+        def jobs(text):
+            return [
+                (xmlcomposer.PCData(text % n), self.file_name + str(n), None)
+                for n in range(4)
+                ]
+        results = export.to_files(jobs('%d'), 2, manifest=manifest)
+        assert [r[1] for r in results] == ['exported'] * 4
+        for group_sync in (False, True):
+            manifest = export.Manifest(manifest.file_name)
+            results = export.to_files(
+                jobs('%d'), 2, group_sync, manifest=manifest
+                )
+            assert [r[1] for r in results] == ['unchanged'] * 4
+        results = export.to_files(jobs('%d!'), 0, True, manifest=manifest)
+        assert [r[1] for r in results] == ['exported'] * 4
+        assert len(os.listdir(self.dir)) == 5
+
+
+class Urlset(xmlcomposer.Element): pass
+class Url(xmlcomposer.Element): pass
+
+
+class TestToParts(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pattern = os.path.join(self.dir, 'part%d.xml')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def read(self, file_name):
+        with open(file_name) as f:
+            return f.read()
+    
+    def test_max_bytes(self):
+        urls = (Url('/%04d' % n) for n in range(100))
+        parts = export.to_parts(Urlset(), urls, self.pattern, max_bytes=200)
+        assert len(parts) > 1
+        texts = [self.read(part) for part in parts]
+        assert all(len(text) <= 200 for text in texts)
+        assert all(text.startswith('<urlset>\n') for text in texts)
+        assert all(text.endswith('</urlset>\n') for text in texts)
+        assert sum(text.count('<url>') for text in texts) == 100
+        assert '/0000' in texts[0] and '/0099' in texts[-1]
+    
+    def test_oversized_child(self):
+        urls = [Url('short'), Url('x' * 500), Url('short')]
+        parts = export.to_parts(Urlset(), urls, self.pattern, max_bytes=100)
+        assert len(parts) == 3
+        assert 'x' * 500 in self.read(parts[1])
+    
+    def test_empty(self):
+        parts = export.to_parts(Urlset(), [], self.pattern, max_items=10)
+        assert len(parts) == 1
+        assert self.read(parts[0]) == '<urlset>\n</urlset>\n'
+    
+    def test_stale_parts_removed(self):
+        urls = [Url(str(n)) for n in range(6)]
+        export.to_parts(Urlset(), urls, self.pattern, max_items=2)
+        parts = export.to_parts(Urlset(), urls[:3], self.pattern, max_items=2)
+        assert sorted(os.listdir(self.dir)) == ['part1.xml', 'part2.xml']
+    
+    def test_custom_index(self):
+        index_name = os.path.join(self.dir, 'index.txt')
+        def make_index(names):
+            return xmlcomposer.PCData(names)
+        urls = [Url(str(n)) for n in range(3)]
+        export.to_parts(
+            Urlset(), urls, self.pattern, max_items=1,
+            index_name=index_name, make_index=make_index,
+            )
+        assert self.read(index_name) == 'part1.xml\npart2.xml\npart3.xml\n'
+
+
+class TestBuild(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.record = os.path.join(self.dir, 'build.json')
+        self.header = os.path.join(self.dir, 'header.xml')
+        self.write(self.header, '<header/>')
+        self.renders = []
+        self.versions = {}
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def write(self, file_name, text, mtime=1000):
+        with open(file_name, 'w') as f:
+            f.write(text)
+        os.utime(file_name, (mtime, mtime))
+    
+    def page(self, n, header=True):
+        def make():
+            self.renders.append(n)
+            names = xmlcomposer.Loader(lambda keys, session: keys, 'names')
+            contents = [xmlcomposer.BatchCallBack(names, 'name%d' % n)]
+            if header:
+                contents.insert(
+                    0, xmlcomposer.Template(self.header, cache=False)
+                    )
+            return Page(*contents)
+        return make
+    
+    def build(self, pages=3):
+        build = export.Build(self.record, data={'names': self.versions.get})
+        statuses = [
+            build.export(self.page(n, n != 0), os.path.join(self.dir, '%d' % n))
+            for n in range(pages)
+            ]
+        build.save()
+        return statuses
+    
+    def test_template_change(self):
+        assert self.build() == ['exported'] * 3
+        assert self.build() == ['skipped'] * 3
+        del self.renders[:]
+        self.write(self.header, '<header>New</header>', 2000)
+        assert self.build() == ['skipped', 'exported', 'exported']
+        assert self.renders == [1, 2]
+        with open(os.path.join(self.dir, '2')) as f:
+            assert '<header>New</header>' in f.read()
+    
+    def test_cached_fragment(self):
+        footer_name = os.path.join(self.dir, 'footer.xml')
+        self.write(footer_name, '<footer/>')
+        store = xmlcomposer.FragmentCache()
+        def page(n):
+            def make():
+                footer = xmlcomposer.Template(footer_name, cache=False)
+                return Page(str(n), footer.cache('footer', store=store))
+            return make
+        def build():
+            build = export.Build(self.record)
+            statuses = [
+                build.export(page(n), os.path.join(self.dir, '%d' % n))
+                for n in range(2)
+                ]
+            build.save()
+            return statuses
+        assert build() == ['exported'] * 2
+        # The second page used the cached footer, but still depends on it.
+        assert build() == ['skipped'] * 2
+        self.write(footer_name, '<footer>New</footer>', 2000)
+        store.clear()
+        assert build() == ['exported'] * 2
+        with open(os.path.join(self.dir, '1')) as f:
+            assert '<footer>New</footer>' in f.read()
+    
+    def test_data_change(self):
+        self.versions['name1'] = 1
+        self.build()
+        self.versions['name1'] = 2
+        assert self.build() == ['skipped', 'unchanged', 'skipped']
+    
+    def test_tuple_data_key(self):
+        versions = {('user', 1): 'r1'}
+        loader = xmlcomposer.Loader(lambda keys, session: keys, 'users')
+        file_name = os.path.join(self.dir, 'page')
+        def build():
+            build = export.Build(self.record, data={'users': versions.get})
+            status = build.export(
+                Page(xmlcomposer.BatchCallBack(loader, ('user', 1))), file_name
+                )
+            build.save()
+            return status
+        assert build() == 'exported'
+        # The key is read back from the record as a list.
+        assert build() == 'skipped'
+        versions[('user', 1)] = 'r2'
+        assert build() == 'unchanged'
+    
+    def test_unknown_data_version(self):
+        build = export.Build(self.record)
+        assert build.export(self.page(0), os.path.join(self.dir, '0')) \
+            == 'exported'
+        assert build.changed(os.path.join(self.dir, '0'))
+    
+    def test_missing_output(self):
+        self.build()
+        os.remove(os.path.join(self.dir, '1'))
+        assert self.build() == ['skipped', 'exported', 'skipped']
+    
+    def test_version_arg(self):
+        file_name = os.path.join(self.dir, 'page')
+        build = export.Build(self.record)
+        assert build.export(Page('One'), file_name, version=[1]) == 'exported'
+        assert build.export(Page('One'), file_name, version=[1]) == 'skipped'
+        assert build.export(Page('Two'), file_name, version=[2]) == 'exported'
+    
+    def test_failed_render_not_recorded(self):
+        file_name = os.path.join(self.dir, 'page')
+        build = export.Build(self.record)
+        broken = Page(xmlcomposer.CallBack(str))
+        self.assertRaises(Exception, build.export, broken, file_name)
+        assert build.changed(file_name)
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Stores the files PUT to it in its server's files dictionary.
+    """
+    protocol_version = 'HTTP/1.1'
+    
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+    
+    def do_PUT(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = []
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    # The client gave up partway through.
+                    self.close_connection = 1
+                    return
+                size = int(line.strip(), 16)
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    break
+            body = ''.join(body)
+        else:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+        with self.server.lock:
+            if self.server.failures:
+                self.server.failures -= 1
+                status = 503
+            elif self.path.startswith('/forbidden'):
+                status = 403
+            else:
+                self.server.files[self.path] = body
+                status = 201
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ('127.0.0.1', 0), StandInHandler
+            )
+        self.lock = threading.Lock()
+        self.files = {}
+        self.failures = 0
+        self.connections = 0
+
+
+class TestToHost(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = StandInServer()
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,)
+            )
+        self.thread.start()
+        self.url = 'http://%s:%d/site' % self.server.server_address
+        self.host = export.HttpHost(self.url, connections=2)
+        self.host.chunk_size = 10
+    
+    def tearDown(self):
+        self.host.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+    
+    def test_to_host(self):
+        page = Page(xmlcomposer.CallBack(greeting, xmlcomposer.PCData))
+        export.to_host(page.generate(session='Bob'), self.url + '/page.xml')
+        assert self.server.files == {
+            '/site/page.xml': '<page>Hello Bob!</page>\n',
+            }
+    
+    def test_retries(self):
+        self.server.failures = 2
+        export.to_host(['<p>', 'Retried', '</p>'], 'page.xml', self.host)
+        assert self.server.files['/site/page.xml'] == '<p>Retried</p>'
+        self.server.failures = 3
+        try:
+            export.to_host(['<p/>'], 'page.xml', self.host)
+        except export.UploadError, e:
+            assert e.status == 503
+        else:
+            assert False
+    
+    def test_client_errors_not_retried(self):
+        host = export.HttpHost(self.url.replace('site', 'forbidden'))
+        try:
+            self.assertRaises(
+                export.UploadError, export.to_host, ['x'], 'page.xml', host
+                )
+        finally:
+            host.close()
+    
+    def test_batch(self):
+        jobs = [
+            (Page(xmlcomposer.CallBack(greeting, xmlcomposer.PCData)),
+                'page%d.xml' % n, {'session': n})
+            for n in range(20)
+            ]
+        reported = []
+        batch, results = export.to_hosts(
+            jobs, self.host, threads=4, report=reported.append
+            )
+        assert len(reported) == len(results) == 20
+        assert all(r[1] == 'uploaded' for r in results)
+        assert len(self.server.files) == 21
+        assert self.server.files['/site/current'] == batch
+        path = '/site/staging/%s/page7.xml' % batch
+        assert self.server.files[path] == '<page>Hello 7!</page>\n'
+        # Connections are reused.
+        assert self.server.connections <= 4
+    
+    def test_failed_batch_not_published(self):
+        jobs = [
+            (Page('fine'), 'fine.xml', None),
+            (Page(xmlcomposer.CallBack(str)), 'broken.xml', None),
+            ]
+        batch, results = export.to_hosts(jobs, self.host)
+        assert sorted(r[1] for r in results) == ['failed', 'uploaded']
+        assert '/site/current' not in self.server.files
+    
+    def test_directory_host(self):
+        root = tempfile.mkdtemp()
+        try:
+            host = export.DirectoryHost(root)
+            for n in range(2):
+                jobs = [(Page('Version %d' % n), 'dir/page.xml', None)]
+                export.to_hosts(jobs, host)
+                with open(os.path.join(root, 'current/dir/page.xml')) as f:
+                    assert f.read() == '<page>Version %d</page>\n' % n
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+"""Unit tests for incrementally exported feeds.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import xmlcomposer
+from xmlcomposer import feed
+from xmlcomposer.formats import rss2
+
+def item(n):
+    return rss2.Item(rss2.Title('Story %d' % n), rss2.Guid('urn:story:%d' % n))
+
+def document(numbers):
+    return xmlcomposer.Document(
+        xmlcomposer.XMLDeclaration(version='1.0'),
+        rss2.Rss(version='2.0')(rss2.Channel(
+            rss2.Title('News'),
+            rss2.Link('http://example.com/'),
+            *[item(n) for n in numbers]
+            )),
+        )
+
+class Thumbnail(xmlcomposer.Element):
+    tag_name = 'thumbnail'
+
+MEDIA = xmlcomposer.Namespace(
+    'http://search.yahoo.com/mrss/', 'media', elements=(Thumbnail,)
+    )
+
+def media_item(n):
+    return rss2.Item(rss2.Title('Story %d' % n), Thumbnail(url='/%d.jpg' % n))
+
+class TestFeedWriter(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.dir, 'feed.xml')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def read(self):
+        with open(self.file_name) as f:
+            return f.read()
+    
+    def test_append_matches_full_export(self):
+        writer = feed.FeedWriter(self.file_name, max_items=5)
+        writer.export(document([3, 2, 1]))
+        assert self.read() == document([3, 2, 1]).render()
+        writer.append([item(5), item(4)])
+        assert self.read() == document([5, 4, 3, 2, 1]).render()
+        writer.append([item(6)])
+        assert self.read() == document([6, 5, 4, 3, 2]).render()
+        writer.append([item(n) for n in range(20, 10, -1)])
+        assert self.read() == document(range(20, 15, -1)).render()
+    
+    def test_append_namespaced(self):
+        # The namespaces declared on the root are not declared again on the
+        # elements of the new items.
+        scope = xmlcomposer.DocumentScope(MEDIA)
+        writer = feed.FeedWriter(self.file_name)
+        def media_document(numbers):
+            return rss2.Rss(version='2.0')(rss2.Channel(
+                rss2.Title('News'), *[media_item(n) for n in numbers]
+                ))
+        writer.export(media_document([1]), scope=scope)
+        writer.append([media_item(3), media_item(2)])
+        expected = media_document([3, 2, 1]).render(scope=scope)
+        assert self.read() == expected
+        assert expected.count('xmlns:media') == 1
+    
+    def test_original_unchanged(self):
+        original = document([1])
+        expected = original.render()
+        feed.FeedWriter(self.file_name).export(original)
+        assert original.render() == expected
+    
+    def test_empty_feed(self):
+        writer = feed.FeedWriter(self.file_name)
+        writer.export(document([]))
+        writer.append([item(1)])
+        writer.append([item(2)])
+        assert self.read() == document([2, 1]).render()
+    
+    def test_changed_feed(self):
+        writer = feed.FeedWriter(self.file_name)
+        self.assertRaises(ValueError, writer.append, [item(1)])
+        writer.export(document([1]))
+        with open(self.file_name, 'a') as f:
+            f.write('<!-- edited -->')
+        self.assertRaises(ValueError, writer.append, [item(2)])
+    
+    def test_no_channel(self):
+        writer = feed.FeedWriter(self.file_name)
+        self.assertRaises(ValueError, writer.export, rss2.Rss())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,568 @@
+#!/usr/bin/env python2
+"""Unit tests for the renderers.
+"""
+
+import collections
+import multiprocessing
+import threading
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+
+import xmlcomposer
+
+class Page(xmlcomposer.Element): pass
+class Item(xmlcomposer.Element): pass
+class Head(xmlcomposer.Element): pass
+
+
+class FakeService(object):
+    """A stand-in for a slow backend that answers requests in the background.
+    """
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.pool = ThreadPool(20)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most_running = 0
+        self.requests = []
+    
+    def close(self):
+        self.pool.terminate()
+    
+    def lookup(self, key, fail=False):
+        with self.lock:
+            self.requests.append(key)
+        return self.pool.apply_async(self._answer, (key, fail))
+    
+    def _answer(self, key, fail):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if fail:
+            raise ValueError(key)
+        return xmlcomposer.PCData('%s for %s' % (key, self.session_name))
+    
+    def callback(self, key, fail=False):
+        def func(session):
+            self.session_name = session
+            return self.lookup(key, fail)
+        return xmlcomposer.CallBack(func, xmlcomposer.PCData, deferred=True)
+
+
+class TestConcurrentRenderer(unittest.TestCase):
+    
+    def setUp(self):
+        self.service = FakeService()
+    
+    def tearDown(self):
+        self.service.close()
+    
+    def page(self, count=5):
+        return xmlcomposer.Document(Page(*[
+            Item(self.service.callback('item%d' % n)) for n in range(count)
+            ]))
+    
+    def test_output_matches_serial_render(self):
+        page = self.page()
+        expected = page.render(session='alice')
+        produced = xmlcomposer.ConcurrentRenderer().render(
+            page, session='alice'
+            )
+        assert produced == expected
+        assert '<item>item4 for alice</item>' in produced
+    
+    def test_callbacks_overlap(self):
+        start = time.time()
+        xmlcomposer.ConcurrentRenderer().render(self.page(), session='bob')
+        assert time.time() - start < 0.3
+        assert self.service.most_running == 5
+    
+    def test_lookahead(self):
+        renderer = xmlcomposer.ConcurrentRenderer(lookahead=2)
+        lines = renderer.generate(self.page(), session='carol')
+        # Nothing runs ahead of the consumer by more than the lookahead.
+        assert self.service.requests == ['item0', 'item1']
+        ''.join(lines)
+        assert self.service.most_running <= 2
+        assert len(self.service.requests) == 5
+    
+    def test_errors_raised_in_order(self):
+        page = xmlcomposer.Document(Page(
+            Item('static'),
+            Item(self.service.callback('broken', fail=True)),
+            ))
+        lines = xmlcomposer.ConcurrentRenderer().generate(page)
+        assert next(lines) == '<page>\n'
+        assert next(lines) == '\t<item>static</item>\n'
+        self.assertRaises(ValueError, next, lines)
+    
+    def test_skipped_callbacks(self):
+        hidden = Item(self.service.callback('hidden')).on(lambda: False)
+        page = xmlcomposer.Document(Page(
+            hidden,
+            Item(self.service.callback('shown')),
+            ))
+        produced = xmlcomposer.ConcurrentRenderer().render(page, session='d')
+        assert 'hidden' not in produced
+        assert '<item>shown for d</item>' in produced
+    
+    def test_nested_callbacks(self):
+        inner = self.service.callback('inner')
+        outer = xmlcomposer.CallBack(lambda session: Item(inner), Item)
+        page = xmlcomposer.Document(Page(outer))
+        produced = xmlcomposer.ConcurrentRenderer().render(page, session='e')
+        assert '<item>inner for e</item>' in produced
+
+
+class TestThreadedPrefetch(unittest.TestCase):
+    
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.renderer = xmlcomposer.ConcurrentRenderer(threads=20)
+    
+    def tearDown(self):
+        self.renderer.close()
+    
+    def slow(self, text, fail=False):
+        def func(session):
+            time.sleep(0.05)
+            with self.lock:
+                self.sessions.append(session)
+            if fail:
+                raise ValueError(text)
+            return xmlcomposer.PCData(text)
+        return xmlcomposer.CallBack(func, xmlcomposer.PCData)
+    
+    def test_prefetch(self):
+        page = xmlcomposer.Document(Page(*[
+            Item(self.slow('item%d' % n)) for n in range(20)
+            ]))
+        session = {'user': 'alice'}
+        expected = page.render(session=session)
+        start = time.time()
+        produced = self.renderer.render(page, session=session)
+        assert time.time() - start < 0.5
+        assert produced == expected
+        assert all(s is session for s in self.sessions)
+    
+    def test_errors_raised_in_order(self):
+        page = xmlcomposer.Document(Page(
+            Item(self.slow('first')),
+            Item(self.slow('broken', fail=True)),
+            Item(self.slow('last')),
+            ))
+        lines = self.renderer.generate(page)
+        assert next(lines) == '<page>\n'
+        assert next(lines) == '\t<item>first</item>\n'
+        self.assertRaises(ValueError, next, lines)
+    
+    def test_shared_pool(self):
+        pool = ThreadPool(4)
+        try:
+            renderer = xmlcomposer.ConcurrentRenderer(pool=pool)
+            page = Page(*[Item(self.slow('item%d' % n)) for n in range(8)])
+            assert renderer.render(page) == page.render()
+            renderer.close()
+            # The pool belongs to the caller, and stays usable.
+            assert pool.apply_async(len, ('abc',)).get() == 3
+        finally:
+            pool.terminate()
+
+
+class TestTimeouts(unittest.TestCase):
+    
+    def setUp(self):
+        self.renderer = xmlcomposer.ConcurrentRenderer(threads=10)
+    
+    def tearDown(self):
+        self.renderer.close()
+    
+    def callback(self, text, delay, **kwargs):
+        def func(session):
+            time.sleep(delay)
+            return xmlcomposer.PCData(text)
+        return xmlcomposer.CallBack(func, xmlcomposer.PCData, **kwargs)
+    
+    def test_fallback(self):
+        page = Page(
+            Item(self.callback('fast', 0, timeout=0.2)),
+            Item(self.callback('slow', 1, timeout=0.1,
+                fallback=xmlcomposer.PCData('unavailable'))),
+            Item(self.callback('empty', 1, timeout=0.1)),
+            )
+        start = time.time()
+        output = self.renderer.render(page)
+        assert time.time() - start < 0.5
+        assert '<item>fast</item>' in output
+        assert '<item>unavailable</item>' in output
+        assert 'slow' not in output and 'empty' not in output
+        assert self.renderer.timeouts == 2
+    
+    def test_deferred_fallback(self):
+        service = FakeService(delay=1)
+        try:
+            callback = service.callback('late')
+            callback.timeout = 0.1
+            callback.fallback = xmlcomposer.PCData('later')
+            output = self.renderer.render(Page(Item(callback)), session='f')
+            assert output == '<page>\n\t<item>later</item>\n</page>\n'
+            assert self.renderer.timeouts == 1
+        finally:
+            service.close()
+    
+    def test_deadline(self):
+        renderer = xmlcomposer.ConcurrentRenderer(threads=2, deadline=0.2)
+        try:
+            page = Page(*[
+                Item(self.callback('item%d' % n, 0.15)) for n in range(6)
+                ])
+            start = time.time()
+            output = renderer.render(page)
+            assert time.time() - start < 0.5
+            assert '<item>item0</item>' in output
+            assert 'item5' not in output
+            assert renderer.timeouts > 0
+        finally:
+            renderer.close()
+    
+    def test_batch_deadline(self):
+        def slow(keys, session):
+            time.sleep(1)
+            return dict((key, 'late') for key in keys)
+        loader = xmlcomposer.Loader(slow)
+        page = Page(*[
+            Item(xmlcomposer.BatchCallBack(loader, n)) for n in range(3)
+            ])
+        renderer = xmlcomposer.ConcurrentRenderer(threads=2, deadline=0.1)
+        try:
+            start = time.time()
+            output = renderer.render(page)
+            assert time.time() - start < 0.5
+            assert 'late' not in output
+            assert renderer.timeouts == 3
+        finally:
+            renderer.close()
+    
+    def test_futures_timeout(self):
+        class Future(object):
+            def result(self, timeout=None):
+                raise FuturesTimeoutError()
+        class TimeoutError(Exception):
+            pass
+        class Other(object):
+            def result(self, timeout=None):
+                raise TimeoutError()
+        wait = xmlcomposer._render.wait
+        FuturesTimeoutError = xmlcomposer._render._FuturesTimeoutError
+        if FuturesTimeoutError != ():
+            self.assertRaises(multiprocessing.TimeoutError, wait, Future())
+        # Only the timeouts of futures are converted, not any exception
+        # that happens to have the same name.
+        self.assertRaises(TimeoutError, wait, Other())
+    
+    def test_serial_render_ignores_timeout(self):
+        callback = self.callback('done', 0.1, timeout=0)
+        assert Page(callback).render() == '<page>done</page>\n'
+
+
+class TestFlushing(unittest.TestCase):
+    
+    def page(self, delay=0.3):
+        def slow(session):
+            time.sleep(delay)
+            return Item('slow')
+        return xmlcomposer.Document(Page(
+            Head(Item('title')),
+            xmlcomposer.FlushPoint(),
+            Item('static'),
+            xmlcomposer.CallBack(slow, Item),
+            ))
+    
+    def test_time_to_first_byte(self):
+        start = time.time()
+        chunks = xmlcomposer.Renderer().chunks(self.page())
+        first = next(chunks)
+        first_byte = time.time() - start
+        rest = list(chunks)
+        total = time.time() - start
+        assert first.endswith('</head>\n')
+        assert first_byte < 0.1 <= 0.3 <= total
+        assert rest[0] == '\t<item>static</item>\n'
+        assert ''.join([first] + rest) == self.page(0).render()
+    
+    def test_concurrent_chunks(self):
+        renderer = xmlcomposer.ConcurrentRenderer(threads=2)
+        try:
+            chunks = list(renderer.chunks(self.page(0)))
+            assert len(chunks) == 3
+            assert ''.join(chunks) == self.page(0).render()
+        finally:
+            renderer.close()
+    
+    def test_flush_markers(self):
+        renderer = xmlcomposer.Renderer()
+        lines = list(renderer.generate(self.page(0)))
+        assert not [line for line in lines if line is xmlcomposer.FLUSH]
+        lines = list(renderer.generate(self.page(0), flush=True))
+        assert len([line for line in lines if line is xmlcomposer.FLUSH]) == 2
+        assert list(self.page(0).generate()) == [
+            line for line in lines if line is not xmlcomposer.FLUSH
+            ]
+
+
+class TestBatchLoading(unittest.TestCase):
+    
+    def setUp(self):
+        self.batches = []
+        self.prices = xmlcomposer.Loader(self.fetch)
+        self.stock = xmlcomposer.Loader(
+            lambda keys, session: dict((k, 'in stock') for k in keys)
+            )
+    
+    def fetch(self, keys, session):
+        self.batches.append(list(keys))
+        return dict((key, '$%d' % key) for key in keys if key != 13)
+    
+    def page(self, keys):
+        return xmlcomposer.Document(Page(*[
+            Item(
+                xmlcomposer.BatchCallBack(self.prices, key),
+                ' ',
+                xmlcomposer.BatchCallBack(self.stock, key),
+                )
+            for key in keys
+            ]))
+    
+    def test_one_batch_per_loader(self):
+        page = self.page(range(100) + [5])
+        expected = page.render()
+        assert len(self.batches) == 101
+        del self.batches[:]
+        
+        assert xmlcomposer.Renderer().render(page) == expected
+        assert self.batches == [range(100)]
+        
+        del self.batches[:]
+        renderer = xmlcomposer.ConcurrentRenderer(threads=4)
+        try:
+            assert renderer.render(page) == expected
+        finally:
+            renderer.close()
+        assert self.batches == [range(100)]
+    
+    def test_started_not_searched(self):
+        # Resolving a CallBack finds it among those started without going
+        # through them, so a page of many BatchCallBacks is not quadratic.
+        class Started(collections.deque):
+            def __iter__(self):
+                raise AssertionError('The started CallBacks were searched.')
+        class Renderer(xmlcomposer.ConcurrentRenderer):
+            def start(self, block, session):
+                state = super(Renderer, self).start(block, session)
+                state.started = Started(state.started)
+                return state
+        page = self.page(range(50))
+        page.contents[0].add(*[
+            Item(xmlcomposer.CallBack(lambda session, n=n: Item(str(n))))
+            for n in range(50)
+            ])
+        expected = page.render()
+        renderer = Renderer(threads=4)
+        try:
+            assert renderer.render(page) == expected
+        finally:
+            renderer.close()
+    
+    def test_missing_value(self):
+        page = self.page([12, 13])
+        output = xmlcomposer.Renderer().render(page)
+        assert '<item>None in stock</item>' in output
+    
+    def test_custom_format(self):
+        def link(value, session):
+            return xmlcomposer.PCData('%s for %s' % (value, session))
+        callback = xmlcomposer.BatchCallBack(
+            self.prices, 3, link, xmlcomposer.PCData
+            )
+        output = xmlcomposer.Renderer().render(Page(callback), session='bob')
+        assert output == '<page>$3 for bob</page>\n'
+    
+    def test_nested_callbacks(self):
+        inner = xmlcomposer.BatchCallBack(self.prices, 7)
+        outer = xmlcomposer.CallBack(lambda session: Item(inner), Item)
+        page = Page(outer, Item(xmlcomposer.BatchCallBack(self.prices, 8)))
+        output = xmlcomposer.Renderer().render(page)
+        assert '<item>$7</item>' in output and '<item>$8</item>' in output
+        assert self.batches == [[8], [7]]
+
+
+class TestTracing(unittest.TestCase):
+    
+    def render(self, block, renderer=None, **kwargs):
+        tracer = xmlcomposer.Tracer()
+        renderer = renderer or xmlcomposer.Renderer()
+        output = ''.join(renderer.generate(block, tracer=tracer, **kwargs))
+        return output, tracer
+    
+    def test_parts(self):
+        def name(session):
+            return xmlcomposer.PCData(session)
+        text = xmlcomposer.PCData('Hello %NAME%!').substitute(
+            '%NAME%', xmlcomposer.CallBack(name)
+            )
+        page = xmlcomposer.Document(Page(Item(text), Item('Plain')))
+        output, tracer = self.render(page, session='Bob')
+        assert output == (
+            '<page>\n\t<item>Hello Bob!</item>\n'
+            '\t<item>Plain</item>\n</page>\n'
+            )
+        parts = [(e[0], e[1], e[2], e[4]) for e in tracer.events]
+        assert parts == [
+            ('enter', 'element', 'page', None),
+            ('enter', 'element', 'item', None),
+            ('enter', 'substitution', '%NAME%', None),
+            ('enter', 'callback', 'name', None),
+            ('leave', 'callback', 'name', 0),
+            ('leave', 'substitution', '%NAME%', 3),
+            ('leave', 'element', 'item', 25),
+            ('enter', 'element', 'item', None),
+            ('leave', 'element', 'item', 20),
+            ('leave', 'element', 'page', len(output)),
+            ]
+        assert len(set(e[5] for e in tracer.events)) == 1
+    
+    def test_untraced(self):
+        # Once traced renders end, generation no longer looks for a tracer.
+        self.render(Page(Item('One')))
+        assert xmlcomposer._render.HOOKS.renders == 0
+        lines = xmlcomposer.Renderer().generate(Page(Item('One')))
+        assert iter(lines).__class__.__name__ == 'generator'
+        assert Item('One').generate().__name__ == '_generate_flat'
+    
+    def test_concurrent(self):
+        def slow(session):
+            time.sleep(0.05)
+            return Item('Done')
+        renderer = xmlcomposer.ConcurrentRenderer(threads=2)
+        try:
+            output, tracer = self.render(
+                Page(xmlcomposer.CallBack(slow, Item)), renderer
+                )
+        finally:
+            renderer.close()
+        kinds = [(e[0], e[1]) for e in tracer.events]
+        assert kinds.count(('leave', 'callback')) == 1
+        assert kinds[-1] == ('leave', 'element')
+    
+    def test_collapsed_stacks(self):
+        tracer = xmlcomposer.Tracer()
+        for event in [
+                ('enter', 'element', 'page', 1.0),
+                ('enter', 'callback', 'slow lookup', 1.5),
+                ('leave', 'callback', 'slow lookup', 3.5, 0),
+                ('enter', 'element', 'item', 3.5),
+                ('leave', 'element', 'item', 3.75, 10),
+                ('enter', 'element', 'item', 3.75),
+                ('leave', 'element', 'item', 4.0, 10),
+                ('leave', 'element', 'page', 5.0, 40),
+                # Never left.
+                ('enter', 'element', 'aside', 6.0),
+                ]:
+            if event[0] == 'enter':
+                tracer.enter(*event[1:])
+            else:
+                tracer.leave(*event[1:])
+        assert tracer.collapsed_stacks() == [
+            'element:page 1500000',
+            'element:page;callback:slow_lookup 2000000',
+            'element:page;element:item 500000',
+            ]
+        trace = tracer.chrome_trace()['traceEvents']
+        assert ''.join(e['ph'] for e in trace) == 'BBEBEBEEB'
+        assert trace[1]['ts'] == 1500000 and trace[2]['args'] == {'bytes': 0}
+
+
+class TestMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        self.metrics = xmlcomposer.Metrics(caches={}).enable()
+    
+    def tearDown(self):
+        self.metrics.disable()
+    
+    def test_documents(self):
+        def name(session):
+            return xmlcomposer.PCData(session)
+        page = xmlcomposer.Document(
+            Page(Item(xmlcomposer.CallBack(name)), Item('Plain'))
+            )
+        output = page.render(session='Bob')
+        page.render(xmlcomposer.MINIMAL_LAYOUT, session='Ann')
+        snapshot = self.metrics.snapshot()
+        assert snapshot['documents'] == 2
+        assert snapshot['elements'] == 6
+        assert snapshot['bytes']['default'] == len(output)
+        assert snapshot['callbacks'] == {'name': 2}
+        assert snapshot['render_seconds']['count'] == 2
+        histogram = snapshot['callback_seconds']['name']
+        assert histogram['count'] == 2
+        assert histogram['buckets'][-1] == (None, 2)
+    
+    def test_slow(self):
+        slow = []
+        self.metrics.slow_threshold = 0.05
+        self.metrics.on_slow = lambda document, seconds: slow.append(document)
+        def wait(session):
+            time.sleep(0.1)
+            return Item('Done')
+        quick = xmlcomposer.Document(Page())
+        late = xmlcomposer.Document(Page(xmlcomposer.CallBack(wait, Item)))
+        quick.render()
+        late.render()
+        assert slow == [late]
+        assert self.metrics.snapshot()['slow_renders'] == 1
+    
+    def test_threads(self):
+        page = xmlcomposer.Document(Page(*[Item(str(n)) for n in range(20)]))
+        def render(n):
+            for i in range(20):
+                page.render()
+        threads = [threading.Thread(target=render, args=(n,))
+            for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = self.metrics.snapshot()
+        assert snapshot['documents'] == 160
+        assert snapshot['elements'] == 160 * 21
+    
+    def test_caches(self):
+        cache = xmlcomposer.FragmentCache()
+        self.metrics.caches = {'fragments': cache}
+        item = Item('One').cache('one', store=cache)
+        page = xmlcomposer.Document(Page(item))
+        for n in range(4):
+            page.render()
+        stats = self.metrics.snapshot()['caches']['fragments']
+        assert (stats['hits'], stats['misses']) == (3, 1)
+        assert stats['hit_rate'] == 0.75
+    
+    def test_disabled(self):
+        self.metrics.disable()
+        xmlcomposer.Document(Page(Item('One'))).render()
+        assert not xmlcomposer._render.HOOKS.active
+        assert self.metrics.snapshot()['documents'] == 0
+        self.metrics.enable()
+        xmlcomposer.Document(Page(Item('One'))).render()
+        self.metrics.reset()
+        assert self.metrics.snapshot()['elements'] == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python2
+"""Unit tests for the schema loader.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from xmlcomposer import schema
+
+DTD = """
+<!ENTITY % coreattrs "id ID #IMPLIED class CDATA #IMPLIED">
+<!ELEMENT book (title)>
+<!ATTLIST book
+    %coreattrs;
+    width CDATA "100%"
+    kind (hardcover | paperback) "paperback"
+    lang NMTOKEN #FIXED "en">
+<!ELEMENT title (#PCDATA)>
+"""
+
+XSD = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+    <xs:attributeGroup name="common">
+        <xs:attribute name="id"/>
+    </xs:attributeGroup>
+    <xs:complexType name="titleType">
+        <xs:attribute name="lang"/>
+    </xs:complexType>
+    <xs:element name="book">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element name="title" type="titleType"/>
+            </xs:sequence>
+            <xs:attributeGroup ref="common"/>
+        </xs:complexType>
+    </xs:element>
+    <xs:element name="extra">
+        <xs:complexType><xs:anyAttribute/></xs:complexType>
+    </xs:element>
+</xs:schema>
+"""
+
+RNG = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+    <start>
+        <element name="book">
+            <ref name="common"/>
+            <attribute><name>kind</name></attribute>
+            <element name="title"><text/></element>
+        </element>
+    </start>
+    <define name="common">
+        <optional><attribute name="id"/></optional>
+    </define>
+</grammar>
+"""
+
+class TestSchemaAttributes(unittest.TestCase):
+    """Demonstrate that permitted attributes are read from schemas.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_cache = schema.CACHE
+        schema.CACHE = os.path.join(self.directory, 'cache')
+    
+    def tearDown(self):
+        schema.CACHE = self.original_cache
+        shutil.rmtree(self.directory)
+    
+    def load(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return schema.load(path)
+    
+    def test_dtd(self):
+        namespace = self.load('books.dtd', DTD)
+        expected = set(['id', 'class', 'width', 'kind', 'lang'])
+        assert namespace.Book.allowed_attributes == expected
+        assert namespace.Title.allowed_attributes == frozenset()
+    
+    def test_xsd(self):
+        namespace = self.load('books.xsd', XSD)
+        assert namespace.Book.allowed_attributes == set(['id'])
+        assert namespace.Title.allowed_attributes == set(['lang'])
+        assert namespace.Extra.allowed_attributes is None
+    
+    def test_rng(self):
+        namespace = self.load('books.rng', RNG)
+        assert namespace.Book.allowed_attributes == set(['id', 'kind'])
+        assert namespace.Title.allowed_attributes == frozenset()
+    
+    def test_format_attribute_set(self):
+        expected = (
+            "    allowed_attributes = frozenset([\n"
+            "        'a', 'b'\n"
+            "        ])\n"
+            )
+        assert schema.format_attribute_set(['b', 'a']) == expected
+        expected = '    allowed_attributes = frozenset()\n'
+        assert schema.format_attribute_set([]) == expected
+
+
+class TestExportAll(unittest.TestCase):
+    """Demonstrate that batches of schemas are exported incrementally.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_cache = schema.CACHE
+        schema.CACHE = os.path.join(self.directory, 'cache')
+        self.source = os.path.join(self.directory, 'schemas')
+        self.export_dir = os.path.join(self.directory, 'modules')
+        os.makedirs(self.source)
+        for name, text in (('books.dtd', DTD), ('book-list.xsd', XSD)):
+            with open(os.path.join(self.source, name), 'w') as f:
+                f.write(text)
+    
+    def tearDown(self):
+        schema.CACHE = self.original_cache
+        shutil.rmtree(self.directory)
+    
+    def export(self):
+        schemas = schema.find_schemas(self.source)
+        results = schema.export_all(schemas, self.export_dir, processes=2)
+        return dict((os.path.basename(r[1]), r[2]) for r in results)
+    
+    def test_export_all(self):
+        expected = {'books.py': 'exported', 'book_list.py': 'exported'}
+        assert self.export() == expected
+        with open(os.path.join(self.export_dir, 'books.py')) as f:
+            assert 'class Book(xmlcomposer.Element):' in f.read()
+        
+        expected = {'books.py': 'unchanged', 'book_list.py': 'unchanged'}
+        assert self.export() == expected
+        
+        with open(os.path.join(self.source, 'books.dtd'), 'a') as f:
+            f.write('<!ELEMENT author (#PCDATA)>')
+        expected = {'books.py': 'exported', 'book_list.py': 'unchanged'}
+        assert self.export() == expected
+    
+    def test_dtd_modules(self):
+        with open(os.path.join(self.source, 'books.dtd'), 'a') as f:
+            f.write('<!ENTITY % authors SYSTEM "authors.mod">\n%authors;\n')
+        module = os.path.join(self.source, 'authors.mod')
+        with open(module, 'w') as f:
+            f.write('<!ELEMENT author (#PCDATA)>\n')
+        assert self.export()['books.py'] == 'exported'
+        with open(os.path.join(self.export_dir, 'books.py')) as f:
+            assert 'class Author(xmlcomposer.Element):' in f.read()
+        assert self.export()['books.py'] == 'unchanged'
+        
+        with open(module, 'a') as f:
+            f.write('<!ELEMENT editor (#PCDATA)>\n')
+        assert self.export()['books.py'] == 'exported'
+        with open(os.path.join(self.export_dir, 'books.py')) as f:
+            assert 'class Editor(xmlcomposer.Element):' in f.read()
+    
+    def test_failure(self):
+        with open(os.path.join(self.source, 'broken.xsd'), 'w') as f:
+            f.write('<not xml')
+        assert self.export()['broken.py'] == 'failed'
+    
+    def test_find_schemas_in_manifest(self):
+        manifest = os.path.join(self.directory, 'manifest')
+        with open(manifest, 'w') as f:
+            f.write('# Comments are ignored.\n\n')
+            f.write('schemas/books.dtd urn:books library\n')
+            f.write('schemas/book-list.xsd\n')
+        expected = [
+            (os.path.join(self.source, 'books.dtd'), 'urn:books', 'library'),
+            (os.path.join(self.source, 'book-list.xsd'), '', 'book_list'),
+            ]
+        assert schema.find_schemas(manifest) == expected
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python2
+"""Unit tests for the TextBlock classes.
+"""
+
+import unittest
+
+import xmlcomposer
+
+def constant(text):
+    calls = []
+    def func(session):
+        calls.append(session)
+        return xmlcomposer.PCData(text)
+    func.calls = calls
+    return func
+
+class TestSubstitution(unittest.TestCase):
+    
+    def test_many_flags(self):
+        block = xmlcomposer.PCData(['%A% and %B%', 'none', '%C%%A%'])
+        for flag in ('%A%', '%B%', '%C%'):
+            block.substitute(flag, constant(flag.strip('%').lower()))
+        assert block.render() == 'a and b\nnone\nca\n'
+    
+    def test_longest_flag_wins(self):
+        block = xmlcomposer.PCData('$NAME $NAMES')
+        block.substitute('$NAME', constant('one'))
+        block.substitute('$NAMES', constant('many'))
+        assert block.render() == 'one many\n'
+    
+    def test_substituted_content_not_searched(self):
+        block = xmlcomposer.PCData('%A%', escape=False)
+        block.substitute('%A%', constant('%B%'))
+        block.substitute('%B%', constant('b'))
+        assert block.render() == '%B%\n'
+    
+    def test_first_callback_kept(self):
+        block = xmlcomposer.PCData('%A%')
+        block.substitute('%A%', constant('first'))
+        block.substitute('%A%', constant('second'))
+        assert block.render() == 'first\n'
+    
+    def test_plan_reused(self):
+        block = xmlcomposer.PCData(['x %A% y', 'z'])
+        block.substitute('%A%', constant('a'))
+        plan = block.plan()
+        assert plan == [('x ', '%A%', ' y'), ('z',)]
+        block.render()
+        assert block.plan() is plan
+        block.substitute('%B%', constant('b'))
+        assert block.plan() is not plan
+    
+    def test_one_call_per_occurrence(self):
+        func = constant('a')
+        block = xmlcomposer.PCData(['%A% %A%', '%A%'])
+        block.substitute('%A%', func)
+        block.render(session='s')
+        assert func.calls == ['s', 's', 's']
+    
+    def test_callbacks(self):
+        first = xmlcomposer.CallBack(constant('1'), xmlcomposer.PCData)
+        second = xmlcomposer.CallBack(constant('2'), xmlcomposer.PCData)
+        block = xmlcomposer.PCData(['%2% %1%', '%1%'])
+        block.substitute('%1%', first).substitute('%2%', second)
+        assert list(block.callbacks()) == [second, first, first]
+        renderer = xmlcomposer.ConcurrentRenderer(threads=2)
+        try:
+            assert renderer.render(block) == block.render() == '2 1\n1\n'
+        finally:
+            renderer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python2
+"""Unit tests for the XMLWriter class.
+"""
+
+import unittest
+from StringIO import StringIO
+
+import xmlcomposer
+
+class Feed(xmlcomposer.Element): pass
+class Entry(xmlcomposer.Element): pass
+class Title(xmlcomposer.Element): pass
+class Link(xmlcomposer.Element): pass
+class Body(xmlcomposer.Element):
+    self_closing = False
+
+class AtomFeed(xmlcomposer.Element):
+    tag_name = 'feed'
+class AtomEntry(xmlcomposer.Element):
+    tag_name = 'entry'
+class DCTitle(xmlcomposer.Element):
+    tag_name = 'title'
+
+ATOM = xmlcomposer.Namespace('http://www.w3.org/2005/Atom', 'atom',
+    elements=(AtomFeed, AtomEntry))
+DC = xmlcomposer.Namespace('http://purl.org/dc/elements/1.1/', 'dc',
+    elements=(DCTitle,))
+
+
+class TestXMLWriter(unittest.TestCase):
+    
+    def tree(self):
+        return Feed(
+            Entry(Title('First & best'), Link(href='/1'), Body()),
+            Entry(Title('Second'), Link(href='/2?a=1&b=2'), Body()),
+            version='1.0',
+            )
+    
+    def stream(self, writer):
+        writer.start(Feed, version='1.0')
+        for n, title, href in ((1, 'First & best', '/1'),
+                (2, 'Second', '/2?a=1&b=2')):
+            writer.start(Entry)
+            writer.start(Title)
+            writer.text(title)
+            writer.end(Title)
+            writer.start(Link, href=href)
+            writer.end()
+            writer.start(Body())
+            writer.end()
+            writer.end(Entry)
+        writer.end()
+    
+    def test_same_as_tree(self):
+        for layout in (xmlcomposer.DEFAULT_LAYOUT,
+                xmlcomposer.SPARTAN_LAYOUT, xmlcomposer.MINIMAL_LAYOUT):
+            out = StringIO()
+            self.stream(xmlcomposer.XMLWriter(out, layout))
+            expected = xmlcomposer.Document(self.tree()).render(layout)
+            assert out.getvalue() == expected
+    
+    def test_namespaces(self):
+        scope = xmlcomposer.DocumentScope(ATOM, DC)
+        out = StringIO()
+        writer = xmlcomposer.XMLWriter(out, scope=scope)
+        writer.start(AtomFeed)
+        writer.start(AtomEntry)
+        writer.write(DCTitle('One'))
+        writer.close()
+        expected = xmlcomposer.Document(
+            AtomFeed(AtomEntry(DCTitle('One')))
+            ).render(scope=scope)
+        assert out.getvalue() == expected
+    
+    def test_written_as_it_goes(self):
+        out = StringIO()
+        writer = xmlcomposer.XMLWriter(out, xmlcomposer.MINIMAL_LAYOUT)
+        declaration = xmlcomposer.XMLDeclaration(version='1.0')
+        writer.write(declaration)
+        writer.start(Feed)
+        for n in range(1000):
+            writer.write(Entry(str(n)))
+            assert writer.depth == 1
+        assert out.getvalue().endswith('<entry>999</entry>')
+        writer.close()
+        prolog = declaration.render(xmlcomposer.MINIMAL_LAYOUT)
+        assert out.getvalue().startswith(prolog + '<feed>')
+        assert out.getvalue().endswith('</feed>')
+    
+    def test_started_with_contents(self):
+        out = StringIO()
+        writer = xmlcomposer.XMLWriter(out, xmlcomposer.MINIMAL_LAYOUT)
+        writer.start(Feed(Title('Header')))
+        writer.write(Entry('One'))
+        writer.close()
+        assert out.getvalue() == (
+            '<feed><title>Header</title><entry>One</entry></feed>'
+            )
+    
+    def test_text_held_until_nested(self):
+        out = StringIO()
+        writer = xmlcomposer.XMLWriter(out)
+        writer.start(Entry)
+        writer.text('Before')
+        writer.start(Title)
+        writer.end()
+        writer.text('After')
+        writer.end()
+        assert out.getvalue() == (
+            '<entry>\n\tBefore\n\t<title/>\n\tAfter\n</entry>\n'
+            )
+    
+    def test_callbacks(self):
+        def greet(session):
+            return xmlcomposer.PCData('Hello %s' % session)
+        out = StringIO()
+        writer = xmlcomposer.XMLWriter(out, session='Ann')
+        writer.start(Title)
+        writer.write(xmlcomposer.CallBack(greet, xmlcomposer.PCData))
+        writer.end()
+        assert out.getvalue() == '<title>Hello Ann</title>\n'
+    
+    def test_context_manager(self):
+        out = StringIO()
+        with xmlcomposer.XMLWriter(out, xmlcomposer.MINIMAL_LAYOUT) as writer:
+            writer.start(Feed)
+            writer.start(Entry)
+        assert out.getvalue() == '<feed><entry/></feed>'
+    
+    def test_errors(self):
+        writer = xmlcomposer.XMLWriter(StringIO())
+        self.assertRaises(ValueError, writer.end)
+        writer.start(Feed)
+        self.assertRaises(ValueError, writer.end, Entry)
+        writer.end(Feed)
+        assert writer.depth == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
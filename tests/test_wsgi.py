@@ -0,0 +1,135 @@
+#!/usr/bin/env python2
+"""Unit tests for serving output from WSGI applications.
+"""
+
+import httplib
+import threading
+import time
+import unittest
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import xmlcomposer
+from xmlcomposer import wsgi
+
+class Page(xmlcomposer.Element): pass
+class Head(xmlcomposer.Element): pass
+class Item(xmlcomposer.Element): pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    
+    def log_message(self, *args):
+        pass
+
+
+class TestStreamingResponse(unittest.TestCase):
+    
+    def page(self, count=1000):
+        return xmlcomposer.Document(Page(*[
+            Item('Item number %d' % n) for n in range(count)
+            ]))
+    
+    def test_coalescing(self):
+        page = self.page()
+        chunks = list(wsgi.StreamingResponse(page, chunk_size=4096))
+        assert ''.join(chunks) == page.render()
+        assert all(len(chunk) >= 4096 for chunk in chunks[:-1])
+        assert len(chunks) == len(page.render()) // 4096 + 1
+    
+    def test_flush_points(self):
+        def slow(session):
+            return Item('slow')
+        page = xmlcomposer.Document(Page(
+            Head('title'),
+            xmlcomposer.FlushPoint(),
+            xmlcomposer.CallBack(slow, Item),
+            ))
+        chunks = list(wsgi.StreamingResponse(page))
+        assert chunks == [
+            '<page>\n\t<head>title</head>\n',
+            '\t<item>slow</item>\n</page>\n',
+            ]
+    
+    def test_unicode(self):
+        page = Page(xmlcomposer.PCData(u'caf\xe9'))
+        chunks = list(wsgi.StreamingResponse(page))
+        assert chunks == ['<page>caf\xc3\xa9</page>\n']
+    
+    def test_close(self):
+        closed = []
+        class Renderer(xmlcomposer.Renderer):
+            def start(self, block, session):
+                state = super(Renderer, self).start(block, session)
+                state.close = lambda: closed.append(True)
+                return state
+        response = wsgi.StreamingResponse(
+            self.page(), renderer=Renderer(), chunk_size=100
+            )
+        next(iter(response))
+        assert not closed
+        response.close()
+        assert closed == [True]
+        self.assertRaises(StopIteration, next, iter(response))
+    
+    def test_close_before_iterating(self):
+        # As when the client goes away before the server has started to
+        # send the response.
+        closed = []
+        class Renderer(xmlcomposer.ConcurrentRenderer):
+            def start(self, block, session):
+                state = super(Renderer, self).start(block, session)
+                state.close = lambda: closed.append(state.started)
+                return state
+        page = Page(*[
+            xmlcomposer.CallBack(lambda session: Item('slow'), Item)
+            for n in range(4)
+            ])
+        renderer = Renderer(threads=2)
+        try:
+            response = wsgi.StreamingResponse(page, renderer=renderer)
+            response.close()
+            assert len(closed) == 1 and len(closed[0]) == 4
+        finally:
+            renderer.close()
+
+
+class TestServer(unittest.TestCase):
+    
+    def setUp(self):
+        def app(environ, start_response):
+            return wsgi.respond(start_response, self.page)
+        self.server = make_server('127.0.0.1', 0, app,
+            handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.handle_request)
+        self.thread.start()
+    
+    def tearDown(self):
+        self.thread.join()
+        self.server.server_close()
+    
+    def test_time_to_first_byte(self):
+        def slow(session):
+            time.sleep(0.3)
+            return Item('slow')
+        self.page = xmlcomposer.Document(Page(
+            Head('title'),
+            xmlcomposer.FlushPoint(),
+            xmlcomposer.CallBack(slow, Item),
+            ))
+        start = time.time()
+        connection = httplib.HTTPConnection(*self.server.server_address)
+        connection.request('GET', '/')
+        response = connection.getresponse()
+        first = response.read(len('<page>\n\t<head>title</head>\n'))
+        first_byte = time.time() - start
+        rest = response.read()
+        total = time.time() - start
+        connection.close()
+        assert response.getheader('Content-Type').startswith('text/html')
+        assert first == '<page>\n\t<head>title</head>\n'
+        assert first_byte < 0.2 and total >= 0.3
+        assert rest == '\t<item>slow</item>\n</page>\n'
+
+
+if __name__ == '__main__':
+    unittest.main()
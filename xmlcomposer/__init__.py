@@ -67,15 +67,23 @@ usage of xmlcomposer.
 """
 
 __all__ = (
+    'benchmarks',
     'export',
+    'feed',
     'formats',
     'schema',
+    'wsgi',
+    '_cache',
     '_document',
     '_element',
     '_layout',
+    '_metrics',
     '_namespace',
     '_processing_instruction',
+    '_render',
     '_text',
+    '_trace',
+    '_writer',
     'Document',
     'Template',
     'Comment',
@@ -94,6 +102,21 @@ __all__ = (
     'PCData',
     'CData',
     'CallBack',
+    'BatchCallBack',
+    'FlushPoint',
+    'FLUSH',
+    'Loader',
+    'depends_on',
+    'Renderer',
+    'ConcurrentRenderer',
+    'Tracer',
+    'Metrics',
+    'XMLWriter',
+    'FragmentCache',
+    'DEFAULT_FRAGMENT_CACHE',
+    'TemplateCache',
+    'DEFAULT_TEMPLATE_CACHE',
+    'file_version',
     )
 
 # The submodules with a leading underscore are not meant to be imported
@@ -112,5 +135,17 @@ from _namespace import Namespace, Scope, DocumentScope
 from _processing_instruction import ProcessingInstruction, \
     XMLDeclaration, XMLStylesheet
 
-from _text import PCData, CData, CallBack, Comment
+from _text import PCData, CData, CallBack, BatchCallBack, FlushPoint, \
+    Comment
+
+from _render import Renderer, ConcurrentRenderer, Loader, FLUSH, depends_on
+
+from _trace import Tracer
+
+from _metrics import Metrics
+
+from _writer import XMLWriter
+
+from _cache import FragmentCache, DEFAULT_FRAGMENT_CACHE, TemplateCache, \
+    DEFAULT_TEMPLATE_CACHE, file_version
 
@@ -0,0 +1,67 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""The xmlcomposer command-line interface.
+
+Run "python -m xmlcomposer --help" for usage information.
+"""
+
+import argparse
+import sys
+
+from xmlcomposer import schema
+
+
+def export_schemas(args):
+    """Export every schema in a directory or manifest to python modules.
+    """
+    def report(result):
+        location, export_path, status, seconds, error = result
+        print '%-9s %8.3fs  %s -> %s' % (status, seconds, location, export_path)
+        if error:
+            print '    %s' % error
+    
+    schemas = schema.find_schemas(args.source)
+    results = schema.export_all(
+        schemas, args.export_dir, args.processes, args.force, report
+        )
+    failed = [r for r in results if r[2] == 'failed']
+    print '%d schemas: %d exported, %d unchanged, %d failed' % (
+        len(results),
+        len([r for r in results if r[2] == 'exported']),
+        len([r for r in results if r[2] == 'unchanged']),
+        len(failed),
+        )
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='xmlcomposer')
+    commands = parser.add_subparsers()
+    
+    command = commands.add_parser(
+        'export-schemas',
+        help='export schemas to python modules',
+        description=export_schemas.__doc__,
+        )
+    command.add_argument(
+        'source',
+        help='a directory of schema files, or a manifest listing schemas',
+        )
+    command.add_argument('export_dir', help='where to write the modules')
+    command.add_argument(
+        '-j', '--processes', type=int, default=None,
+        help='the number of worker processes (default: one per CPU)',
+        )
+    command.add_argument(
+        '-f', '--force', action='store_true',
+        help='export schemas even if their source is unchanged',
+        )
+    command.set_defaults(command=export_schemas)
+    
+    args = parser.parse_args(argv)
+    return args.command(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Storage for rendered fragments of XML, and for loaded template files.
+
+See the TextBlock.cache() method for how fragments are cached, and the
+Template class for how template files are.
+"""
+
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class FragmentCache(object):
+    """A bounded, thread-safe store of rendered fragments.
+    
+    Entries are evicted in least-recently-used order once there are more
+    than max_entries of them, and expire after their time-to-live, if they
+    have one.
+    
+    >>> cache = FragmentCache(max_entries=2)
+    >>> cache.set('a', ('<a/>',))
+    >>> cache.set('b', ('<b/>',), ttl=60)
+    >>> cache.get('a')
+    ('<a/>',)
+    >>> cache.set('c', ('<c/>',))
+    >>> print cache.get('b')
+    None
+    >>> cache.hits, cache.misses, cache.evictions
+    (1, 1, 1)
+    
+    Any object with the same get() and set() methods can be used in place of
+    a FragmentCache, which allows fragments to be kept in storage shared
+    between processes, such as memcached. Keys are tuples of hashable
+    objects, and values are pairs of a tuple of strings and a tuple of the
+    inputs the strings were made from, or None, so such a store needs to
+    convert them to something it can hold.
+    """
+    def __init__(self, max_entries=1000, default_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key):
+        """Return the value stored for the key, or None if there is none.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # Re-insert the entry to mark it as the most recently used.
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """Store a value for the key, expiring after ttl seconds.
+        
+        If ttl is None, the default_ttl of the cache is used. If that is
+        None as well, the entry does not expire.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Remove every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Return a dictionary of the cache's counters.
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                }
+
+
+def file_version(stat):
+    """Return a value that changes when a file does, from its os.stat().
+    
+    This is the file's inode, modification time, change time and size. A
+    file replaced by renaming another over it has a new inode, and one
+    rewritten in place has new times, but only as fine-grained as the
+    filesystem keeps them, which is a whole second on some. A same-sized
+    rewrite within that resolution of the last one goes unnoticed.
+    """
+    return (stat.st_ino, stat.st_mtime, stat.st_ctime, stat.st_size)
+
+
+class TemplateFile(object):
+    """The lines of a template file, as held by a TemplateCache.
+    
+    Template instances share the lines, which must not be modified, and the
+    substitution plans computed from them (see the
+    SubstitutableTextBlock.plan() method).
+    
+    A file can instead be memory-mapped, in which case lines is None, and
+    iterating over the TemplateFile produces the lines, copying each from
+    the mapping only as it is reached.
+    """
+    # The most plans kept, one for each set of flags templates substitute.
+    max_plans = 8
+    
+    def __init__(self, path, stat, lines=None, data=None):
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.version = file_version(stat)
+        self.lines = lines
+        self.data = data
+        self.checked = time.time()
+        self.plans = {}
+    
+    @classmethod
+    def read(cls, path, stat):
+        """Return a TemplateFile holding the lines of a file.
+        """
+        with open(path, 'r') as f:
+            lines = tuple(f.readlines())
+        return cls(path, stat, lines=lines)
+    
+    @classmethod
+    def map(cls, path, stat):
+        """Return a TemplateFile holding a read-only mapping of a file.
+        
+        The mapping is closed once nothing refers to it. A mapped file must
+        be replaced, such as by renaming a new file over it, rather than
+        truncated or rewritten in place while in use.
+        """
+        data = None
+        with open(path, 'rb') as f:
+            # Empty files cannot be mapped.
+            if os.fstat(f.fileno()).st_size:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, stat, data=data)
+    
+    def __iter__(self):
+        if self.lines is not None:
+            return iter(self.lines)
+        return self._map_lines()
+    
+    def _map_lines(self):
+        data = self.data
+        if data is None:
+            return
+        # Slicing and find() with a start do not use the mapping's file
+        # position, so any number of threads can do this at once.
+        end = len(data)
+        start = 0
+        while start < end:
+            stop = data.find('\n', start) + 1 or end
+            yield data[start:stop]
+            start = stop
+    
+    @property
+    def memory(self):
+        """The number of bytes of lines held in memory.
+        """
+        return self.size if self.lines is not None else 0
+    
+    def get_plan(self, flags, make_plan):
+        """Return the plan for a set of flags, making it if needed.
+        """
+        plan = self.plans.get(flags)
+        if plan is None:
+            plan = make_plan()
+            if len(self.plans) >= self.max_plans:
+                self.plans.clear()
+            self.plans[flags] = plan
+        return plan
+
+
+class TemplateCache(object):
+    """A bounded, thread-safe store of the lines of template files.
+    
+    Files are keyed by absolute path. Once a file has been read, it is
+    checked with os.stat() at most once every check_interval seconds, and
+    read again if its version (see the file_version() function) has
+    changed. So a change is only noticed at the first check after it, up to
+    check_interval seconds later, and one that leaves the version as it was
+    is never noticed. Files are evicted in least-recently-used order once
+    there are more than max_entries of them, or the total size of the files
+    read into memory is more than max_bytes. Mapped files count towards
+    max_entries only.
+    
+    >>> import os, tempfile
+    >>> fd, file_name = tempfile.mkstemp()
+    >>> os.write(fd, '<p>Hello</p>\\n')
+    13
+    >>> os.close(fd)
+    >>> cache = TemplateCache(check_interval=0)
+    >>> cache.load(file_name).lines
+    ('<p>Hello</p>\\n',)
+    >>> cache.load(file_name) is cache.load(file_name)
+    True
+    >>> cache.hits, cache.misses
+    (2, 1)
+    >>> list(cache.load(file_name, mapped=True))
+    ['<p>Hello</p>\\n']
+    >>> os.remove(file_name)
+    """
+    def __init__(self, max_entries=100, max_bytes=32 * 1024 * 1024,
+            check_interval=1.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def load(self, file_name, mapped=False):
+        """Return the TemplateFile for a file, reading it if needed.
+        
+        If mapped is True, the file is memory-mapped instead of read, and
+        the same mapping is shared by everything that loads it.
+        """
+        path = os.path.abspath(file_name)
+        key = (path, mapped)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked < self.check_interval:
+                self._touch(key, entry)
+                self.hits += 1
+                return entry
+        
+        stat = os.stat(path)
+        if entry is not None and file_version(stat) == entry.version:
+            with self._lock:
+                entry.checked = now
+                if key in self._entries:
+                    self._touch(key, entry)
+                self.hits += 1
+            return entry
+        
+        if mapped:
+            new_entry = TemplateFile.map(path, stat)
+        else:
+            new_entry = TemplateFile.read(path, stat)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            self._remove(key)
+            self._entries[key] = new_entry
+            self._bytes += new_entry.memory
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries
+                    or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return new_entry
+    
+    def _touch(self, key, entry):
+        # Re-insert the entry to mark it as the most recently used.
+        del self._entries[key]
+        self._entries[key] = entry
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.memory
+    
+    def clear(self):
+        """Remove every file from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        """Return a dictionary of the cache's counters.
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                }
+
+
+# The store used by TextBlock.cache() when none is given.
+DEFAULT_FRAGMENT_CACHE = FragmentCache()
+
+# The cache used by a Template given cache=True.
+DEFAULT_TEMPLATE_CACHE = TemplateCache()
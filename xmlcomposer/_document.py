@@ -4,9 +4,14 @@
 """A set of classes for easily creating XML documents.
 """
 
+import os
+
 from _text import TextBlock, SubstitutableTextBlock
+from _cache import DEFAULT_TEMPLATE_CACHE, TemplateFile, file_version
 from _namespace import BASE_SCOPE, DocumentScope
 from _layout import DEFAULT_LAYOUT, SPARTAN_LAYOUT, MINIMAL_LAYOUT
+from _render import HOOKS, depends_on
+from _metrics import measure
 
 class Document(TextBlock):
     """A class used to generate an entire document.
@@ -45,9 +50,23 @@ class Document(TextBlock):
         """
         return super(Document, self).render(layout, scope, session)
     
+    def _measure(self, footprint):
+        footprint.container(self.contents)
+    
+    def callbacks(self):
+        for item in self.contents:
+            for callback in item.callbacks():
+                yield callback
+    
     def generate(self, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE, session=None):
         if not isinstance(scope, DocumentScope):
             scope = scope.make_document_scope()
+        lines = self._generate_contents(layout, scope, session)
+        if HOOKS.metrics is not None:
+            return measure(self, layout, lines, HOOKS.metrics)
+        return lines
+    
+    def _generate_contents(self, layout, scope, session):
         for item in self.contents:
             for line in item.generate(layout, scope, session):
                 yield line
@@ -73,20 +92,77 @@ class Template(SubstitutableTextBlock):
     >>> os.remove(file_name)
     >>> print t
     <p>This is a template test!</p>
+    
+    By default, the file is read each time a template is created. Since
+    templates are usually created each time they are used, the lines of
+    their files can instead be kept in a TemplateCache, by passing one as
+    the cache arg, or True for the DEFAULT_TEMPLATE_CACHE shared by the
+    whole process. A cache only checks whether a file has changed at most
+    once every check_interval seconds, a second by default, so a change can
+    take that long to be noticed (see the TemplateCache class).
+    
+    If the iterator arg is True, the file is memory-mapped rather than read
+    into memory, and its lines are produced one at a time as they are
+    generated, which suits very large files. Substitutions work as usual.
+    Since a mapping takes no memory of its own, all the templates of a file
+    share one held by the DEFAULT_TEMPLATE_CACHE unless another
+    TemplateCache is given, or the cache arg is False.
+    
+    Generating a template records its file as an input of the render (see
+    the depends_on() function), along with the version of the file it holds
+    (see the file_version() function).
     """
-    def __init__(self, file_name, iterator=False):
+    def __init__(self, file_name, iterator=False, cache=None):
         self.file_name = file_name
+        if cache is True or (iterator and cache is None):
+            cache = DEFAULT_TEMPLATE_CACHE
         if iterator:
+            if cache is False:
+                self._file = TemplateFile.map(file_name, os.stat(file_name))
+            else:
+                self._file = cache.load(file_name, mapped=True)
             contents = self
-        else:
+        elif cache is None or cache is False:
+            self._file = None
             f = open(file_name, 'r')
+            stat = os.fstat(f.fileno())
             contents = f.readlines()
             f.close()
+        else:
+            self._file = cache.load(file_name)
+            contents = self._file.lines
+        if self._file is not None:
+            self._version = self._file.version
+        else:
+            self._version = file_version(stat)
         super(Template, self).__init__(contents)
     
+    def plan(self):
+        if self._file is None or self._file.lines is None \
+                or self._plan is not None:
+            return super(Template, self).plan()
+        # Share the plan with every template of the file using these flags.
+        flags = tuple(sorted(self._substitutions))
+        self._plan = self._file.get_plan(
+            flags, super(Template, self).plan
+            )
+        return self._plan
+    
     def __iter__(self):
-        with open(self.file_name, 'r') as f:
-            return iter(f)
+        return iter(self._file)
+    
+    def _measure(self, footprint):
+        if self._file is None:
+            super(Template, self)._measure(footprint)
+        else:
+            # The lines and plans are shared through the TemplateCache.
+            footprint.container(self._substitutions)
+    
+    def generate(self, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE, session=None):
+        depends_on('file', os.path.abspath(self.file_name), self._version)
+        lines = super(Template, self).generate(layout, scope, session)
+        for line in lines:
+            yield line
 
 
 class DocType(TextBlock):
@@ -109,6 +185,9 @@ class DocType(TextBlock):
         else:
             self.line = '<!DOCTYPE %s>' % root_name
     
+    def _measure(self, footprint):
+        footprint.text(self.line)
+    
     def generate(self, layout=SPARTAN_LAYOUT, scope=BASE_SCOPE, session=None):
         yield layout(self.line)
 
@@ -8,6 +8,7 @@ from operator import attrgetter
 from xml.sax.saxutils import escape, unescape
 
 from _text import TextBlock, PCData, CallBack
+from _render import FLUSH, HOOKS, flushing, traced
 from _namespace import DocumentScope, BASE_SCOPE
 from _layout import DEFAULT_LAYOUT, SPARTAN_LAYOUT, MINIMAL_LAYOUT
 
@@ -30,6 +31,15 @@ class Element(TextBlock):
     self_closing = True
     default_attributes = {}
     
+    # A frozenset of the attribute names the element permits, or None if any
+    # attribute is acceptable. Names starting with one of the
+    # attribute_prefixes are always permitted. These are only enforced when
+    # check_attributes is True, which can be set on Element itself to turn
+    # checking on for every element class at once.
+    allowed_attributes = None
+    attribute_prefixes = ('xmlns',)
+    check_attributes = False
+    
     def __init__(self, *contents, **attributes):
         """Initialize an element instance.
         
@@ -128,9 +138,28 @@ class Element(TextBlock):
     
     def __setitem__(self, key, value):
         """Add an attribute to the element.
+        
+        If check_attributes is set, the name must be one of the
+        allowed_attributes or a KeyError is raised. Since the constructor
+        sets its keyword args through this method, they are checked as well.
+        
+        >>> class Link(Element):
+        ...     allowed_attributes = frozenset(['href', 'rel'])
+        ...     check_attributes = True
+        >>> Link(href='index.html')['rel'] = 'home'
+        >>> Link(hre='index.html')
+        Traceback (most recent call last):
+            ...
+        KeyError: '"hre" is not a permitted attribute of Link'
         """
         if key.endswith('_'):
             key = key[:-1]
+        if self.check_attributes and self.allowed_attributes is not None \
+                and key not in self.allowed_attributes \
+                and not key.startswith(self.attribute_prefixes):
+            raise KeyError('"%s" is not a permitted attribute of %s' % (
+                key, self.__class__.__name__
+                ))
         self._attributes[key] = self.escape(value, {'"': '&quot;'})
     
     def __getitem__(self, key):
@@ -174,6 +203,16 @@ class Element(TextBlock):
             self._contents.append(item)
             self._content_types.add(self.determine_content_type(item))
     
+    def _measure(self, footprint):
+        footprint.attributes(self._attributes)
+        footprint.container(self._contents)
+        footprint.container(self._content_types, text=False)
+    
+    def callbacks(self):
+        for item in self._contents:
+            for callback in item.callbacks():
+                yield callback
+    
     def has_key(self, key):
         """Returns True if the attribute has been set, False otherwise.
         """
@@ -256,7 +295,7 @@ class Element(TextBlock):
             return 'element'
         elif isinstance(item, PCData):
             return 'pcdata'
-        elif isinstance(item, CallBack):
+        elif isinstance(item, CallBack) and item.return_type is not None:
             if item.return_type.preformatted:
                 return 'preformatted'
             elif issubclass(item.return_type, Element):
@@ -300,16 +339,21 @@ class Element(TextBlock):
         """
         if not self._content_types:
             if self.self_closing:
-                return self._generate_empty(layout, scope, session)
+                lines = self._generate_empty(layout, scope, session)
             else:
-                return self._generate_flat(layout, scope, session)
+                lines = self._generate_flat(layout, scope, session)
         elif self.preformatted or 'preformatted' in self._content_types:
-            return self._generate_preformatted(layout, scope, session)
+            lines = self._generate_preformatted(layout, scope, session)
         elif 'pcdata' in self._content_types \
                 and 'indeterminate' not in self._content_types:
-            return self._generate_flat(layout, scope, session)
+            lines = self._generate_flat(layout, scope, session)
         else:
-            return self._generate_nested(layout, scope, session)
+            lines = self._generate_nested(layout, scope, session)
+        if HOOKS.active:
+            if HOOKS.metrics is not None:
+                HOOKS.metrics.count('elements')
+            return traced('element', self.tag_name, lines)
+        return lines
     
     def _generate_empty(self, layout, scope, session):
         xmlns = self.determine_scope(scope)[0]
@@ -325,7 +369,9 @@ class Element(TextBlock):
         yield self.open_tag(xmlns)
         for element in self._contents:
             if isinstance(element, CallBack):
-                element = element.func(session)
+                if flushing():
+                    yield FLUSH
+                element = element.resolve(session)
             for line in element.generate(MINIMAL_LAYOUT, inner_scope, session):
                 yield line
         yield layout(self.close_tag())
@@ -335,7 +381,7 @@ class Element(TextBlock):
         parts = []
         for element in self._contents:
             if isinstance(element, CallBack):
-                element = element.func(session)
+                element = element.resolve(session)
             part = ''.join(
                 element.generate(MINIMAL_LAYOUT, inner_scope, session)
                 )
@@ -350,7 +396,9 @@ class Element(TextBlock):
         yield layout(self.open_tag(xmlns))
         for element in self._contents:
             if isinstance(element, CallBack):
-                element = element.func(session)
+                if flushing():
+                    yield FLUSH
+                element = element.resolve(session)
             for line in element.generate(layout.indent(), inner_scope, session):
                 yield line
         yield layout(self.close_tag())
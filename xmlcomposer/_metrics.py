@@ -0,0 +1,233 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Counters and latency histograms for monitoring a process that renders.
+
+Metrics are off until they are enabled, since they add a little work to the
+generation of every element. Once on, they count the documents generated,
+the elements generated within them and the bytes they produce for each
+layout, and time each CallBack, each schema.load() and each
+export.to_file(). A snapshot of them all, along with the counters of the
+fragment and template caches, can be taken at any time, such as to serve to
+a monitoring system.
+
+>>> from xmlcomposer import Document, Element
+>>> class Page(Element): pass
+>>> class Item(Element): pass
+>>> metrics = Metrics().enable()
+>>> print Document(Page(Item('One'), Item('Two')))
+<page>
+    <item>One</item>
+    <item>Two</item>
+</page>
+>>> snapshot = metrics.snapshot()
+>>> snapshot['documents'], snapshot['elements'], snapshot['bytes']
+(1, 3, {'default': 51})
+>>> metrics.disable()
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from _cache import DEFAULT_FRAGMENT_CACHE, DEFAULT_TEMPLATE_CACHE
+from _layout import DEFAULT_LAYOUT, SPARTAN_LAYOUT, MINIMAL_LAYOUT
+from _render import HOOKS, _hooks_lock
+
+# The upper bounds, in seconds, of the buckets of a Histogram by default.
+DEFAULT_BOUNDS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+    )
+
+_LAYOUT_NAMES = {
+    DEFAULT_LAYOUT: 'default',
+    SPARTAN_LAYOUT: 'spartan',
+    MINIMAL_LAYOUT: 'minimal',
+    }
+
+
+class Histogram(object):
+    """Counts observed durations in buckets of increasing size.
+    
+    Each bucket counts the durations no longer than its bound and longer
+    than the bound before it, and a last bucket counts those longer than
+    every bound. Histograms are not thread-safe on their own; Metrics
+    updates them under its lock.
+    """
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, seconds):
+        index = 0
+        for bound in self.bounds:
+            if seconds <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+    
+    def snapshot(self):
+        """Return the histogram as a dictionary.
+        
+        The buckets are cumulative, as (bound, count) pairs where count is
+        the number of durations no longer than bound, ending with a bound
+        of None that counts them all.
+        """
+        buckets = []
+        total = 0
+        for bound, count in zip(self.bounds + (None,), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class Metrics(object):
+    """A thread-safe record of what the process has rendered.
+    
+    Only one Metrics is kept at a time: the one most recently enabled with
+    the enable() method.
+    
+    If slow_threshold is given, a document that takes more than that many
+    seconds to generate is counted as a slow render, and the on_slow()
+    method is called with it. As output is generated lazily, the time
+    includes any time the consumer of the output takes between lines.
+    
+    The caches arg maps names to the caches whose counters are included in
+    snapshots, by default the DEFAULT_FRAGMENT_CACHE and
+    DEFAULT_TEMPLATE_CACHE.
+    """
+    def __init__(self, slow_threshold=None, caches=None,
+            bounds=DEFAULT_BOUNDS):
+        self.slow_threshold = slow_threshold
+        if caches is None:
+            caches = {
+                'fragments': DEFAULT_FRAGMENT_CACHE,
+                'templates': DEFAULT_TEMPLATE_CACHE,
+                }
+        self.caches = caches
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def enable(self):
+        """Start keeping metrics in this instance, and return it.
+        """
+        with _hooks_lock:
+            HOOKS.metrics = self
+            HOOKS.update()
+        return self
+    
+    def disable(self):
+        """Stop keeping metrics, if this instance is the one being kept.
+        """
+        with _hooks_lock:
+            if HOOKS.metrics is self:
+                HOOKS.metrics = None
+                HOOKS.update()
+    
+    def reset(self):
+        """Set every counter and histogram back to zero.
+        """
+        with self._lock:
+            self._counters = defaultdict(int)
+            self._histograms = {}
+    
+    def count(self, name, amount=1, label=None):
+        """Add to a counter, or to a counter of a label within it.
+        """
+        with self._lock:
+            self._counters[name, label] += amount
+    
+    def observe(self, name, seconds, label=None):
+        """Record a duration in a histogram, or in one of a label within it.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, label))
+            if histogram is None:
+                histogram = Histogram(self.bounds)
+                self._histograms[name, label] = histogram
+            histogram.observe(seconds)
+    
+    def generated(self, document, layout, size, seconds):
+        """Record a document that finished generating.
+        """
+        layout = _LAYOUT_NAMES.get(layout) or str(layout)
+        slow = self.slow_threshold is not None \
+            and seconds > self.slow_threshold
+        with self._lock:
+            self._counters['documents', None] += 1
+            self._counters['bytes', layout] += size
+            if slow:
+                self._counters['slow_renders', None] += 1
+        self.observe('render_seconds', seconds)
+        if slow:
+            self.on_slow(document, seconds)
+    
+    def on_slow(self, document, seconds):
+        """Report a document that was slow to generate.
+        
+        This does nothing by default, and may be replaced, such as to log
+        the document.
+        """
+        pass
+    
+    def snapshot(self):
+        """Return all the metrics as a dictionary.
+        
+        Unlabelled counters map their names to their values, and labelled
+        counters map their names to dictionaries of the values of their
+        labels. Histograms are given in the same way, as returned by the
+        Histogram.snapshot() method. The counters of each cache are under
+        'caches', along with its hit rate.
+        
+        The counters kept are 'documents', 'elements', 'slow_renders',
+        'bytes' for each layout, 'callbacks' for each CallBack function
+        name, 'schema_loads', and 'exports' for each result of to_file(),
+        'written' or 'unchanged'. The histograms are 'render_seconds',
+        'callback_seconds' for each CallBack function name,
+        'schema_seconds', and 'export_seconds'.
+        """
+        snapshot = {
+            'documents': 0,
+            'elements': 0,
+            'slow_renders': 0,
+            'schema_loads': 0,
+            'bytes': {},
+            'callbacks': {},
+            'exports': {},
+            }
+        with self._lock:
+            for (name, label), value in self._counters.items():
+                _place(snapshot, name, label, value)
+            for (name, label), histogram in self._histograms.items():
+                _place(snapshot, name, label, histogram.snapshot())
+        snapshot['caches'] = caches = {}
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = None
+            if lookups:
+                stats['hit_rate'] = float(stats['hits']) / lookups
+            caches[name] = stats
+        return snapshot
+
+def _place(snapshot, name, label, value):
+    if label is None:
+        snapshot[name] = value
+    else:
+        snapshot.setdefault(name, {})[label] = value
+
+def measure(document, layout, lines, metrics):
+    """Generate the lines of a document, recording it with metrics.
+    """
+    start = time.time()
+    size = 0
+    for line in lines:
+        size += len(line)
+        yield line
+    metrics.generated(document, layout, size, time.time() - start)
@@ -0,0 +1,650 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Renderers, which control how CallBacks are run while generating output.
+
+Normally, each CallBack is run at the moment generation reaches it, so a
+document with many slow CallBacks spends the sum of their run times waiting.
+A renderer can instead start CallBacks before generation reaches them, and
+hand over their results as they are needed. The output is identical, and
+is still produced lazily and in document order.
+
+A renderer is used in place of calling the generate() or render() methods
+of a TextBlock directly:
+
+>>> from xmlcomposer import Element, CallBack, PCData
+>>> class Greeting(Element): pass
+>>> hello = CallBack(lambda session: PCData('Hello %s!' % session), PCData)
+>>> list(ConcurrentRenderer().generate(Greeting(hello), session='World'))
+['<greeting>Hello World!</greeting>\\n']
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+try:
+    from concurrent.futures import TimeoutError as _FuturesTimeoutError
+except ImportError:
+    # Without the futures package, there are no futures to time out.
+    _FuturesTimeoutError = ()
+
+from _layout import DEFAULT_LAYOUT
+from _namespace import BASE_SCOPE
+
+_local = threading.local()
+
+class _Flush(str):
+    pass
+
+# Marks a point in the output where what has been generated so far should be
+# sent on, such as before waiting on a CallBack. It is an empty string, so
+# joining the output is unaffected, and is only generated when a renderer
+# asks for flush points.
+FLUSH = _Flush()
+
+def current_render():
+    """Return the RenderState of the render running in this thread, if any.
+    """
+    return getattr(_local, 'render', None)
+
+def flushing():
+    """Return True if the render running in this thread wants flush points.
+    """
+    render = getattr(_local, 'render', None)
+    return render is not None and render.flush
+
+class _Hooks(object):
+    # What generation must do besides producing output: the number of traced
+    # renders running in every thread, and the Metrics being kept, if any.
+    # Generation tests active before looking further, so the hooks cost next
+    # to nothing while unused.
+    
+    def __init__(self):
+        self.renders = 0
+        self.metrics = None
+        self.active = False
+    
+    def update(self):
+        self.active = bool(self.renders or self.metrics is not None)
+
+HOOKS = _Hooks()
+_hooks_lock = threading.Lock()
+
+def traced(kind, name, lines):
+    """Return the lines, traced if the render in this thread has a Tracer.
+    
+    The kind and name args describe the part of the document the lines
+    are generated for (see the Tracer class).
+    """
+    render = getattr(_local, 'render', None)
+    if render is None or render.tracer is None:
+        return lines
+    return _trace_lines(render.tracer, kind, name, lines)
+
+def _trace_lines(tracer, kind, name, lines):
+    tracer.enter(kind, name, time.time())
+    size = 0
+    try:
+        for line in lines:
+            size += len(line)
+            yield line
+    finally:
+        tracer.leave(kind, name, time.time(), size)
+
+def _generate_later(block, layout, scope, session):
+    for line in block.generate(layout, scope, session):
+        yield line
+
+def depends_on(kind, key, version=None):
+    """Record an input that the output of the render in this thread uses.
+    
+    Builds (see the export.Build class) use the inputs recorded while a
+    document is rendered to tell when it must be rendered again. The kind
+    arg names the type of input, such as 'file', 'schema' or 'data', and the
+    key arg identifies it. The version arg, if given, identifies the
+    contents of the input that the render used. Both must be hashable.
+    
+    Templates, schema.load() and named Loaders record what they read, and
+    a CallBack can record any other input it reads. Nothing is recorded
+    unless the render was asked to track its inputs, or outside of a render,
+    such as in the threads a ConcurrentRenderer runs CallBacks in.
+    """
+    render = getattr(_local, 'render', None)
+    if render is not None and render.dependencies is not None:
+        render.dependencies.add((kind, key, version))
+
+def wait(result, timeout=None):
+    """Wait for the TextBlock from a deferred CallBack and return it.
+    
+    Deferred results are objects with a result() method, such as a future,
+    or a get() method, such as the AsyncResult returned by the
+    multiprocessing pools. Anything else is returned unchanged.
+    
+    If the result is not ready within timeout seconds, TimeoutError is
+    raised.
+    """
+    try:
+        if hasattr(result, 'result'):
+            return result.result(timeout)
+        elif hasattr(result, 'get'):
+            return result.get(timeout)
+        else:
+            return result
+    except _FuturesTimeoutError, e:
+        # Futures raise their own kind of TimeoutError. Use ours instead.
+        raise TimeoutError(str(e))
+
+
+class Renderer(object):
+    """Generates output, running each CallBack when generation reaches it.
+    
+    This behaves exactly like calling the generate() and render() methods
+    of a TextBlock directly, and is mostly useful as a base class, and for
+    its chunks() method.
+    """
+    def render(self, block, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE,
+            session=None):
+        """Return the entire output of a TextBlock as a string.
+        
+        The arguments are identical to the generate() method.
+        """
+        return ''.join(self.generate(block, layout, scope, session))
+    
+    def generate(self, block, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE,
+            session=None, flush=False, dependencies=None, tracer=None):
+        """Return a generator that produces the output of a TextBlock.
+        
+        The block arg is the TextBlock to generate, usually a Document. The
+        remaining args are passed on to its generate() method.
+        
+        The render starts at once, and calling the generator's close()
+        method ends it and releases anything it holds, even if no output
+        has been taken from it yet.
+        
+        If the flush arg is True, the FLUSH marker is generated at each
+        point where the output so far should be sent on before generation
+        continues: just before an Element waits on a CallBack in its
+        contents, and wherever a FlushPoint is placed. FLUSH is an empty
+        string, and can be told apart from other lines with the is operator.
+        
+        If the dependencies arg is a set, the inputs the output is made from
+        are added to it as (kind, key, version) tuples as they are read (see
+        the depends_on() function).
+        
+        If the tracer arg is given, it is a Tracer that is told as
+        generation enters and leaves each element, CallBack and substitution.
+        """
+        state = self.start(block, session)
+        state.flush = flush
+        state.dependencies = dependencies
+        state.tracer = tracer
+        if tracer is None:
+            lines = block.generate(layout, scope, session)
+        else:
+            # Start generating once the render is running, so the tracer
+            # sees the outermost element too.
+            lines = _generate_later(block, layout, scope, session)
+        return _Render(state, self._run(state, lines))
+    
+    def chunks(self, block, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE,
+            session=None):
+        """Return a generator that produces the output in flushable chunks.
+        
+        Each chunk is a string holding the lines generated between two
+        flush points (see the generate() method), so the static markup
+        before a CallBack can be sent to a client before the CallBack runs.
+        
+        >>> import time
+        >>> from xmlcomposer import Element, CallBack, PCData
+        >>> class Body(Element): pass
+        >>> class P(Element): pass
+        >>> def slow(session):
+        ...     time.sleep(0.1)
+        ...     return P('Done')
+        >>> body = Body(P('Loading...'), CallBack(slow, P))
+        >>> for chunk in Renderer().chunks(body):
+        ...     print repr(chunk)
+        '<body>\\n\\t<p>Loading...</p>\\n'
+        '\\t<p>Done</p>\\n</body>\\n'
+        """
+        chunk = []
+        for line in self.generate(block, layout, scope, session, flush=True):
+            if line is FLUSH:
+                if chunk:
+                    yield ''.join(chunk)
+                    chunk = []
+            else:
+                chunk.append(line)
+        if chunk:
+            yield ''.join(chunk)
+    
+    def start(self, block, session):
+        """Return the RenderState used to generate the block's output.
+        """
+        return RenderState(self, block, session)
+    
+    def _run(self, state, lines):
+        # Make the state visible to CallBacks while each line is generated.
+        # Since lines are generated lazily, the state is set and restored on
+        # each step, which also keeps interleaved renders in a single thread
+        # apart.
+        if state.tracer is not None:
+            with _hooks_lock:
+                HOOKS.renders += 1
+                HOOKS.update()
+        try:
+            while True:
+                previous = getattr(_local, 'render', None)
+                _local.render = state
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    break
+                finally:
+                    _local.render = previous
+                yield line
+        finally:
+            if state.tracer is not None:
+                with _hooks_lock:
+                    HOOKS.renders -= 1
+                    HOOKS.update()
+            state.close()
+
+
+class _Render(object):
+    # The generator returned by Renderer.generate(). Closing a generator
+    # that has not started does not run its finally clauses, so the render
+    # state, which may already have started work, is closed here instead.
+    # Iterating it iterates the generator itself, at no cost per line.
+    
+    def __init__(self, state, lines):
+        self.state = state
+        self.lines = lines
+    
+    def __iter__(self):
+        return self.lines
+    
+    def next(self):
+        return next(self.lines)
+    
+    def close(self):
+        frame = self.lines.gi_frame
+        self.lines.close()
+        if frame is not None and frame.f_lasti == -1:
+            self.state.close()
+
+
+class RenderState(object):
+    """The state of a single render, which resolves its CallBacks.
+    """
+    def __init__(self, renderer, block, session):
+        self.renderer = renderer
+        self.block = block
+        self.session = session
+        # Whether FLUSH markers are generated.
+        self.flush = False
+        # The set the inputs of the render are recorded in, if any.
+        self.dependencies = None
+        # The Tracer told of the parts of the document generated, if any.
+        self.tracer = None
+        # Maps each Loader to its batch of (keys, values) once loaded.
+        self.batches = {}
+        self.batch_keys = None
+    
+    def resolve(self, callback, session):
+        """Run a CallBack, returning the TextBlock it produces.
+        """
+        if callback.loader is not None and session is self.session:
+            value = self.load(callback.loader, callback.key)
+            return callback.format(value, session)
+        result = callback.func(session)
+        if callback.deferred:
+            result = wait(result)
+        return result
+    
+    def load(self, loader, key):
+        """Return the value for a key, loading the key's whole batch at once.
+        
+        The first time a Loader is needed, it loads the keys of every
+        BatchCallBack in the render that uses it.
+        """
+        if loader.name is not None and self.dependencies is not None:
+            self.dependencies.add(('data', (loader.name, key), None))
+        if self.batch_keys is None:
+            self.batch_keys = self.find_batch_keys()
+        batch = self.batches.get(loader)
+        if batch is None:
+            keys = self.batch_keys.pop(loader, None) or [key]
+            batch = self.batches[loader] = (set(keys), self.fetch(loader, keys))
+        keys, values = batch
+        if key not in keys:
+            # This key only appeared in the output of another CallBack.
+            return loader.load([key], self.session).get(key)
+        return values.get(key)
+    
+    def find_batch_keys(self):
+        """Map each Loader in the block to the keys it needs to load.
+        """
+        batch_keys = {}
+        seen = set()
+        for callback in self.block.callbacks():
+            if callback.loader is not None \
+                    and (callback.loader, callback.key) not in seen:
+                seen.add((callback.loader, callback.key))
+                batch_keys.setdefault(callback.loader, []).append(callback.key)
+        return batch_keys
+    
+    def fetch(self, loader, keys):
+        """Load a batch of keys, returning a dictionary of their values.
+        """
+        return loader.load(keys, self.session)
+    
+    def close(self):
+        """Release anything still held once the render is over.
+        """
+        pass
+
+
+class Loader(object):
+    """Fetches the data for many BatchCallBacks with a single call.
+    
+    The func arg is called with a list of keys and the session, and should
+    return a dictionary mapping each key to its value. It may return a
+    sequence of values in the same order as the keys instead.
+    
+    When a renderer generates the output, the keys of all the BatchCallBacks
+    sharing a Loader are gathered, and loaded together the first time one
+    of them is needed. Otherwise, each BatchCallBack loads its own key.
+    
+    If the name arg is given, each key used in a render is recorded as a
+    ('data', (name, key)) input of it (see the depends_on() function).
+    
+    >>> from xmlcomposer import Element, BatchCallBack
+    >>> class Price(Element): pass
+    >>> def fetch_prices(keys, session):
+    ...     print 'fetching', keys
+    ...     return [key * 1.5 for key in keys]
+    >>> prices = Loader(fetch_prices)
+    >>> table = Price(*[Price(BatchCallBack(prices, n)) for n in (1, 2, 3)])
+    >>> print Renderer().render(table)
+    fetching [1, 2, 3]
+    <price>
+        <price>1.5</price>
+        <price>3.0</price>
+        <price>4.5</price>
+    </price>
+    """
+    def __init__(self, func, name=None):
+        self.func = func
+        self.name = name
+    
+    def load(self, keys, session):
+        """Return a dictionary mapping keys to values for a list of keys.
+        """
+        values = self.func(keys, session)
+        if not isinstance(values, dict):
+            values = dict(zip(keys, values))
+        return values
+
+
+class ConcurrentRenderer(Renderer):
+    """Generates output, running CallBacks concurrently.
+    
+    A deferred CallBack (see the CallBack class) starts its work and returns
+    right away. This renderer starts every deferred CallBack found in the
+    tree as soon as the render begins, so their work overlaps. The results
+    are then waited on in document order as generation reaches them.
+    
+    Ordinary CallBacks block until their work is done, so they can only
+    overlap by running in separate threads. If a thread pool is available,
+    every ordinary CallBack found in the tree is submitted to it as soon as
+    the render begins too. The threads arg sets the number of threads in a
+    pool owned by the renderer. Alternatively, the pool arg can be any
+    existing pool with an apply_async() method, such as a
+    multiprocessing.pool.ThreadPool, which allows several renderers to share
+    one pool. Without a pool, ordinary CallBacks are run when generation
+    reaches them.
+    
+    >>> import time
+    >>> from xmlcomposer import Element, CallBack, PCData
+    >>> class Price(Element): pass
+    >>> def slow_price(session):
+    ...     time.sleep(0.1)
+    ...     return PCData('$%.2f' % session['price'])
+    >>> prices = [Price(CallBack(slow_price, PCData)) for n in range(10)]
+    >>> prices = Price(*prices)
+    >>> renderer = ConcurrentRenderer(threads=10)
+    >>> start = time.time()
+    >>> output = renderer.render(prices, session={'price': 2.5})
+    >>> time.time() - start < 0.5
+    True
+    >>> renderer.close()
+    
+    The CallBacks receive the same session arg as in any other render, and
+    an exception raised by one is raised from the generator at the same
+    point in the output where a serial render would raise it. However,
+    CallBacks run in pool threads, and may run even though generation never
+    reaches them, such as when an earlier CallBack raises an exception or
+    when a condition set with the on() method turns part of the tree off.
+    Their results are then discarded.
+    
+    Starting too much work at once can overwhelm the services the CallBacks
+    depend on. The lookahead arg, if given, limits how many CallBacks may be
+    started but not yet reached by generation. Since the output is a
+    generator, generation only advances as fast as it is consumed, so a slow
+    consumer also slows the rate at which CallBacks are started.
+    
+    CallBacks that only appear in the output of other CallBacks are not
+    known in advance, and are run when generation reaches them.
+    
+    A CallBack given a timeout (see the CallBack class) that was started
+    ahead of time is only waited on for that many seconds. After that, its
+    fallback content is generated in its place. The deadline arg similarly
+    limits the time spent waiting on CallBacks in the whole render, counted
+    from the moment it begins. Once the deadline has passed, the fallback of
+    every CallBack is used without running it. A batch of BatchCallBacks is
+    waited on until the deadline as well, and if it has not loaded by then,
+    the fallback of every BatchCallBack using its Loader is used. Each time
+    a fallback is used, on_timeout() is called, which counts the timeouts
+    by default.
+    
+    >>> def slow(session):
+    ...     time.sleep(1)
+    ...     return PCData('Too late')
+    >>> fallback = PCData('Not available')
+    >>> late = Price(CallBack(slow, PCData, timeout=0.1, fallback=fallback))
+    >>> renderer = ConcurrentRenderer(threads=2)
+    >>> print renderer.render(late)
+    <price>Not available</price>
+    >>> renderer.timeouts
+    1
+    >>> renderer.close()
+    
+    The work of a CallBack that times out cannot be interrupted, and its
+    thread remains busy until it finishes.
+    """
+    def __init__(self, lookahead=None, threads=None, pool=None,
+            deadline=None):
+        self.lookahead = lookahead
+        self._owns_pool = pool is None and bool(threads)
+        if self._owns_pool:
+            pool = ThreadPool(threads)
+        self.pool = pool
+        self.deadline = deadline
+        self.timeouts = 0
+        self._lock = threading.Lock()
+    
+    def on_timeout(self, callback, session):
+        """Record a CallBack that was replaced by its fallback content.
+        """
+        with self._lock:
+            self.timeouts += 1
+    
+    def start(self, block, session):
+        return ConcurrentRenderState(self, block, session)
+    
+    def close(self):
+        """Shut down the renderer's own thread pool, if it has one.
+        """
+        if self._owns_pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self._owns_pool = False
+
+
+class ConcurrentRenderState(RenderState):
+    
+    def __init__(self, renderer, block, session):
+        super(ConcurrentRenderState, self).__init__(renderer, block, session)
+        self.lookahead = renderer.lookahead
+        self.pool = renderer.pool
+        self.deadline = None
+        if renderer.deadline is not None:
+            self.deadline = time.time() + renderer.deadline
+        self.callbacks = block.callbacks()
+        # Started CallBacks in document order, as (callback, outcome) pairs.
+        self.started = deque()
+        # How many times each CallBack is in started, by id, so CallBacks
+        # that were not started are told apart without searching it.
+        self.started_ids = {}
+        self.fill()
+        
+        # Start loading every batch right away too.
+        self.loading = {}
+        # The Loaders whose batch was not loaded before the deadline.
+        self.timed_out = set()
+        if self.pool is not None:
+            self.batch_keys = self.find_batch_keys()
+            for loader, keys in self.batch_keys.items():
+                self.loading[loader] = self.pool.apply_async(
+                    loader.load, (keys, session)
+                    )
+    
+    def fill(self):
+        """Start CallBacks until the lookahead limit is reached.
+        """
+        while self.callbacks is not None and (
+                self.lookahead is None or len(self.started) < self.lookahead):
+            for callback in self.callbacks:
+                if self.should_start(callback):
+                    self.started.append((callback, self.begin(callback)))
+                    key = id(callback)
+                    self.started_ids[key] = self.started_ids.get(key, 0) + 1
+                    break
+            else:
+                self.callbacks = None
+    
+    def should_start(self, callback):
+        if callback.loader is not None:
+            # These are loaded a batch at a time instead.
+            return False
+        if self.deadline is not None and time.time() >= self.deadline:
+            # Its fallback will be used, so there is no point starting it.
+            return False
+        return callback.deferred or self.pool is not None
+    
+    def begin(self, callback):
+        """Start a CallBack, returning a function that returns its result.
+        """
+        if not callback.deferred:
+            result = self.pool.apply_async(callback.func, (self.session,))
+            return result.get
+        
+        try:
+            result = callback.func(self.session)
+        except Exception:
+            error = sys.exc_info()
+            def outcome(timeout=None):
+                raise error[0], error[1], error[2]
+        else:
+            def outcome(timeout=None):
+                return wait(result, timeout)
+        return outcome
+    
+    def resolve(self, callback, session):
+        outcome = None
+        if session is self.session and id(callback) in self.started_ids:
+            while True:
+                started, outcome = self.pop_started()
+                if started is callback:
+                    break
+                # It was skipped by generation.
+                self.discard(started, outcome)
+        timeout = self.time_limit(callback)
+        if timeout is not None and timeout <= 0:
+            result = self.fall_back(callback, session)
+        elif outcome is None:
+            try:
+                result = super(ConcurrentRenderState, self).resolve(
+                    callback, session
+                    )
+            except TimeoutError:
+                if callback.loader is None:
+                    raise
+                # Its batch was not loaded before the deadline.
+                result = self.fall_back(callback, session)
+        else:
+            try:
+                result = outcome(timeout)
+            except TimeoutError:
+                result = self.fall_back(callback, session)
+        self.fill()
+        return result
+    
+    def time_limit(self, callback):
+        """Return how long to wait for a CallBack, or None for no limit.
+        """
+        timeout = callback.timeout
+        if self.deadline is not None:
+            remaining = self.deadline - time.time()
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        return timeout
+    
+    def fall_back(self, callback, session):
+        """Return the fallback content of a CallBack that ran out of time.
+        """
+        self.renderer.on_timeout(callback, session)
+        return callback.fallback
+    
+    def fetch(self, loader, keys):
+        # A batch is waited on until the deadline, if any. Once a batch
+        # has run out of time, the fallback of every CallBack using its
+        # Loader is used.
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline - time.time()
+        if loader in self.timed_out or (timeout is not None and timeout <= 0
+                and loader not in self.loading):
+            self.timed_out.add(loader)
+            raise TimeoutError('The batch was not loaded in time.')
+        if loader in self.loading:
+            try:
+                return self.loading.pop(loader).get(timeout)
+            except TimeoutError:
+                self.timed_out.add(loader)
+                raise
+        return super(ConcurrentRenderState, self).fetch(loader, keys)
+    
+    def pop_started(self):
+        """Remove the earliest started CallBack, returning it and its outcome.
+        """
+        callback, outcome = self.started.popleft()
+        key = id(callback)
+        self.started_ids[key] -= 1
+        if not self.started_ids[key]:
+            del self.started_ids[key]
+        return callback, outcome
+    
+    def discard(self, callback, outcome):
+        pass
+    
+    def close(self):
+        while self.started:
+            self.discard(*self.pop_started())
+        self.callbacks = None
@@ -6,9 +6,14 @@
 
 import re
 import inspect
+import sys
+import time
+from collections import defaultdict
 
 from _layout import SPARTAN_LAYOUT
 from _namespace import BASE_SCOPE
+from _render import FLUSH, HOOKS, current_render, flushing, traced, wait
+from _cache import DEFAULT_FRAGMENT_CACHE
 
 class TextBlock(object):
     """A holder for intermingled character data and markup.
@@ -139,6 +144,61 @@ class TextBlock(object):
         for line in self._contents:
             yield layout(line)
     
+    def callbacks(self):
+        """Return an iterator over the CallBacks contained in the block.
+        
+        The CallBacks are produced in the order generation would reach them,
+        and a CallBack used in several places is produced once for each. Only
+        the CallBacks that are part of the block itself are included, not
+        any found in the output of other CallBacks.
+        
+        Renderers use this to find CallBacks to run ahead of time.
+        """
+        return iter(())
+    
+    def footprint(self):
+        """Return a dictionary estimating the memory the block holds.
+        
+        The block and every block within it are walked, without generating
+        anything, and the dictionary holds:
+            
+            nodes            the number of blocks
+            classes          the number of blocks of each class, by name
+            text_bytes       the length of the text they hold
+            attribute_bytes  the length of the names and values of the
+                             attributes of elements
+            estimated_bytes  the size of the blocks and the objects they
+                             hold, such as the lists of the contents of
+                             elements and the dictionaries of their
+                             attributes, as reported by sys.getsizeof()
+        
+        An object held in several places, such as a block used twice in a
+        tree, is counted once. The output of CallBacks is not known until
+        generation, so only the CallBacks themselves are counted, and the
+        lines of a Template in a TemplateCache belong to the cache, so they
+        are left out as well.
+        
+        >>> from xmlcomposer import Element
+        >>> class Page(Element): pass
+        >>> class Item(Element): pass
+        >>> footprint = Page(Item('One', id_='1'), Item('Two')).footprint()
+        >>> footprint['nodes'], footprint['text_bytes']
+        (5, 6)
+        >>> sorted(footprint['classes'].items())
+        [('Item', 2), ('PCData', 2), ('Page', 1)]
+        >>> footprint['attribute_bytes']
+        3
+        """
+        footprint = _Footprint()
+        footprint.block(self)
+        while footprint.pending:
+            footprint.pending.pop()._measure(footprint)
+        return footprint.result()
+    
+    def _measure(self, footprint):
+        # Tell footprint() what the block holds.
+        footprint.container(self._contents)
+    
     def generate_empty(self, *args, **kwargs):
         """Return an empty generator.
         
@@ -197,8 +257,104 @@ class TextBlock(object):
         
         elif not condition:
             self.generate = self.generate_empty
+            self.callbacks = self.generate_empty
         
         return self
+    
+    def cache(self, name, key=None, ttl=None, store=None):
+        """Reuse the generated output instead of generating it every time.
+        
+        The name arg identifies the block within the store, so every block
+        cached under a name must generate the same output. Since the name
+        is not tied to the block object, blocks built anew for each request
+        share their cached output, as do blocks in different processes
+        sharing a store.
+        
+        Output is cached separately for each layout and scope it is
+        generated with. If it depends on the session as well, the key arg
+        should be a function that accepts the session and returns a hashable
+        value, such as the parts of the session the output depends on. Output
+        is then cached separately for each key.
+        
+        >>> calls = []
+        >>> def greet(session):
+        ...     calls.append(session['name'])
+        ...     return PCData('Hello %s!' % session['name'])
+        >>> greeting = CallBack(greet).cache('greeting', lambda s: s['name'])
+        >>> print greeting.render(session={'name': 'Alice', 'visits': 1})
+        Hello Alice!
+        >>> print greeting.render(session={'name': 'Alice', 'visits': 2})
+        Hello Alice!
+        >>> calls
+        ['Alice']
+        
+        The ttl arg is the number of seconds the output can be reused for.
+        If it is None, the output is kept until the store evicts it.
+        
+        The store arg is the FragmentCache to keep the output in, or an
+        object with the same get() and set() methods, which allows storage
+        to be shared between processes. By default, DEFAULT_FRAGMENT_CACHE
+        is used.
+        
+        CallBacks in a cached block are not run ahead of time by a
+        ConcurrentRenderer, since on a cache hit they would not be needed.
+        
+        The inputs recorded while the output is generated (see the
+        depends_on() function) are cached along with it, and recorded again
+        each time it is reused, so a Build still knows what a document
+        using it is made from.
+        """
+        if store is None:
+            store = DEFAULT_FRAGMENT_CACHE
+        layout, scope, session = inspect.getargspec(self.generate).defaults
+        previous_generate = self.generate
+        
+        def generate_cached(self, layout=layout, scope=scope, session=session):
+            generate = previous_generate
+            cache_key = (
+                name,
+                key(session) if key else None,
+                layout,
+                scope.__class__.__name__,
+                scope,
+                )
+            render = current_render()
+            tracking = render is not None and render.dependencies is not None
+            entry = store.get(cache_key)
+            if entry is not None:
+                lines, inputs = entry
+                if not tracking:
+                    return iter(lines)
+                if inputs is not None:
+                    # Replay the inputs the cached output was made from.
+                    render.dependencies.update(inputs)
+                    return iter(lines)
+                # The inputs were not tracked when the output was cached.
+            
+            inputs = None
+            if tracking:
+                found = render.dependencies
+                render.dependencies = set()
+                try:
+                    lines = _cacheable(generate, layout, scope, session)
+                finally:
+                    inputs = tuple(render.dependencies)
+                    render.dependencies = found
+                found.update(inputs)
+            else:
+                lines = _cacheable(generate, layout, scope, session)
+            store.set(cache_key, (lines, inputs), ttl)
+            return iter(lines)
+        
+        # Bind the closure as an instance method.
+        self.generate = generate_cached.__get__(self, self.__class__)
+        self.callbacks = self.generate_empty
+        return self
+
+
+def _cacheable(generate, layout, scope, session):
+    lines = generate(layout, scope, session)
+    return tuple(line for line in lines if line is not FLUSH)
 
 
 class SubstitutableTextBlock(TextBlock):
@@ -209,7 +365,16 @@ class SubstitutableTextBlock(TextBlock):
     """
     def __init__(self, lines):
         super(SubstitutableTextBlock, self).__init__(lines)
-        self._substitutions = []
+        # Maps each flag to the callback that substitutes for it.
+        self._substitutions = {}
+        self._flag_regex = None
+        self._plan = None
+    
+    def _measure(self, footprint):
+        super(SubstitutableTextBlock, self)._measure(footprint)
+        footprint.container(self._substitutions)
+        if self._plan is not None:
+            footprint.container(self._plan, text=False)
     
     def substitute(self, flag, callback):
         """Set up a substitution which will occur at generation time.
@@ -232,32 +397,80 @@ class SubstitutableTextBlock(TextBlock):
         Hello Alice!
         >>> print e.render(session={'name': 'Bob'})
         Hello Bob!
-        """
-        def yield_substituted_lines(contents, layout, scope, session):
-            """A generator-function closure for handling substitutions.
-            """
-            for line in contents:
-                parts = line.split(flag)
-                new_line = parts.pop(0)
-                for part in parts:
-                    substitute = callback(session).generate(
-                        layout, scope, session
-                        )
-                    new_line += ''.join(substitute).strip()
-                    new_line += part
-                yield new_line
         
-        self._substitutions.append(yield_substituted_lines)
+        All the flags are found in a single pass over each line, and where
+        flags overlap, the longest is substituted. The content substituted
+        for a flag is not searched for other flags. If the same flag is
+        substituted more than once, the first callback is used.
+        """
+        if flag not in self._substitutions:
+            self._substitutions[flag] = callback
+            self._flag_regex = None
+            self._plan = None
         return self
     
+    def plan(self):
+        """Return the contents split into parts around the flags they hold.
+        
+        Each line becomes a tuple alternating between plain text and flags,
+        starting and ending with text, so a line holding no flags is a tuple
+        of one string. If the contents are a list or tuple, the result is
+        computed once and kept until another substitution is set up.
+        Otherwise, the lines are split as they are read.
+        """
+        if self._plan is not None:
+            return self._plan
+        if self._flag_regex is None:
+            flags = sorted(self._substitutions, key=len, reverse=True)
+            self._flag_regex = re.compile(
+                '(%s)' % '|'.join(re.escape(flag) for flag in flags)
+                )
+        split = self._flag_regex.split
+        if isinstance(self._contents, (list, tuple)):
+            self._plan = [tuple(split(line)) for line in self._contents]
+            return self._plan
+        return (tuple(split(line)) for line in self._contents)
+    
+    def callbacks(self):
+        if not isinstance(self._contents, (list, tuple)):
+            # Finding them would mean reading the contents an extra time.
+            return
+        for parts in self.plan() if self._substitutions else ():
+            for flag in parts[1::2]:
+                callback = self._substitutions[flag]
+                if isinstance(callback, TextBlock):
+                    for found in callback.callbacks():
+                        yield found
+    
     def generate(self, layout=SPARTAN_LAYOUT, scope=BASE_SCOPE, session=None):
         """Generate a section of XML.
         """
-        contents = self._contents
-        for substitution in self._substitutions:
-            contents = substitution(contents, layout, scope, session)
-        for line in contents:
-            yield layout(line)
+        if not self._substitutions:
+            for line in self._contents:
+                yield layout(line)
+            return
+        for parts in self.plan():
+            if len(parts) == 1:
+                yield layout(parts[0])
+                continue
+            new_line = [parts[0]]
+            for index in range(1, len(parts), 2):
+                callback = self._substitutions[parts[index]]
+                if HOOKS.active:
+                    substitute = traced('substitution', parts[index],
+                        _substitute(callback, layout, scope, session))
+                else:
+                    substitute = callback(session).generate(
+                        layout, scope, session
+                        )
+                new_line.append(''.join(substitute).strip())
+                new_line.append(parts[index + 1])
+            yield layout(''.join(new_line))
+
+def _substitute(callback, layout, scope, session):
+    # Run a substitution's callback only once its tracing has begun.
+    for line in callback(session).generate(layout, scope, session):
+        yield line
 
 
 class PCData(SubstitutableTextBlock):
@@ -318,7 +531,12 @@ class CallBack(TextBlock):
     
     See the SubstitutableTextBlock.substitute() method for an example.
     """
-    def __init__(self, func, return_type=None):
+    # The Loader and key of a BatchCallBack.
+    loader = None
+    key = None
+    
+    def __init__(self, func, return_type=None, deferred=False, timeout=None,
+            fallback=None):
         """Initialize the callback.
         
         The func arg can be any callable object that accepts a single arg
@@ -329,17 +547,138 @@ class CallBack(TextBlock):
         which will be returned by the callback (ie an Element, PCData, etc.).
         This allows a parent element to do a better job of laying out its
         content.
+        
+        If the deferred arg is True, func should start its work and return
+        right away with a deferred result instead of a TextBlock. This is any
+        object with a result() method, such as a future, or a get() method,
+        such as an AsyncResult from the multiprocessing module, that waits
+        for the work to finish and returns the TextBlock. A
+        ConcurrentRenderer can then start all the deferred CallBacks of a
+        document at once, rather than waiting on each in turn.
+        
+        >>> from multiprocessing.pool import ThreadPool
+        >>> pool = ThreadPool(2)
+        >>> def lookup(session):
+        ...     return pool.apply_async(PCData, ('Hello %s!' % session,))
+        >>> print CallBack(lookup, PCData, deferred=True).render(session='Bob')
+        Hello Bob!
+        
+        The timeout arg is the number of seconds a ConcurrentRenderer will
+        wait for the callback's content once generation reaches it. If the
+        content is late, the fallback arg, a TextBlock, is generated instead.
+        Without a fallback, nothing is generated in its place. These are
+        ignored when the callback is run directly rather than ahead of time,
+        since its work cannot then be interrupted.
         """
         self.func = func
         if isinstance(return_type, CallBack):
             raise Exception()
         self.return_type = return_type
+        self.deferred = deferred
+        self.timeout = timeout
+        if fallback is None:
+            fallback = TextBlock(())
+        self.fallback = fallback
     
     def __call__(self, session):
-        return self.func(session)
+        return self.resolve(session)
+    
+    def _measure(self, footprint):
+        # The content is not known until generation.
+        pass
+    
+    def resolve(self, session):
+        """Run the callback and return the TextBlock it produces.
+        
+        If a renderer is generating the output, it is in charge of running
+        the callback, and may already have done so.
+        """
+        render = current_render()
+        tracer = render.tracer if render is not None else None
+        metrics = HOOKS.metrics
+        if tracer is None and metrics is None:
+            return self._run(render, session)
+        
+        name = getattr(self.func, '__name__', self.func.__class__.__name__)
+        start = time.time()
+        if tracer is not None:
+            tracer.enter('callback', name, start)
+        try:
+            return self._run(render, session)
+        finally:
+            end = time.time()
+            if tracer is not None:
+                tracer.leave('callback', name, end, 0)
+            if metrics is not None:
+                metrics.count('callbacks', label=name)
+                metrics.observe('callback_seconds', end - start, name)
+    
+    def _run(self, render, session):
+        if render is not None:
+            return render.resolve(self, session)
+        elif self.deferred:
+            return wait(self.func(session))
+        else:
+            return self.func(session)
+    
+    def callbacks(self):
+        yield self
     
     def generate(self, layout=SPARTAN_LAYOUT, scope=BASE_SCOPE, session=None):
-        return self.func(session).generate(layout, scope, session)
+        return self.resolve(session).generate(layout, scope, session)
+
+
+class BatchCallBack(CallBack):
+    """A CallBack whose data is loaded in a batch with others like it.
+    
+    Many CallBacks that each fetch one item, such as a row from a database,
+    can share a Loader, which fetches all of their items at once. See the
+    Loader class for an example.
+    """
+    def __init__(self, loader, key, func=None, return_type=None):
+        """Initialize the callback.
+        
+        The loader arg is the Loader that fetches the data, and the key arg
+        is the hashable key the loader fetches this callback's value with.
+        
+        The func arg is called with the value and the session, and returns
+        a TextBlock holding the content. By default, the value is converted
+        to a string and placed in a PCData instance. A value of None is
+        passed if the Loader returns no value for the key.
+        """
+        if func is None:
+            func = self.default_format
+            return_type = return_type or PCData
+        self.loader = loader
+        self.key = key
+        self.format = func
+        super(BatchCallBack, self).__init__(self.load, return_type)
+    
+    @staticmethod
+    def default_format(value, session):
+        return PCData(str(value))
+    
+    def load(self, session):
+        """Load this callback's value on its own, and return its content.
+        """
+        value = self.loader.load([self.key], session).get(self.key)
+        return self.format(value, session)
+
+
+class FlushPoint(TextBlock):
+    """A marker for a point where the output so far should be sent on.
+    
+    When a renderer generates output in chunks (see the Renderer.chunks()
+    method), a chunk ends wherever a FlushPoint is placed, such as after the
+    head of an HTML page, so it can reach the client sooner. Otherwise, it
+    generates nothing.
+    """
+    def __init__(self):
+        super(FlushPoint, self).__init__(())
+    
+    def generate(self, layout=SPARTAN_LAYOUT, scope=BASE_SCOPE, session=None):
+        if flushing():
+            yield FLUSH
 
 
 class Comment(TextBlock):
@@ -353,3 +692,72 @@ class Comment(TextBlock):
         text = '<!--%s-->' % text
         super(Comment, self).__init__(text.split('\n'))
 
+
+class _Footprint(object):
+    # Totals for TextBlock.footprint(), counting each object once. Blocks
+    # are queued in pending rather than measured as they are found, so deep
+    # trees are walked without recursion.
+    
+    def __init__(self):
+        self.pending = []
+        self.seen = set()
+        self.nodes = 0
+        self.classes = defaultdict(int)
+        self.text_bytes = 0
+        self.attribute_bytes = 0
+        self.estimated_bytes = 0
+    
+    def add(self, obj):
+        """Count the size of an object, returning False if already counted.
+        """
+        if id(obj) in self.seen:
+            return False
+        self.seen.add(id(obj))
+        self.estimated_bytes += sys.getsizeof(obj)
+        return True
+    
+    def block(self, block):
+        if self.add(block):
+            self.nodes += 1
+            self.classes[block.__class__.__name__] += 1
+            if hasattr(block, '__dict__'):
+                self.add(block.__dict__)
+            self.pending.append(block)
+    
+    def text(self, text):
+        if self.add(text):
+            self.text_bytes += len(text)
+    
+    def container(self, items, text=True):
+        if not isinstance(items, (list, tuple, set, frozenset, dict)) \
+                or not self.add(items):
+            return
+        if isinstance(items, dict):
+            items = [i for pair in items.items() for i in pair]
+        for item in items:
+            if isinstance(item, TextBlock):
+                self.block(item)
+            elif isinstance(item, basestring):
+                if text:
+                    self.text(item)
+                else:
+                    self.add(item)
+            else:
+                self.container(item, text)
+    
+    def attributes(self, attributes):
+        if not self.add(attributes):
+            return
+        for name, value in attributes.items():
+            for text in (name, value):
+                if self.add(text):
+                    self.attribute_bytes += len(text)
+    
+    def result(self):
+        return {
+            'nodes': self.nodes,
+            'classes': dict(self.classes),
+            'text_bytes': self.text_bytes,
+            'attribute_bytes': self.attribute_bytes,
+            'estimated_bytes': self.estimated_bytes,
+            }
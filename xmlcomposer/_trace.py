@@ -0,0 +1,138 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Tracing where the time of a render goes.
+
+A Tracer passed to the Renderer.generate() method is told as generation
+enters and leaves each element, CallBack and substitution, so a slow page
+can be broken down by subtree. Its events can be written out as a Chrome
+trace, for chrome://tracing and similar viewers, or as collapsed stacks, the
+input of flame graph tools.
+
+>>> from xmlcomposer import Element, CallBack, PCData, Renderer
+>>> class Page(Element): pass
+>>> class Price(Element): pass
+>>> def lookup(session):
+...     return Price('$2.50')
+>>> tracer = Tracer()
+>>> output = ''.join(Renderer().generate(
+...     Page(CallBack(lookup, Price)), tracer=tracer
+...     ))
+>>> for phase, kind, name, when, size, thread in tracer.events:
+...     print phase, kind, name, size
+enter element page None
+enter callback lookup None
+leave callback lookup 0
+enter element price None
+leave element price 22
+leave element page 37
+
+Only renders given a tracer are traced, and generation checks for one only
+while such a render is running, so tracing costs next to nothing otherwise.
+"""
+
+import json
+import os
+import thread
+from collections import defaultdict
+
+
+class Tracer(object):
+    """Records the events of the renders it is passed to.
+    
+    The enter() and leave() methods are called as generation enters and
+    leaves each part of a document. Its kind is 'element', 'callback' or
+    'substitution', and its name is the tag name of an element, the name of
+    the function of a CallBack, or the flag of a substitution. The when arg
+    is the time, as from time.time(), and the size arg is the number of
+    bytes generated within it. A CallBack generates nothing itself, since
+    the content it returns is generated as a part of its own.
+    
+    Since output is generated lazily, the time spent in a part includes any
+    time the consumer of the output takes between lines, such as writing
+    them to a slow client.
+    
+    By default, the events are kept in the events list, as (phase, kind,
+    name, when, size, thread) tuples, where phase is 'enter' or 'leave',
+    and thread is the identity of the thread that generated it. A subclass
+    can instead send them elsewhere as they happen. A Tracer may be passed
+    to renders in several threads at once.
+    """
+    def __init__(self):
+        self.events = []
+    
+    def enter(self, kind, name, when):
+        self.events.append(
+            ('enter', kind, name, when, None, thread.get_ident())
+            )
+    
+    def leave(self, kind, name, when, size):
+        self.events.append(
+            ('leave', kind, name, when, size, thread.get_ident())
+            )
+    
+    def chrome_trace(self):
+        """Return the events in the Chrome trace event format.
+        
+        The result is a dictionary to be written out as JSON, holding a
+        pair of begin and end events for each part, with the bytes it
+        generated as an argument of the end event.
+        """
+        pid = os.getpid()
+        events = []
+        for phase, kind, name, when, size, thread_id in self.events:
+            event = {
+                'name': name,
+                'cat': kind,
+                'ph': 'B' if phase == 'enter' else 'E',
+                'ts': int(when * 1e6),
+                'pid': pid,
+                'tid': thread_id,
+                }
+            if size is not None:
+                event['args'] = {'bytes': size}
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    
+    def write_chrome_trace(self, f):
+        """Write the events to a file object as a Chrome trace.
+        """
+        json.dump(self.chrome_trace(), f)
+    
+    def collapsed_stacks(self):
+        """Return the time spent in each stack of parts, for flame graphs.
+        
+        The result is a list of lines, each holding a stack of parts from
+        the outermost in, separated by semicolons, then the microseconds
+        spent in the innermost part itself, excluding the parts within it.
+        Each part is written as its kind and name, such as 'element:body'.
+        Parts that were entered but never left, such as when a render is
+        abandoned, are left out.
+        """
+        totals = defaultdict(int)
+        stacks = defaultdict(list)
+        for phase, kind, name, when, size, thread_id in self.events:
+            stack = stacks[thread_id]
+            if phase == 'enter':
+                # Each frame is [part, entered, time spent in inner parts].
+                stack.append([_frame_name(kind, name), when, 0.0])
+                continue
+            if not stack:
+                continue
+            part, entered, inner = stack.pop()
+            spent = when - entered
+            if stack:
+                stack[-1][2] += spent
+            path = ';'.join([frame[0] for frame in stack] + [part])
+            totals[path] += int(round((spent - inner) * 1e6))
+        return ['%s %d' % item for item in sorted(totals.items())]
+    
+    def write_collapsed_stacks(self, f):
+        """Write the collapsed stacks to a file object, a line for each.
+        """
+        for line in self.collapsed_stacks():
+            f.write(line + '\n')
+
+def _frame_name(kind, name):
+    name = '%s:%s' % (kind, name)
+    return name.replace(';', '_').replace(' ', '_')
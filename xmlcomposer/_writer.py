@@ -0,0 +1,210 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Writing a document as it is made, without building it as a tree.
+
+An XMLWriter writes elements to a file as they are started and ended, so a
+document of millions of records takes no more memory than its deepest
+branch. Small subtrees, such as a single record, can still be built as
+elements and written whole.
+
+>>> from StringIO import StringIO
+>>> class Feed(Element): pass
+>>> class Entry(Element): pass
+>>> class Title(Element): pass
+>>> out = StringIO()
+>>> writer = XMLWriter(out)
+>>> writer.start(Feed, version='1.0')
+>>> for n in range(2):
+...     writer.start(Entry)
+...     writer.start(Title)
+...     writer.text('Story %d & more' % n)
+...     writer.end()
+...     writer.end()
+>>> writer.write(Entry(Title('A whole entry')))
+>>> writer.close()
+>>> print out.getvalue()
+<feed version="1.0">
+    <entry>
+        <title>Story 0 &amp; more</title>
+    </entry>
+    <entry>
+        <title>Story 1 &amp; more</title>
+    </entry>
+    <entry>
+        <title>A whole entry</title>
+    </entry>
+</feed>
+"""
+
+from _text import TextBlock, PCData
+from _element import Element
+from _namespace import BASE_SCOPE, DocumentScope
+from _layout import DEFAULT_LAYOUT, MINIMAL_LAYOUT
+
+
+class XMLWriter(object):
+    """Writes XML to a file object a piece at a time.
+    
+    The out arg is any object with a write() method, such as a file or a
+    StringIO. The layout, scope and session args are those of the
+    TextBlock.generate() method, and apply to everything written. As with
+    a Document, the root element declares the namespaces of the scope.
+    
+    Elements are laid out as the Element class lays them out: an element
+    with no contents is self-closing, one holding only text is written on
+    a single line, and one holding other elements is written nested. To
+    tell which, the text of an element is held until it ends or a child
+    element starts, after which any further text is written on lines of
+    its own. Mixed text and elements are therefore laid out nested, unlike
+    the Element class; write such content as a whole Element instead.
+    
+    A writer can be used as a context manager, which closes it on leaving
+    the block without an error.
+    """
+    def __init__(self, out, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE,
+            session=None):
+        if not isinstance(scope, DocumentScope):
+            scope = scope.make_document_scope()
+        self.out = out
+        self.layout = layout
+        self.scope = scope
+        self.session = session
+        # An _Open for each element started but not yet ended.
+        self._stack = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+    
+    @property
+    def depth(self):
+        """The number of elements started but not yet ended.
+        """
+        return len(self._stack)
+    
+    def start(self, element, **attributes):
+        """Start an element, which holds what is written until it ends.
+        
+        The element arg is an Element subclass, which is instantiated with
+        the attributes, or an Element instance, which the attributes are
+        set on. Any contents the instance already has are written first.
+        """
+        if isinstance(element, type):
+            element = element(**attributes)
+        else:
+            for key, value in attributes.items():
+                element[key] = value
+        if self._stack:
+            parent = self._stack[-1]
+            self._open_nested(parent)
+            layout, scope = parent.layout.indent(), parent.inner_scope
+        else:
+            layout, scope = self.layout, self.scope
+        self._stack.append(_Open(element, layout, scope))
+        if element._contents:
+            self.write(*element._contents)
+    
+    def text(self, text, escape=True):
+        """Write text within the current element, escaping it by default.
+        """
+        self.write(PCData(text, escape))
+    
+    def write(self, *contents):
+        """Write blocks, such as whole elements, within the current element.
+        
+        As with the contents of an Element, anything other than a TextBlock
+        is converted to a string and written as text. With no element
+        started, blocks are written at the top level of the document, such
+        as an XMLDeclaration before the root element.
+        """
+        for item in contents:
+            if not isinstance(item, TextBlock):
+                item = PCData(str(item))
+            if not self._stack:
+                self._write(item, self.layout, self.scope)
+                continue
+            current = self._stack[-1]
+            kind = current.element.determine_content_type(item)
+            if kind == 'pcdata' and current.parts is not None:
+                current.parts.append(''.join(item.generate(
+                    MINIMAL_LAYOUT, current.inner_scope, self.session
+                    )))
+            else:
+                self._open_nested(current)
+                self._write(item, current.layout.indent(), current.inner_scope)
+    
+    def end(self, element=None):
+        """End the current element.
+        
+        If given, the element arg is checked against the element ended,
+        which must be an instance of it if it is a class, or be it if it is
+        an instance. A ValueError is raised if it is not, or if no element
+        has been started.
+        """
+        if not self._stack:
+            raise ValueError('No element has been started.')
+        current = self._stack[-1]
+        if element is not None and element is not current.element and not (
+                isinstance(element, type)
+                and isinstance(current.element, element)):
+            raise ValueError('The element being ended is %s, not %s.' % (
+                current.element.__class__.__name__,
+                getattr(element, '__name__', element.__class__.__name__)
+                ))
+        self._stack.pop()
+        tag = current.element
+        if current.parts is None:
+            self.out.write(current.layout(tag.close_tag()))
+        elif not current.parts and tag.self_closing:
+            self.out.write(current.layout('<%s%s%s%s/>' % (
+                tag.format_prefix(),
+                tag.tag_name,
+                current.xmlns,
+                tag.format_attributes(),
+                )))
+        else:
+            line = '%s%s%s' % (
+                tag.open_tag(current.xmlns),
+                ''.join(current.parts),
+                tag.close_tag(),
+                )
+            self.out.write(current.layout(line, wrap=True))
+    
+    def close(self):
+        """End every element still open.
+        """
+        while self._stack:
+            self.end()
+    
+    def _open_nested(self, current):
+        # Write the open tag of an element, and the text held so far, once
+        # it has a child that makes it nested.
+        if current.parts is None:
+            return
+        self.out.write(current.layout(current.element.open_tag(current.xmlns)))
+        inner = current.layout.indent()
+        for part in current.parts:
+            self.out.write(inner(part))
+        current.parts = None
+    
+    def _write(self, block, layout, scope):
+        write = self.out.write
+        for line in block.generate(layout, scope, self.session):
+            write(line)
+
+
+class _Open(object):
+    # An element that has been started, with the layout and scope it was
+    # started in, and the text it holds until it is known to be nested, at
+    # which point parts is set to None.
+    __slots__ = ('element', 'layout', 'xmlns', 'inner_scope', 'parts')
+    
+    def __init__(self, element, layout, scope):
+        self.element = element
+        self.layout = layout
+        self.xmlns, self.inner_scope = element.determine_scope(scope)
+        self.parts = []
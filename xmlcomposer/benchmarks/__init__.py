@@ -0,0 +1,231 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""A benchmark suite for the hot paths of xmlcomposer.
+
+The benchmarks build synthetic trees of several shapes, render them under
+each of the standard layouts, exercise Layout directly, and load the small
+schemas bundled in the schemas directory. Run the whole suite with:
+    
+    python -m xmlcomposer.benchmarks -o results.json
+
+and compare it with an earlier run, to flag regressions, with:
+    
+    python -m xmlcomposer.benchmarks -o new.json --compare results.json
+
+Each benchmark is run in a fresh python process, so the peak memory it
+reports is its own, and the fastest of several rounds is reported. A
+result is a dictionary holding:
+    
+    name         the name of the benchmark, such as 'render.wide.default'
+    group        the first part of the name
+    ops_per_sec  operations per second in the fastest round
+    seconds      the time of a single operation in the fastest round
+    number       the operations per round
+    peak_kb      the peak resident memory of the process, in kilobytes
+    memory_kb    how much the benchmark raised the peak, in kilobytes
+    objects      the garbage-collected objects kept alive by the result of
+                 one operation, such as the elements of a constructed tree
+
+Python 2 keeps no count of memory allocations outside of debug builds, so
+objects stands in for one: it counts what an operation leaves behind, not
+what it allocates along the way.
+
+Benchmarks are registered with the benchmark() decorator, in the cases
+module and in any other module imported before the suite runs. The
+baselines module holds benchmarks making the same documents with the XML
+tools of the standard library, to compare xmlcomposer against.
+"""
+
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The registered benchmarks, by name, and their names in order.
+BENCHMARKS = {}
+ORDER = []
+
+# The directory holding the bundled schemas.
+SCHEMA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'schemas'
+    )
+
+def benchmark(name):
+    """Register a benchmark, decorating its setup function.
+    
+    The setup function takes no args, builds whatever the benchmark needs,
+    and returns a function of no args that performs one operation. Only the
+    returned function is timed.
+    """
+    def register(setup):
+        if name not in BENCHMARKS:
+            ORDER.append(name)
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def names(patterns=()):
+    """Return the names of the registered benchmarks, in order.
+    
+    If patterns are given, only names starting with one of them are
+    returned.
+    """
+    if not patterns:
+        return list(ORDER)
+    return [n for n in ORDER if any(n.startswith(p) for p in patterns)]
+
+def run_one(name, min_time=0.2, repeat=3):
+    """Run a single benchmark in this process, returning its result.
+    """
+    start_kb = peak_memory()
+    operation = BENCHMARKS[name]()
+    
+    # Count the objects kept alive by one operation.
+    gc.collect()
+    before = len(gc.get_objects())
+    kept = operation()
+    gc.collect()
+    objects = max(0, len(gc.get_objects()) - before)
+    del kept
+    
+    # Find how many operations make a round of at least min_time seconds.
+    number = 1
+    while True:
+        seconds = _time(operation, number)
+        if seconds >= min_time or number >= 10 ** 7:
+            break
+        number *= 10 if seconds < min_time / 10 else 2
+    rounds = [seconds] + [_time(operation, number) for n in range(repeat - 1)]
+    best = min(rounds)
+    
+    peak_kb = peak_memory()
+    return {
+        'name': name,
+        'group': name.split('.')[0],
+        'ops_per_sec': number / best if best else None,
+        'seconds': best / number,
+        'number': number,
+        'peak_kb': peak_kb,
+        'memory_kb': peak_kb - start_kb if peak_kb is not None else None,
+        'objects': objects,
+        }
+
+def _time(operation, number):
+    # Unlike timeit, the garbage collector is left running, as it would be
+    # in use, so that the cycles an operation leaves count against it.
+    start = time.time()
+    for n in xrange(number):
+        operation()
+    return time.time() - start
+
+def peak_memory():
+    """Return the peak resident memory of this process in kilobytes, or None.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes, rather than kilobytes.
+        peak //= 1024
+    return peak
+
+def run(patterns=(), min_time=0.2, repeat=3, isolate=True, report=None):
+    """Run the benchmarks, returning a list of their results.
+    
+    The patterns arg selects benchmarks as for the names() function. If
+    isolate is True, each runs in a new python process, so that its memory
+    use is measured apart from the others. Benchmarks registered outside the
+    modules of this package can only be run with isolate False.
+    
+    If given, the report arg is called with each result as it is ready.
+    """
+    results = []
+    for name in names(patterns):
+        if isolate:
+            result = _run_isolated(name, min_time, repeat)
+        else:
+            result = run_one(name, min_time, repeat)
+        results.append(result)
+        if report:
+            report(result)
+    return results
+
+def _run_isolated(name, min_time, repeat):
+    package_root = os.path.dirname(os.path.dirname(SCHEMA_DIR))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [package_root, env.get('PYTHONPATH')])
+        )
+    command = [
+        sys.executable, '-m', 'xmlcomposer.benchmarks', '--one', name,
+        '--min-time', repr(min_time), '--repeat', str(repeat),
+        ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+    output = process.communicate()[0]
+    if process.returncode:
+        raise RuntimeError('Benchmark %s failed.' % name)
+    return json.loads(output)
+
+def save(results, file_name):
+    """Write results to a JSON file, along with details of this system.
+    """
+    data = {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results,
+        }
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+def load(file_name):
+    """Read the results from a JSON file written by save().
+    """
+    with open(file_name, 'r') as f:
+        return json.load(f)['results']
+
+def compare(old, new, threshold=0.1, memory_floor=1024):
+    """Compare two runs, returning a row for each benchmark in both.
+    
+    Each row is a (name, old_ops, new_ops, change, regressed) tuple, where
+    change is the relative change in speed, so that -0.2 means 20% slower.
+    A benchmark regressed if it became slower by more than the threshold
+    fraction, or its memory_kb grew by more than the threshold fraction and
+    by more than memory_floor kilobytes, which allows for noise.
+    
+    >>> old = [{'name': 'a', 'ops_per_sec': 100.0, 'memory_kb': 0}]
+    >>> new = [{'name': 'a', 'ops_per_sec': 80.0, 'memory_kb': 0}]
+    >>> compare(old, new)
+    [('a', 100.0, 80.0, -0.2, True)]
+    """
+    old = dict((result['name'], result) for result in old)
+    rows = []
+    for result in new:
+        before = old.get(result['name'])
+        if before is None or not before['ops_per_sec']:
+            continue
+        change = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        regressed = change < -threshold
+        old_kb, new_kb = before.get('memory_kb'), result.get('memory_kb')
+        if old_kb is not None and new_kb is not None \
+                and new_kb - old_kb > max(memory_floor, old_kb * threshold):
+            regressed = True
+        rows.append((
+            result['name'], before['ops_per_sec'], result['ops_per_sec'],
+            round(change, 4), regressed,
+            ))
+    return rows
+
+# Importing these registers their benchmarks, in this order. It is done last,
+# since they import benchmark() and SCHEMA_DIR from this module.
+import baselines
+import cases
@@ -0,0 +1,97 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Run the benchmark suite.
+
+Run "python -m xmlcomposer.benchmarks --help" for usage information.
+"""
+
+import argparse
+import json
+import sys
+
+from xmlcomposer import benchmarks
+from xmlcomposer.benchmarks import baselines
+
+
+def report(result):
+    memory = result['memory_kb']
+    print '%-32s %12.1f ops/s %10.1f usec %8s KB %8d objects' % (
+        result['name'], result['ops_per_sec'], result['seconds'] * 1e6,
+        '-' if memory is None else memory, result['objects'],
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='xmlcomposer.benchmarks')
+    parser.add_argument(
+        'patterns', nargs='*',
+        help='run only the benchmarks whose names start with these',
+        )
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument(
+        '--compare', metavar='FILE',
+        help='compare the results with those of an earlier run',
+        )
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='the slowdown, as a fraction, that counts as a regression',
+        )
+    parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help='the shortest time to run each round for, in seconds',
+        )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='the number of rounds, of which the fastest is reported',
+        )
+    parser.add_argument(
+        '--in-process', action='store_true',
+        help='run every benchmark in this process',
+        )
+    parser.add_argument('--one', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.one:
+        # Running a single benchmark on behalf of an isolated run.
+        result = benchmarks.run_one(args.one, args.min_time, args.repeat)
+        print json.dumps(result)
+        return 0
+    
+    results = benchmarks.run(
+        args.patterns, args.min_time, args.repeat, not args.in_process, report
+        )
+    if args.output:
+        benchmarks.save(results, args.output)
+    rows = baselines.side_by_side(results)
+    if rows:
+        print
+        print '%-12s %-12s %12s %10s %10s' % (
+            'document', 'tool', 'ops/s', 'relative', 'memory KB',
+            )
+        for document, tool, ops_per_sec, relative, memory_kb in rows:
+            print '%-12s %-12s %12.1f %9sx %10s' % (
+                document, tool, ops_per_sec,
+                '-' if relative is None else '%.2f' % relative,
+                '-' if memory_kb is None else memory_kb,
+                )
+    if not args.compare:
+        return 0
+    
+    print
+    regressions = 0
+    rows = benchmarks.compare(
+        benchmarks.load(args.compare), results, args.threshold
+        )
+    for name, old_ops, new_ops, change, regressed in rows:
+        print '%-32s %12.1f -> %12.1f ops/s %+7.1f%%%s' % (
+            name, old_ops, new_ops, change * 100,
+            '  REGRESSION' if regressed else '',
+            )
+        regressions += regressed
+    print '%d benchmarks compared, %d regressions' % (len(rows), regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Benchmarks of the same documents made with the standard library.
+
+Each document is built from the same plain data and serialized to a string,
+once with xmlcomposer and once with each of xml.etree.ElementTree, its C
+accelerated version cElementTree, and xml.sax.saxutils.XMLGenerator. The
+documents are:
+    
+    rss         an RSS 2.0 feed of fifty items, made with formats.rss2
+    table       an HTML table of two hundred rows, made with formats.html5
+    namespaced  an Atom feed mixing elements and attributes from three
+                namespaces
+
+The standard library tools do not indent their output, so xmlcomposer
+renders with MINIMAL_LAYOUT to produce output of the same size. Run only
+these benchmarks, and print them side by side, with:
+    
+    python -m xmlcomposer.benchmarks baseline
+"""
+
+from cStringIO import StringIO
+from xml.etree import ElementTree, cElementTree
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl, AttributesNSImpl
+
+import xmlcomposer
+from xmlcomposer import Element, Namespace, DocumentScope, MINIMAL_LAYOUT
+from xmlcomposer.formats import html5, rss2
+
+from xmlcomposer.benchmarks import benchmark
+
+TOOLS = ('xmlcomposer', 'etree', 'cetree', 'sax')
+
+ITEMS = [
+    {
+        'title': 'Story number %d & more' % n,
+        'link': 'http://example.com/stories/%d?ref=rss&page=1' % n,
+        'description': 'The <b>latest</b> on story %d, "as it happened".' % n,
+        'date': 'Mon, 0%d Oct 2012 09:00:00 GMT' % (n % 9 + 1),
+        }
+    for n in range(50)
+    ]
+
+ROWS = [
+    [str(n), 'Name %d' % n, 'user%d@example.com' % n, '%d.50' % n, 'Active']
+    for n in range(200)
+    ]
+HEADINGS = ['Id', 'Name', 'Email', 'Balance', 'Status']
+
+ATOM_URI = 'http://www.w3.org/2005/Atom'
+DC_URI = 'http://purl.org/dc/elements/1.1/'
+XLINK_URI = 'http://www.w3.org/1999/xlink'
+
+class Feed(Element): pass
+class Entry(Element): pass
+class Link(Element): pass
+class Creator(Element): pass
+class Subject(Element): pass
+
+ATOM = Namespace(ATOM_URI, elements=(Feed, Entry, Link))
+DC = Namespace(DC_URI, 'dc', elements=(Creator, Subject))
+SCOPE = DocumentScope(ATOM, DC)
+
+NO_ATTRIBUTES = AttributesImpl({})
+
+ENTRIES = [('Author %d' % n, 'Topic %d' % (n % 7)) for n in range(100)]
+
+
+def _etree_modules():
+    for tool, module in (('etree', ElementTree), ('cetree', cElementTree)):
+        module.register_namespace('dc', DC_URI)
+        module.register_namespace('xlink', XLINK_URI)
+        yield tool, module
+
+
+def rss_xmlcomposer():
+    channel = rss2.Channel(
+        rss2.Title('Example News'),
+        rss2.Link('http://example.com/'),
+        rss2.Description('The latest stories.'),
+        )
+    for item in ITEMS:
+        channel.add(rss2.Item(
+            rss2.Title(item['title']),
+            rss2.Link(item['link']),
+            rss2.Description(item['description']),
+            rss2.PubDate(item['date']),
+            rss2.Guid(item['link']),
+            ))
+    return rss2.Rss(channel, version='2.0').render(MINIMAL_LAYOUT)
+
+def rss_etree(module):
+    SubElement = module.SubElement
+    rss = module.Element('rss', version='2.0')
+    channel = SubElement(rss, 'channel')
+    SubElement(channel, 'title').text = 'Example News'
+    SubElement(channel, 'link').text = 'http://example.com/'
+    SubElement(channel, 'description').text = 'The latest stories.'
+    for item in ITEMS:
+        element = SubElement(channel, 'item')
+        SubElement(element, 'title').text = item['title']
+        SubElement(element, 'link').text = item['link']
+        SubElement(element, 'description').text = item['description']
+        SubElement(element, 'pubDate').text = item['date']
+        SubElement(element, 'guid').text = item['link']
+    return module.tostring(rss)
+
+def rss_sax():
+    out = StringIO()
+    generator = XMLGenerator(out, 'utf-8')
+    def text_element(name, text):
+        generator.startElement(name, NO_ATTRIBUTES)
+        generator.characters(text)
+        generator.endElement(name)
+    generator.startElement('rss', AttributesImpl({'version': '2.0'}))
+    generator.startElement('channel', NO_ATTRIBUTES)
+    text_element('title', 'Example News')
+    text_element('link', 'http://example.com/')
+    text_element('description', 'The latest stories.')
+    for item in ITEMS:
+        generator.startElement('item', NO_ATTRIBUTES)
+        text_element('title', item['title'])
+        text_element('link', item['link'])
+        text_element('description', item['description'])
+        text_element('pubDate', item['date'])
+        text_element('guid', item['link'])
+        generator.endElement('item')
+    generator.endElement('channel')
+    generator.endElement('rss')
+    return out.getvalue()
+
+
+def table_xmlcomposer():
+    table = html5.Table(class_='accounts')(
+        html5.Thead(html5.Tr(*[html5.Th(h) for h in HEADINGS])),
+        html5.Tbody(*[
+            html5.Tr(*[html5.Td(cell) for cell in row]) for row in ROWS
+            ]),
+        )
+    return table.render(MINIMAL_LAYOUT)
+
+def table_etree(module):
+    SubElement = module.SubElement
+    table = module.Element('table', {'class': 'accounts'})
+    row = SubElement(SubElement(table, 'thead'), 'tr')
+    for heading in HEADINGS:
+        SubElement(row, 'th').text = heading
+    body = SubElement(table, 'tbody')
+    for cells in ROWS:
+        row = SubElement(body, 'tr')
+        for cell in cells:
+            SubElement(row, 'td').text = cell
+    return module.tostring(table)
+
+def table_sax():
+    out = StringIO()
+    generator = XMLGenerator(out, 'utf-8')
+    generator.startElement('table', AttributesImpl({'class': 'accounts'}))
+    generator.startElement('thead', NO_ATTRIBUTES)
+    generator.startElement('tr', NO_ATTRIBUTES)
+    for heading in HEADINGS:
+        generator.startElement('th', NO_ATTRIBUTES)
+        generator.characters(heading)
+        generator.endElement('th')
+    generator.endElement('tr')
+    generator.endElement('thead')
+    generator.startElement('tbody', NO_ATTRIBUTES)
+    for cells in ROWS:
+        generator.startElement('tr', NO_ATTRIBUTES)
+        for cell in cells:
+            generator.startElement('td', NO_ATTRIBUTES)
+            generator.characters(cell)
+            generator.endElement('td')
+        generator.endElement('tr')
+    generator.endElement('tbody')
+    generator.endElement('table')
+    return out.getvalue()
+
+
+def namespaced_xmlcomposer():
+    feed = ATOM.Feed()
+    for n, (creator, subject) in enumerate(ENTRIES):
+        feed.add(ATOM.Entry(
+            ATOM.Link(href='/entries/%d' % n, **{'xlink:type': 'simple'}),
+            DC.Creator(creator),
+            DC.Subject(subject),
+            ))
+    feed['xmlns:xlink'] = XLINK_URI
+    return xmlcomposer.Document(feed).render(MINIMAL_LAYOUT, SCOPE)
+
+def namespaced_etree(module):
+    SubElement = module.SubElement
+    feed = module.Element('{%s}feed' % ATOM_URI)
+    for n, (creator, subject) in enumerate(ENTRIES):
+        entry = SubElement(feed, '{%s}entry' % ATOM_URI)
+        SubElement(entry, '{%s}link' % ATOM_URI, {
+            'href': '/entries/%d' % n,
+            '{%s}type' % XLINK_URI: 'simple',
+            })
+        SubElement(entry, '{%s}creator' % DC_URI).text = creator
+        SubElement(entry, '{%s}subject' % DC_URI).text = subject
+    return module.tostring(feed)
+
+def namespaced_sax():
+    out = StringIO()
+    generator = XMLGenerator(out, 'utf-8')
+    no_attributes = AttributesNSImpl({}, {})
+    def text_element(name, text):
+        generator.startElementNS((DC_URI, name), None, no_attributes)
+        generator.characters(text)
+        generator.endElementNS((DC_URI, name), None)
+    generator.startPrefixMapping(None, ATOM_URI)
+    generator.startPrefixMapping('dc', DC_URI)
+    generator.startPrefixMapping('xlink', XLINK_URI)
+    generator.startElementNS((ATOM_URI, 'feed'), None, no_attributes)
+    for n, (creator, subject) in enumerate(ENTRIES):
+        generator.startElementNS((ATOM_URI, 'entry'), None, no_attributes)
+        attributes = AttributesNSImpl({
+            (None, 'href'): '/entries/%d' % n,
+            (XLINK_URI, 'type'): 'simple',
+            }, {})
+        generator.startElementNS((ATOM_URI, 'link'), None, attributes)
+        generator.endElementNS((ATOM_URI, 'link'), None)
+        text_element('creator', creator)
+        text_element('subject', subject)
+        generator.endElementNS((ATOM_URI, 'entry'), None)
+    generator.endElementNS((ATOM_URI, 'feed'), None)
+    return out.getvalue()
+
+
+DOCUMENTS = (
+    ('rss', rss_xmlcomposer, rss_etree, rss_sax),
+    ('table', table_xmlcomposer, table_etree, table_sax),
+    ('namespaced', namespaced_xmlcomposer, namespaced_etree, namespaced_sax),
+    )
+
+def _register(document, with_xmlcomposer, with_etree, with_sax):
+    benchmark('baseline.%s.xmlcomposer' % document)(
+        lambda: with_xmlcomposer
+        )
+    for tool, module in _etree_modules():
+        benchmark('baseline.%s.%s' % (document, tool))(
+            lambda module=module: lambda: with_etree(module)
+            )
+    benchmark('baseline.%s.sax' % document)(lambda: with_sax)
+
+for document in DOCUMENTS:
+    _register(*document)
+
+
+def side_by_side(results):
+    """Arrange the results of the baseline benchmarks for comparison.
+    
+    The return value is a list of (document, tool, ops_per_sec, relative,
+    memory_kb) tuples, where relative is the tool's speed as a multiple of
+    the speed of xmlcomposer on the same document.
+    
+    >>> results = [
+    ...     {'name': 'baseline.rss.xmlcomposer', 'ops_per_sec': 100.0,
+    ...         'memory_kb': 200},
+    ...     {'name': 'baseline.rss.sax', 'ops_per_sec': 50.0,
+    ...         'memory_kb': 100},
+    ...     {'name': 'render.wide.default', 'ops_per_sec': 10.0,
+    ...         'memory_kb': 0},
+    ...     ]
+    >>> for row in side_by_side(results):
+    ...     print row
+    ('rss', 'xmlcomposer', 100.0, 1.0, 200)
+    ('rss', 'sax', 50.0, 0.5, 100)
+    """
+    found = {}
+    for result in results:
+        parts = result['name'].split('.')
+        if len(parts) == 3 and parts[0] == 'baseline':
+            found[tuple(parts[1:])] = result
+    rows = []
+    for document in [d[0] for d in DOCUMENTS]:
+        ours = found.get((document, 'xmlcomposer'))
+        for tool in TOOLS:
+            result = found.get((document, tool))
+            if result is None:
+                continue
+            relative = None
+            if ours is not None and ours['ops_per_sec']:
+                relative = result['ops_per_sec'] / ours['ops_per_sec']
+                relative = round(relative, 3)
+            rows.append((
+                document, tool, result['ops_per_sec'], relative,
+                result['memory_kb'],
+                ))
+    return rows
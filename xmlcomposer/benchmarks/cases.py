@@ -0,0 +1,141 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""The benchmarks of the suite.
+
+Trees come in four shapes, each of roughly a thousand elements:
+    
+    wide        one element holding many short children
+    deep        elements nested a hundred levels deep, a few wide
+    text        paragraphs of long text that needs escaping and wrapping
+    namespaced  elements from several prefixed namespaces, mixed together
+
+Each shape is constructed, and rendered under DEFAULT_LAYOUT,
+SPARTAN_LAYOUT and MINIMAL_LAYOUT.
+"""
+
+import os
+
+import xmlcomposer
+from xmlcomposer import schema
+from xmlcomposer import Element, Namespace, DocumentScope
+from xmlcomposer import DEFAULT_LAYOUT, SPARTAN_LAYOUT, MINIMAL_LAYOUT
+
+from xmlcomposer.benchmarks import benchmark, SCHEMA_DIR
+
+class Root(Element): pass
+class Item(Element): pass
+class Node(Element): pass
+class Para(Element): pass
+class Em(Element): pass
+
+class Entry(Element): pass
+class Link(Element): pass
+class Title(Element): pass
+
+ATOM = Namespace('http://www.w3.org/2005/Atom', 'atom', elements=(Entry,))
+XLINK = Namespace('http://www.w3.org/1999/xlink', 'xlink', elements=(Link,))
+DC = Namespace('http://purl.org/dc/elements/1.1/', 'dc', elements=(Title,))
+
+TEXT = (
+    'Marks & Spencer said sales rose 5% <year on year>, and "the outlook" '
+    'for the quarter remains steady despite rising costs. '
+    )
+
+def wide_tree():
+    return Root(*[Item('Item number %d' % n, id_=str(n)) for n in range(1000)])
+
+def deep_tree():
+    node = Node('Leaf')
+    for depth in range(100):
+        node = Node(
+            Item('Level %d' % depth), node, Item('After %d' % depth),
+            level=str(depth),
+            )
+    return Root(*[node] * 3)
+
+def text_tree():
+    return Root(*[
+        Para(TEXT * 4, Em(TEXT), TEXT * 2) for n in range(200)
+        ])
+
+def namespaced_tree():
+    return Root(*[
+        ATOM.Entry(
+            DC.Title('Entry %d' % n),
+            XLINK.Link(href='/entries/%d' % n),
+            Item('Summary of entry %d' % n),
+            )
+        for n in range(300)
+        ])
+
+SHAPES = (
+    ('wide', wide_tree),
+    ('deep', deep_tree),
+    ('text', text_tree),
+    ('namespaced', namespaced_tree),
+    )
+
+LAYOUTS = (
+    ('default', DEFAULT_LAYOUT),
+    ('spartan', SPARTAN_LAYOUT),
+    ('minimal', MINIMAL_LAYOUT),
+    )
+
+SCOPE = DocumentScope(ATOM, XLINK, DC)
+
+def _register_shape(shape, make_tree):
+    @benchmark('construct.%s' % shape)
+    def construct():
+        return make_tree
+    
+    for layout_name, layout in LAYOUTS:
+        @benchmark('render.%s.%s' % (shape, layout_name))
+        def render(layout=layout):
+            document = xmlcomposer.Document(make_tree())
+            return lambda: document.render(layout, SCOPE)
+
+for shape, make_tree in SHAPES:
+    _register_shape(shape, make_tree)
+
+
+@benchmark('element.add')
+def element_add():
+    items = [Item('Item %d' % n) for n in range(1000)]
+    def add():
+        root = Root()
+        for item in items:
+            root.add(item)
+        return root
+    return add
+
+@benchmark('element.attributes')
+def element_attributes():
+    def construct():
+        return [
+            Item(id_=str(n), class_='item', title='Item %d' % n)
+            for n in range(1000)
+            ]
+    return construct
+
+@benchmark('layout.call')
+def layout_call():
+    layout = DEFAULT_LAYOUT.indent().indent()
+    lines = ['<item>Line %d</item>' % n for n in range(1000)]
+    return lambda: [layout(line) for line in lines]
+
+@benchmark('layout.wrap')
+def layout_wrap():
+    layout = DEFAULT_LAYOUT.indent()
+    lines = [TEXT * 3] * 100
+    return lambda: [layout(line, wrap=True) for line in lines]
+
+def _register_schema(extension):
+    location = os.path.join(SCHEMA_DIR, 'library.' + extension)
+    
+    @benchmark('schema.%s' % extension)
+    def load():
+        return lambda: schema.load(location, 'urn:example:library')
+
+for extension in ('dtd', 'xsd', 'rng'):
+    _register_schema(extension)
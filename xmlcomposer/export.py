@@ -1,8 +1,33 @@
 
+import cPickle
+import ctypes
+import ctypes.util
+import gzip
+import hashlib
+import httplib
+import json
+import multiprocessing
 import os
+import Queue
 import shutil
+import socket
 import sys
 import tempfile
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+from multiprocessing.pool import ThreadPool
+
+from _cache import file_version
+from _document import Document
+from _element import Element
+from _layout import DEFAULT_LAYOUT
+from _namespace import BASE_SCOPE
+from _processing_instruction import XMLDeclaration
+from _render import HOOKS, Renderer
+from _text import TextBlock
 
 
 if os.name == 'nt':
@@ -20,9 +45,18 @@ else:
         if backup_path and os.path.exists(new_path):
             shutil.copy(new_path, backup_path)
         os.rename(old_path, new_path)
+    
+    # Python 2 has no os.syncfs(), so call syncfs(2) directly where the C
+    # library has it.
+    try:
+        _syncfs = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _syncfs = _syncfs.syncfs
+    except (OSError, AttributeError):
+        _syncfs = None
 
 
-def to_file(lines, file_name, backup_name=None, perms=0622):
+def to_file(lines, file_name, backup_name=None, perms=0622, manifest=None,
+        gzip_level=None, gzip_min_size=1024):
     """Safely and carefully write the generated output to a file.
     
     The lines arg should be an iterable containing lines in a file. Typically,
@@ -46,23 +80,931 @@ def to_file(lines, file_name, backup_name=None, perms=0622):
     are questionable though; some references claim that files can be
     replaced atomically, and some say that it is impossible using any
     well-supported Windows APIs.
+    
+    The output is hashed as it is written. If the file already holds the
+    same output, it is left untouched, along with its mtime, and no backup
+    is made. The return value is True if the file was written, and False if
+    it was unchanged. The manifest arg can be a Manifest holding the hashes
+    of files written before, which is then trusted instead of reading the
+    old file to compare it, and is updated with the new hash.
+    
+    If the gzip_level arg is a compression level from 1 to 9, a compressed
+    copy of the output is written alongside the file, with '.gz' appended
+    to its name, as web servers can serve in place of the file. It is
+    compressed as the output is written, and replaced just as safely. No
+    copy is kept for outputs smaller than gzip_min_size bytes, which gain
+    little from compression.
+    
+    If metrics are enabled (see the Metrics class), each write is counted
+    and timed, including the time spent generating the lines.
     """
-    base = os.path.split(os.path.abspath(file_name))[0]
-    if not os.path.exists(base):
-        os.makedirs(base)
-    
-    fileno, temp_name = tempfile.mkstemp(dir=base)
-    with os.fdopen(fileno, 'wb') as f:
-        f.writelines(lines)
-        f.flush()
-        os.fsync(fileno)
+    metrics = HOOKS.metrics
+    start = time.time()
+    known = manifest.get(file_name) if manifest is not None else None
+    output = _TempOutput(file_name, gzip_level=gzip_level)
+    output.write(lines)
+    written = output.install(known, backup_name, perms, gzip_min_size)
+    if manifest is not None:
+        manifest.set(file_name, output.digest)
+    if metrics is not None:
+        metrics.count('exports', label='written' if written else 'unchanged')
+        metrics.observe('export_seconds', time.time() - start)
+    return written
+
+def _file_hash(file_name):
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(65536), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _TempOutput(object):
+    # The output for a file, written to temporary files beside it, along
+    # with a compressed copy if a gzip_level is given.
+    
+    def __init__(self, file_name, sync=True, gzip_level=None):
+        self.file_name = file_name
+        self.sync = sync
+        self.gzip_level = gzip_level
+        self.temp_name = None
+        self.gzip_name = None
+        self.digest = None
+        self.size = 0
+    
+    def write(self, lines):
+        base = os.path.split(os.path.abspath(self.file_name))[0]
+        if not os.path.exists(base):
+            try:
+                os.makedirs(base)
+            except OSError:
+                # Another process may have just made it.
+                if not os.path.isdir(base):
+                    raise
+        
+        digest = hashlib.sha1()
+        try:
+            fileno, self.temp_name = tempfile.mkstemp(dir=base)
+            with os.fdopen(fileno, 'wb') as f:
+                compressed = None
+                if self.gzip_level is not None:
+                    gzip_fileno, self.gzip_name = tempfile.mkstemp(dir=base)
+                    gzip_file = os.fdopen(gzip_fileno, 'wb')
+                    # No name or mtime, so the same output always compresses
+                    # to the same bytes.
+                    compressed = gzip.GzipFile(
+                        '', 'wb', self.gzip_level, gzip_file, mtime=0
+                        )
+                for line in lines:
+                    digest.update(line)
+                    self.size += len(line)
+                    f.write(line)
+                    if compressed is not None:
+                        compressed.write(line)
+                f.flush()
+                if self.sync:
+                    os.fsync(fileno)
+                if compressed is not None:
+                    compressed.close()
+                    gzip_file.flush()
+                    if self.sync:
+                        os.fsync(gzip_fileno)
+                    gzip_file.close()
+        except:
+            self.discard()
+            raise
+        self.digest = digest.hexdigest()
     
+    def install(self, known=None, backup_name=None, perms=0622,
+            gzip_min_size=1024):
+        # Move the temporary files into place, unless the file already holds
+        # the same output. The known arg is the file's hash from a manifest,
+        # if any. Returns True if the file was replaced.
+        try:
+            unchanged = False
+            if os.path.exists(self.file_name):
+                if known is None:
+                    known = _file_hash(self.file_name)
+                unchanged = known == self.digest
+            
+            if self.gzip_name is not None:
+                gzip_file_name = self.file_name + '.gz'
+                if self.size < gzip_min_size:
+                    # A copy left from a larger version would be stale.
+                    if os.path.exists(gzip_file_name):
+                        os.remove(gzip_file_name)
+                elif not unchanged or not os.path.exists(gzip_file_name):
+                    _install(self.gzip_name, gzip_file_name, perms=perms)
+                    self.gzip_name = None
+            
+            if not unchanged:
+                _install(self.temp_name, self.file_name, backup_name, perms)
+                self.temp_name = None
+            return not unchanged
+        finally:
+            self.discard()
+    
+    def sync_files(self):
+        # Flush the temporary files to disk, when that was put off while
+        # writing them.
+        for name in (self.temp_name, self.gzip_name):
+            if name is not None:
+                fileno = os.open(name, os.O_RDONLY)
+                try:
+                    os.fsync(fileno)
+                finally:
+                    os.close(fileno)
+    
+    def discard(self):
+        for name in (self.temp_name, self.gzip_name):
+            if name is not None and os.path.exists(name):
+                os.remove(name)
+        self.temp_name = self.gzip_name = None
+
+
+def _install(temp_name, file_name, backup_name=None, perms=0622):
     _replace(temp_name, file_name, backup_name)
     os.chmod(file_name, perms)
 
-def to_host(*args, **kwargs):
-    """This is not implemented yet. When finished, it will upload to a remote
-    host.
+def _sync_outputs(outputs):
+    # Flush the temporary files of the outputs to disk, with one syncfs()
+    # for each filesystem they are on where it is available, or an fsync()
+    # of each file otherwise. Returns a dictionary mapping the index of each
+    # output that could not be flushed to the error.
+    errors = {}
+    if _syncfs is None:
+        for index, output in enumerate(outputs):
+            try:
+                output.sync_files()
+            except Exception, e:
+                errors[index] = str(e)
+        return errors
+    
+    filesystems = {}
+    for index, output in enumerate(outputs):
+        try:
+            device = os.stat(output.temp_name).st_dev
+        except OSError, e:
+            errors[index] = str(e)
+            continue
+        filesystems.setdefault(device, (output.temp_name, []))[1].append(index)
+    for path, indexes in filesystems.values():
+        error = None
+        try:
+            fileno = os.open(path, os.O_RDONLY)
+            try:
+                if _syncfs(fileno) != 0:
+                    error = os.strerror(ctypes.get_errno())
+            finally:
+                os.close(fileno)
+        except OSError, e:
+            error = str(e)
+        if error is not None:
+            for index in indexes:
+                errors[index] = error
+    return errors
+
+def _sync_dir(path):
+    fileno = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fileno)
+    finally:
+        os.close(fileno)
+
+def to_files(jobs, processes=None, group_sync=False, report=None,
+        manifest=None):
+    """Write the output of many documents to files in parallel.
+    
+    The jobs arg is an iterable of (document, file_name, options) tuples. The
+    document is any TextBlock, and the options arg is a dictionary, or None.
+    Its 'backup_name', 'perms', 'gzip_level' and 'gzip_min_size' items are
+    used as in to_file(), and any others, such as 'session', are passed to
+    the document's generate() method.
+    
+    The documents are pickled and rendered across a pool of processes. The
+    processes arg sets their number, defaulting to the number of CPUs on the
+    system. If it is 0, the documents are rendered in this process instead,
+    which suits documents that cannot be pickled.
+    
+    Each file is written as safely as by to_file(), which flushes every
+    file to disk as soon as it is written. If the group_sync arg is True,
+    the files are instead written without waiting on the disk, and once the
+    whole batch is written, each filesystem they are on is flushed with a
+    single syncfs() call, the files are moved into place, and each
+    directory written to is then flushed once. This is much faster for many
+    files, but none are in place until the whole batch is written, and
+    syncfs() also flushes whatever else other programs have written to the
+    same filesystems, which can take a while on a busy one. Where syncfs()
+    is not available, each file is flushed in turn instead, which saves
+    little over to_file(). On Win32 systems, group_sync is ignored.
+    
+    Like to_file(), files already holding the same output are left
+    untouched. If the manifest arg is a Manifest, it is used to tell, and
+    is updated and saved once the batch is done.
+    
+    An error in one document does not stop the others from being written.
+    If given, the report arg is called with a result for each file as soon
+    as it is in place. The return value is the list of all the results. Each
+    is a (file_name, status, seconds, error) tuple, where status is one of
+    'exported', 'unchanged' or 'failed', and error is a message describing
+    the failure, if any. With group_sync, report is also called with a
+    status of 'written' as soon as each file is written, so progress can be
+    followed while the batch renders; these results are not returned.
+    """
+    group_sync = group_sync and os.name != 'nt'
+    results = []
+    pending = []
+    
+    def finish(result, install=None, digest=None):
+        if install is not None:
+            # Written, but not in place until the whole batch is synced.
+            pending.append((result, install, digest))
+            if report:
+                report((result[0], 'written') + result[2:])
+            return
+        if manifest is not None:
+            if result[1] == 'failed':
+                manifest.discard(result[0])
+            else:
+                manifest.set(result[0], digest)
+        results.append(result)
+        if report:
+            report(result)
+    
+    def add_known(jobs):
+        for document, file_name, options in jobs:
+            known = manifest.get(file_name) if manifest is not None else None
+            yield document, file_name, options, group_sync, known
+    
+    if processes == 0:
+        for job in add_known(jobs):
+            finish(*_render_job(job))
+    else:
+        unpicklable = []
+        pool = multiprocessing.Pool(processes)
+        try:
+            work = _pickle_jobs(add_known(jobs), unpicklable)
+            for outcome in pool.imap_unordered(_render_pickled_job, work):
+                finish(*outcome)
+        finally:
+            pool.close()
+            pool.join()
+        for result in unpicklable:
+            finish(result)
+    
+    if pending:
+        # Flush every file to disk before any is moved into place.
+        errors = _sync_outputs([install[0] for _, install, _ in pending])
+        directories = set()
+        for index, (result, install, digest) in enumerate(pending):
+            output, known, file_options = install
+            file_name, status, seconds, error = result
+            start = time.time()
+            try:
+                if index in errors:
+                    output.discard()
+                    status, error = 'failed', errors[index]
+                elif not output.install(known, **file_options):
+                    status = 'unchanged'
+            except Exception, e:
+                status, error = 'failed', str(e)
+            directories.add(os.path.dirname(os.path.abspath(file_name)))
+            seconds += time.time() - start
+            finish((file_name, status, seconds, error), digest=digest)
+        for directory in sorted(directories):
+            _sync_dir(directory)
+    
+    if manifest is not None:
+        manifest.save()
+    return results
+
+def _pickle_jobs(jobs, unpicklable):
+    # This runs in one of the pool's threads, so failures are collected to
+    # be reported afterwards.
+    for job in jobs:
+        try:
+            yield cPickle.dumps(job, 2)
+        except Exception, e:
+            unpicklable.append(
+                (job[1], 'failed', 0.0, 'cannot be pickled: %s' % e)
+                )
+
+def _render_pickled_job(data):
+    return _render_job(cPickle.loads(data))
+
+def _render_job(job):
+    # Return the job's result, the (output, known, file_options) to move the
+    # file into place with if that still needs doing, and the hash of the
+    # output.
+    document, file_name, options, group_sync, known = job
+    start = time.time()
+    options = dict(options or {})
+    file_options = {}
+    for name in ('backup_name', 'perms', 'gzip_min_size'):
+        if name in options:
+            file_options[name] = options.pop(name)
+    output = _TempOutput(
+        file_name, not group_sync, options.pop('gzip_level', None)
+        )
+    try:
+        output.write(document.generate(**options))
+        if group_sync:
+            result = (file_name, 'exported', time.time() - start, None)
+            return result, (output, known, file_options), output.digest
+        if output.install(known, **file_options):
+            status = 'exported'
+        else:
+            status = 'unchanged'
+    except Exception, e:
+        return (file_name, 'failed', time.time() - start, str(e)), None, None
+    return (file_name, status, time.time() - start, None), None, output.digest
+
+
+class Manifest(object):
+    """A record of the hashes of exported files, kept in a JSON file.
+    
+    Passing a Manifest to to_file() or to_files() lets them tell whether a
+    file's output has changed without reading the old file. The record must
+    be kept up to date, so files with entries should only be written through
+    them.
+    
+    >>> import os, tempfile
+    >>> export_dir = tempfile.mkdtemp()
+    >>> manifest = Manifest(os.path.join(export_dir, 'manifest.json'))
+    >>> page = os.path.join(export_dir, 'page.html')
+    >>> to_file(['<p>Hello</p>'], page, manifest=manifest)
+    True
+    >>> to_file(['<p>Hello</p>'], page, manifest=manifest)
+    False
+    >>> manifest.save()
+    >>> Manifest(manifest.file_name).get(page) == manifest.get(page)
+    True
+    >>> import shutil; shutil.rmtree(export_dir)
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.hashes = {}
+        if os.path.exists(file_name):
+            with open(file_name, 'r') as f:
+                self.hashes = json.load(f)
+    
+    def get(self, file_name):
+        """Return the recorded hash of a file, or None.
+        """
+        return self.hashes.get(os.path.abspath(file_name))
+    
+    def set(self, file_name, digest):
+        self.hashes[os.path.abspath(file_name)] = digest
+    
+    def discard(self, file_name):
+        self.hashes.pop(os.path.abspath(file_name), None)
+    
+    def save(self):
+        """Write the manifest to its file.
+        """
+        text = json.dumps(self.hashes, indent=0, sort_keys=True)
+        to_file([text], self.file_name, perms=0644)
+
+class Build(object):
+    """Exports documents again only when the inputs they are made from change.
+    
+    While a document is exported, the inputs its render reads are recorded
+    (see the depends_on() function): the files of its Templates, the schemas
+    it loads, and the keys it reads through named Loaders. The record is kept
+    in a JSON file named by the file_name arg. When the same document is
+    exported by a later build, it is only rendered again if one of those
+    inputs has changed since, so a build in which little has changed
+    renders little.
+    
+    Files are compared by their inode, modification and change times and
+    size (see the file_version() function), and schemas by the hash of their
+    source. The versions of data keys are given by the data arg, a
+    dictionary mapping each Loader name to a function that returns the
+    current version of one of its keys, such as a revision number or a
+    modification time. A document that read a key of a name with no such
+    function is always rendered again. Versions must be JSON values.
+    
+    The versions of inputs are looked up once per Build, so a new Build
+    should be created for each run.
+    
+    >>> import os, tempfile
+    >>> from xmlcomposer import Element, Template, BatchCallBack, Loader
+    >>> export_dir = tempfile.mkdtemp()
+    >>> fragment = os.path.join(export_dir, 'footer.xml')
+    >>> with open(fragment, 'w') as f:
+    ...     f.write('<footer/>')
+    >>> class Page(Element): pass
+    >>> prices = Loader(lambda keys, session: [k * 2 for k in keys], 'prices')
+    >>> def page(n):
+    ...     return Page(BatchCallBack(prices, n), Template(fragment))
+    >>> revisions = {1: 'r1', 2: 'r1'}
+    >>> def build():
+    ...     build = Build(
+    ...         os.path.join(export_dir, 'build.json'),
+    ...         data={'prices': revisions.get},
+    ...         )
+    ...     for n in (1, 2):
+    ...         html = os.path.join(export_dir, 'page%d.html' % n)
+    ...         print build.export(lambda: page(n), html),
+    ...     build.save()
+    >>> build()
+    exported exported
+    >>> build()
+    skipped skipped
+    >>> revisions[2] = 'r2'
+    >>> build()
+    skipped unchanged
+    >>> import shutil; shutil.rmtree(export_dir)
+    """
+    def __init__(self, file_name, data=None):
+        self.file_name = file_name
+        self.data = dict(data or {})
+        self.records = {}
+        if os.path.exists(file_name):
+            with open(file_name, 'r') as f:
+                self.records = json.load(f)
+        self._versions = {}
+    
+    def export(self, document, file_name, session=None, version=None,
+            layout=DEFAULT_LAYOUT, **options):
+        """Export a document with to_file(), if its inputs have changed.
+        
+        The document arg is the TextBlock to export, or a function that
+        takes no args and returns it, which is only called if the document
+        must be rendered. The version arg is any JSON value standing for
+        inputs that are not recorded during the render, such as the
+        document's own data, and the document is rendered again whenever it
+        differs from the last build. Any other keyword args are passed on to
+        to_file().
+        
+        The return value is 'skipped' if the document was not rendered,
+        'unchanged' if it was rendered but its output was the same as
+        before, or 'exported'.
+        """
+        file_name = os.path.abspath(file_name)
+        if not self.changed(file_name, version):
+            return 'skipped'
+        self.records.pop(file_name, None)
+        if not isinstance(document, TextBlock):
+            document = document()
+        
+        found = set()
+        lines = Renderer().generate(
+            document, layout, session=session, dependencies=found
+            )
+        written = to_file(lines, file_name, **options)
+        inputs = []
+        for kind, key, known in found:
+            if known is None:
+                try:
+                    known = self.version(kind, key)
+                except KeyError:
+                    # Never matches, so the document is always rendered.
+                    known = None
+            inputs.append([kind, key, known])
+        self.records[file_name] = _plain(
+            {'version': version, 'inputs': sorted(inputs)}
+            )
+        return 'exported' if written else 'unchanged'
+    
+    def changed(self, file_name, version=None):
+        """Return True if the document of a file must be rendered again.
+        """
+        file_name = os.path.abspath(file_name)
+        record = self.records.get(file_name)
+        if record is None or not os.path.exists(file_name) \
+                or record['version'] != _plain(version):
+            return True
+        for kind, key, known in record['inputs']:
+            try:
+                if self.version(kind, key) != known:
+                    return True
+            except KeyError:
+                return True
+        return False
+    
+    def version(self, kind, key):
+        """Return the current version of an input, as a JSON value.
+        
+        KeyError is raised if the version cannot be known.
+        """
+        cache_key = (kind, json.dumps(key))
+        if cache_key not in self._versions:
+            self._versions[cache_key] = _plain(self.find_version(kind, key))
+        return self._versions[cache_key]
+    
+    def find_version(self, kind, key):
+        """Look up the current version of an input.
+        
+        Override this to support kinds of inputs recorded by CallBacks.
+        """
+        if kind == 'file':
+            try:
+                stat = os.stat(key)
+            except OSError:
+                return None
+            return file_version(stat)
+        elif kind == 'schema':
+            import schema
+            try:
+                return schema._source_hash(key, '')
+            except Exception:
+                raise KeyError(key)
+        elif kind == 'data':
+            # Keys read back from the record have lists for tuples.
+            name, data_key = key
+            return self.data[name](_hashable(data_key))
+        raise KeyError(kind)
+    
+    def save(self):
+        """Write the record of the build to its file.
+        """
+        text = json.dumps(self.records, indent=0, sort_keys=True)
+        to_file([text], self.file_name, perms=0644)
+
+def _plain(value):
+    # The value as it will be read back from JSON, with tuples as lists.
+    return json.loads(json.dumps(value))
+
+def _hashable(value):
+    # A value read back from JSON, with lists turned back into tuples.
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+def to_parts(root, children, file_pattern, max_bytes=None, max_items=None,
+        prolog=(), index_name=None, make_index=None, layout=DEFAULT_LAYOUT,
+        session=None, perms=0622):
+    """Write a document too large for one file to several, or parts.
+    
+    The root arg is the root Element of the document, whose own contents
+    are ignored, and the children arg is an iterable of the TextBlocks to
+    put in it, such as a generator creating them one at a time. Each part
+    holds the prolog arg, a sequence of TextBlocks such as an
+    XMLDeclaration, followed by the root element holding as many of the
+    children as fit. A new part is started before a child that would make
+    the part larger than max_bytes bytes, or hold more than max_items
+    children. A child larger than max_bytes on its own gets a part to
+    itself.
+    
+    The parts are written with to_file() to the file names made by
+    formatting file_pattern with the part numbers, counting from 1, such as
+    'sitemap-%d.xml'. Parts left over from a longer earlier version are
+    removed. Only one child is held in memory at a time, so a document of
+    any size can be written.
+    
+    If index_name is given, an index document listing the parts is written
+    there. It is made by calling make_index with the list of the parts'
+    file names, relative to the index, and by default lists them as the
+    href attributes of <part> elements. The return value is the list of the
+    parts' file names.
+    
+    >>> import os, tempfile
+    >>> class Urlset(Element): pass
+    >>> class Url(Element): pass
+    >>> export_dir = tempfile.mkdtemp()
+    >>> urls = (Url('/page%d' % n) for n in range(5))
+    >>> parts = to_parts(
+    ...     Urlset(), urls, os.path.join(export_dir, 'urls-%d.xml'),
+    ...     max_items=2, index_name=os.path.join(export_dir, 'index.xml'),
+    ...     prolog=[XMLDeclaration()],
+    ...     )
+    >>> [os.path.basename(part) for part in parts]
+    ['urls-1.xml', 'urls-2.xml', 'urls-3.xml']
+    >>> print open(parts[2]).read()
+    <?xml encoding="UTF-8" version="1.0"?>
+    <urlset>
+        <url>/page4</url>
+    </urlset>
+    >>> print open(os.path.join(export_dir, 'index.xml')).read()
+    <?xml encoding="UTF-8" version="1.0"?>
+    <parts>
+        <part href="urls-1.xml"/>
+        <part href="urls-2.xml"/>
+        <part href="urls-3.xml"/>
+    </parts>
+    >>> import shutil; shutil.rmtree(export_dir)
     """
-    pass
+    scope = BASE_SCOPE.make_document_scope()
+    xmlns, inner_scope = root.determine_scope(scope)
+    head = [''.join(block.generate(layout, scope, session)) for block in prolog]
+    head.append(layout(root.open_tag(xmlns)))
+    head = ''.join(head)
+    tail = layout(root.close_tag())
+    
+    inner_layout = layout.indent()
+    texts = (
+        ''.join(child.generate(inner_layout, inner_scope, session))
+        for child in children
+        )
+    splitter = _Splitter(texts, head, tail, max_bytes, max_items)
+    file_names = []
+    while not file_names or splitter.pending is not None:
+        file_name = file_pattern % (len(file_names) + 1)
+        to_file(splitter.part(), file_name, perms=perms)
+        file_names.append(file_name)
+    
+    number = len(file_names) + 1
+    while os.path.exists(file_pattern % number):
+        os.remove(file_pattern % number)
+        number += 1
+    
+    if index_name is not None:
+        base = os.path.dirname(os.path.abspath(index_name))
+        names = [os.path.relpath(name, base) for name in file_names]
+        index = (make_index or _default_index)(names)
+        to_file(index.generate(layout, session=session), index_name,
+            perms=perms)
+    return file_names
+
+
+class _Splitter(object):
+    # Produces the parts of a document, one after another, from a shared
+    # iterator over the rendered children.
+    
+    def __init__(self, texts, head, tail, max_bytes, max_items):
+        self.texts = texts
+        self.head = head
+        self.tail = tail
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.pending = next(texts, None)
+    
+    def part(self):
+        size = len(self.head) + len(self.tail)
+        count = 0
+        yield self.head
+        while self.pending is not None:
+            text = self.pending
+            if count and (
+                    (self.max_items and count >= self.max_items) or
+                    (self.max_bytes and size + len(text) > self.max_bytes)):
+                break
+            yield text
+            size += len(text)
+            count += 1
+            self.pending = next(self.texts, None)
+        yield self.tail
 
+
+class _Parts(Element):
+    tag_name = 'parts'
+
+class _Part(Element):
+    tag_name = 'part'
+
+def _default_index(names):
+    return Document(
+        XMLDeclaration(),
+        _Parts(*[_Part(href=name) for name in names]),
+        )
+
+
+def to_host(lines, url, host=None):
+    """Upload the generated output to a remote host.
+    
+    The lines arg is as in to_file(). The output is streamed to the url with
+    an HTTP PUT request as it is generated, and the request is retried if
+    the host cannot be reached or reports a temporary failure. UploadError
+    is raised if the upload fails.
+    
+    To upload many files, create a host, such as an HttpHost, once and pass
+    it as the host arg, with a url relative to the host. It keeps its
+    connections open between uploads. Otherwise, a host is created and
+    closed for this upload alone.
+    """
+    if host is not None:
+        host.put(url, lines)
+        return
+    parts = urlparse.urlsplit(url)
+    host = HttpHost('%s://%s' % (parts.scheme, parts.netloc))
+    try:
+        host.put(parts.path.lstrip('/'), lines)
+    finally:
+        host.close()
+
+def to_hosts(jobs, host, threads=4, publish=True, report=None):
+    """Upload the output of many documents to a host concurrently.
+    
+    The jobs arg is an iterable of (document, path, options) tuples, where
+    path is relative to the host and options is a dictionary of args for
+    the document's generate() method, or None. The host arg is an HttpHost
+    or any object with the same put() and publish() methods, such as a
+    DirectoryHost.
+    
+    The documents are rendered and uploaded by a pool of threads, whose
+    number is set by the threads arg. Every file is uploaded to a staging
+    area for the batch, so none are visible until the host's publish()
+    method makes the whole batch visible at once. If the publish arg is
+    True, that is done once every file has been uploaded, unless any failed.
+    
+    An error in one document does not stop the others from being uploaded.
+    The return value is a (batch, results) tuple, where batch is the name of
+    the batch, and results is the list of all the results. Each is a
+    (path, status, seconds, error) tuple, where status is either 'uploaded'
+    or 'failed', and error is a message describing the failure, if any. If
+    given, the report arg is called with each result as soon as it is done.
+    """
+    batch = '%s-%s' % (time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+    
+    def upload(job):
+        document, path, options = job
+        start = time.time()
+        try:
+            host.put(path, document.generate(**(options or {})), batch)
+        except Exception, e:
+            return (path, 'failed', time.time() - start, str(e))
+        return (path, 'uploaded', time.time() - start, None)
+    
+    results = []
+    pool = ThreadPool(threads)
+    try:
+        for result in pool.imap_unordered(upload, jobs):
+            results.append(result)
+            if report:
+                report(result)
+    finally:
+        pool.close()
+        pool.join()
+    if publish and not [r for r in results if r[1] == 'failed']:
+        host.publish(batch)
+    return batch, results
+
+
+class UploadError(Exception):
+    """Raised when a file could not be uploaded to a host.
+    
+    The status attribute is the HTTP status of the last attempt, or None if
+    the host could not be reached.
+    """
+    def __init__(self, message, status=None):
+        super(UploadError, self).__init__(message)
+        self.status = status
+
+
+class HttpHost(object):
+    """A remote host that accepts files with HTTP PUT requests.
+    
+    The base_url arg is the URL that paths are relative to. Up to
+    connections persistent connections to the host are kept open, and
+    shared by any number of threads, which wait for one to be free. Each
+    upload is attempted up to retries + 1 times, waiting longer before each
+    retry, when the host cannot be reached, or responds with a 5xx status.
+    The timeout arg is the socket timeout in seconds, and headers is a
+    dictionary of extra headers to send, such as for authorization.
+    
+    The output is sent with chunked transfer encoding as it is generated.
+    So that it can be sent again, it is also spooled to memory, or to a
+    temporary file for large outputs.
+    
+    Files uploaded as part of a batch are put under staging/<batch>/, and
+    publish() then uploads the batch name to the pointer path, which the
+    host is expected to serve the current batch by.
+    """
+    # How much output is gathered before it is sent.
+    chunk_size = 16 * 1024
+    
+    # The largest output spooled to memory rather than a temporary file.
+    spool_size = 1024 * 1024
+    
+    def __init__(self, base_url, connections=4, retries=2, timeout=30,
+            headers=None, staging='staging', pointer='current'):
+        parts = urlparse.urlsplit(base_url)
+        if parts.scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        elif parts.scheme == 'http':
+            self.connection_class = httplib.HTTPConnection
+        else:
+            raise ValueError('Unsupported URL scheme: %s' % base_url)
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.connections = connections
+        self.retries = retries
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.staging = staging
+        self.pointer = pointer
+        self._idle = Queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(connections)
+    
+    def put(self, path, lines, batch=None):
+        """Upload the lines to the path, within a batch if given.
+        """
+        if batch is not None:
+            path = '%s/%s/%s' % (self.staging, batch, path)
+        spool = tempfile.SpooledTemporaryFile(self.spool_size)
+        try:
+            chunks = self._tee(lines, spool)
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(0.1 * 2 ** (attempt - 1))
+                    # Finish spooling anything the failed attempt missed.
+                    for chunk in chunks:
+                        pass
+                    spool.seek(0)
+                    chunks = iter(lambda: spool.read(self.chunk_size), '')
+                try:
+                    status, reason = self._request('PUT', path, chunks)
+                except (socket.error, httplib.HTTPException), e:
+                    status, reason = None, str(e)
+                else:
+                    if status < 300:
+                        return
+                    elif status < 500:
+                        break
+            raise UploadError('Uploading %s failed: %s' % (path, reason), status)
+        finally:
+            spool.close()
+    
+    def publish(self, batch):
+        """Make the files uploaded in a batch visible all at once.
+        """
+        self.put(self.pointer, [batch])
+    
+    def close(self):
+        """Close the idle connections to the host.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Queue.Empty:
+                break
+    
+    def _tee(self, lines, spool):
+        # Gather the lines into chunks, spooling them as they are produced.
+        chunk = []
+        size = 0
+        for line in lines:
+            chunk.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                chunk = ''.join(chunk)
+                spool.write(chunk)
+                yield chunk
+                chunk = []
+                size = 0
+        if chunk:
+            chunk = ''.join(chunk)
+            spool.write(chunk)
+            yield chunk
+    
+    def _request(self, method, path, chunks):
+        # Send a request on a pooled connection, returning the response's
+        # status and reason.
+        url = urllib.quote('%s/%s' % (self.base_path, path))
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except Queue.Empty:
+                connection = self.connection_class(
+                    self.netloc, timeout=self.timeout
+                    )
+            try:
+                connection.putrequest(method, url, skip_accept_encoding=True)
+                for name, value in sorted(self.headers.items()):
+                    connection.putheader(name, value)
+                connection.putheader('Transfer-Encoding', 'chunked')
+                connection.endheaders()
+                for chunk in chunks:
+                    connection.send('%x\r\n%s\r\n' % (len(chunk), chunk))
+                connection.send('0\r\n\r\n')
+                response = connection.getresponse()
+                response.read()
+            except:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._idle.put(connection)
+        return response.status, response.reason
+
+
+class DirectoryHost(object):
+    """A host that publishes files to a local directory.
+    
+    This has the same put() and publish() methods as HttpHost, for use with
+    to_hosts(), such as to publish to a directory shared with a web server.
+    Files are written with to_file(), and those in a batch are put under
+    staging/<batch>/ in the root directory. Publishing replaces the pointer
+    symbolic link in the root directory with one to the batch's directory,
+    which is atomic on POSIX-compliant systems.
+    """
+    def __init__(self, root, staging='staging', pointer='current'):
+        self.root = root
+        self.staging = staging
+        self.pointer = pointer
+    
+    def put(self, path, lines, batch=None):
+        if batch is not None:
+            path = os.path.join(self.staging, batch, path)
+        to_file(lines, os.path.join(self.root, path), perms=0644)
+    
+    def publish(self, batch):
+        link_name = os.path.join(self.root, self.pointer)
+        temp_name = '%s.%s' % (link_name, batch)
+        os.symlink(os.path.join(self.staging, batch), temp_name)
+        os.rename(temp_name, link_name)
+    
+    def close(self):
+        pass
@@ -0,0 +1,268 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Exporting RSS 2.0 feeds that new items can be added to cheaply.
+
+A FeedWriter exports a feed once in full, along with an index of where its
+items are in the file. Later, new items can be added to the front of the
+feed, and the oldest ones dropped, by rendering only the new items. The rest
+of the file is copied from the old version as it is, without being generated
+or parsed again.
+
+>>> import os, tempfile
+>>> from xmlcomposer.formats.rss2 import Rss, Channel, Title, Item
+>>> file_name = os.path.join(tempfile.mkdtemp(), 'feed.xml')
+>>> writer = FeedWriter(file_name, max_items=2)
+>>> writer.export(Rss(version='2.0')(Channel(
+...     Title('News'),
+...     Item(Title('First')),
+...     )))
+>>> writer.append([Item(Title('Second')), Item(Title('Third'))])
+>>> print open(file_name).read()
+<rss version="2.0">
+    <channel>
+        <title>News</title>
+        <item>
+            <title>Second</title>
+        </item>
+        <item>
+            <title>Third</title>
+        </item>
+    </channel>
+</rss>
+>>> import shutil; shutil.rmtree(os.path.dirname(file_name))
+"""
+
+import copy
+import json
+import os
+
+import export
+from _document import Document
+from _element import Element
+from _layout import Layout, DEFAULT_LAYOUT
+from _namespace import BASE_SCOPE, Scope
+from _text import TextBlock
+
+class _Marker(str):
+    pass
+
+# Generated around the items of a feed, and after each item, so their
+# positions in the output can be found. Like FLUSH, they are empty strings.
+_REGION = _Marker()
+_ITEM_END = _Marker()
+
+
+class FeedWriter(object):
+    """Exports an RSS 2.0 feed to a file, and adds new items to it.
+    
+    The file_name arg is where the feed is exported to, and the index of its
+    items is kept in a JSON file named by the index_name arg, which defaults
+    to file_name + '.index'. If max_items is given, the oldest items are
+    dropped when adding new ones would make the feed longer than that.
+    
+    Items are kept newest first, after any other contents of the channel.
+    The file and its index are each replaced atomically with
+    export.to_file().
+    """
+    def __init__(self, file_name, max_items=None, index_name=None):
+        self.file_name = file_name
+        self.index_name = index_name or file_name + '.index'
+        self.max_items = max_items
+    
+    def export(self, feed, layout=DEFAULT_LAYOUT, session=None,
+            scope=BASE_SCOPE):
+        """Write a whole feed, replacing any earlier version.
+        
+        The feed arg is a Document or an Element, such as an rss2.Rss
+        instance, holding an element with the 'channel' tag name. Its items
+        are the elements in the channel with the 'item' tag name. The
+        layout, session and scope args are those of its generate() method.
+        """
+        region = _ItemRegion()
+        feed = _move_items(feed, region)
+        if region.items is None:
+            raise ValueError('The feed has no channel.')
+        if self.max_items is not None:
+            del region.items[self.max_items:]
+        
+        index = {'items': []}
+        def track(lines):
+            offset = 0
+            start = None
+            for line in lines:
+                if line is _REGION:
+                    if start is None:
+                        start = offset
+                        index['region'] = [offset, None]
+                    else:
+                        index['region'][1] = offset
+                elif line is _ITEM_END:
+                    index['items'].append([start, offset])
+                    start = offset
+                else:
+                    offset += len(line)
+                    yield line
+        
+        export.to_file(
+            track(feed.generate(layout, scope, session)),
+            self.file_name, perms=0644
+            )
+        index['layout'] = list(region.layout[:4])
+        index['scope'] = sorted(
+            [namespace.__name__, namespace.__prefix__]
+            for namespace in region.scope
+            )
+        self._write_index(index)
+    
+    def append(self, items, session=None):
+        """Add new items to the front of an exported feed.
+        
+        The items are given newest first. ValueError is raised if the feed
+        has not been exported, or was changed since by anything but this
+        class, in which case it must be exported again.
+        """
+        index = self._read_index()
+        layout = Layout(*index['layout'])
+        # The items are generated in the scope the channel gave the others.
+        scope = _IndexedScope(
+            tuple(names) for names in index.get('scope', ())
+            )
+        rendered = []
+        for item in items:
+            rendered.append(''.join(item.generate(layout, scope, session)))
+        kept = index['items']
+        if self.max_items is not None:
+            del rendered[self.max_items:]
+            del kept[max(0, self.max_items - len(rendered)):]
+        region_start, region_end = index['region']
+        
+        new_index = {
+            'items': [],
+            'region': [region_start, None],
+            'layout': index['layout'],
+            'scope': index['scope'],
+            }
+        offset = region_start
+        for text in rendered:
+            new_index['items'].append([offset, offset + len(text)])
+            offset += len(text)
+        if kept:
+            shift = offset - kept[0][0]
+            for start, end in kept:
+                new_index['items'].append([start + shift, end + shift])
+            offset = kept[-1][1] + shift
+        new_index['region'][1] = offset
+        
+        def lines(f):
+            for block in _copy_range(f, 0, region_start):
+                yield block
+            for text in rendered:
+                yield text
+            if kept:
+                for block in _copy_range(f, kept[0][0], kept[-1][1]):
+                    yield block
+            for block in _copy_range(f, region_end, index['size']):
+                yield block
+        
+        with open(self.file_name, 'rb') as f:
+            export.to_file(lines(f), self.file_name, perms=0644)
+        self._write_index(new_index)
+    
+    def _read_index(self):
+        try:
+            with open(self.index_name, 'r') as f:
+                index = json.load(f)
+            stat = os.stat(self.file_name)
+        except (IOError, OSError, ValueError):
+            raise ValueError('The feed has not been exported.')
+        if (stat.st_size, stat.st_mtime) != (index['size'], index['mtime']):
+            raise ValueError('The feed has changed since it was exported.')
+        return index
+    
+    def _write_index(self, index):
+        stat = os.stat(self.file_name)
+        index['size'] = stat.st_size
+        index['mtime'] = stat.st_mtime
+        text = json.dumps(index, sort_keys=True)
+        export.to_file([text], self.index_name, perms=0644)
+
+
+class _ItemRegion(TextBlock):
+    # Stands in for the items of a channel, marking where they are.
+    
+    def __init__(self):
+        self.items = None
+        self.layout = None
+        self.scope = None
+    
+    def callbacks(self):
+        for item in self.items:
+            for callback in item.callbacks():
+                yield callback
+    
+    def generate(self, layout=DEFAULT_LAYOUT, scope=BASE_SCOPE, session=None):
+        self.layout = layout
+        self.scope = scope
+        yield _REGION
+        for item in self.items:
+            for line in item.generate(layout, scope, session):
+                yield line
+            yield _ITEM_END
+        yield _REGION
+
+
+class _IndexedScope(Scope):
+    # The scope of the items of an exported feed, as recorded in its index.
+    # The Namespace instances it held are gone, so namespaces are found in
+    # it by their names and prefixes instead.
+    
+    def __new__(cls, names, *namespaces):
+        scope = super(_IndexedScope, cls).__new__(cls, *namespaces)
+        scope.names = frozenset(names)
+        return scope
+    
+    def __contains__(self, namespace):
+        return (namespace.__name__, namespace.__prefix__) in self.names \
+            or super(_IndexedScope, self).__contains__(namespace)
+    
+    def merge(self, *args):
+        return _IndexedScope(self.names, *self.union(args))
+
+
+def _move_items(block, region):
+    # Return a copy of the block in which the items of its channel are moved
+    # into the region, leaving the original unchanged.
+    if isinstance(block, Document):
+        return Document(*[
+            _move_items(item, region) for item in block.contents
+            ])
+    elif not isinstance(block, Element):
+        return block
+    
+    contents = block._contents
+    new_block = copy.copy(block)
+    new_block._contents = []
+    new_block._content_types = set()
+    if block.tag_name == 'channel' and region.items is None:
+        region.items = [c for c in contents if _is_item(c)]
+        new_block.add(*[c for c in contents if not _is_item(c)])
+        new_block.add(region)
+    else:
+        new_block.add(*[_move_items(item, region) for item in contents])
+    return new_block
+
+def _is_item(block):
+    return isinstance(block, Element) and block.tag_name == 'item'
+
+def _copy_range(f, start, end, block_size=1024 * 1024):
+    # Read the bytes from start to end of a file, a block at a time.
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = f.read(min(block_size, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
@@ -5,321 +5,594 @@ This representation may or may not be accurate.
 
 import xmlcomposer
 
+# Attributes that are permitted on every element.
+_GLOBAL = frozenset([
+    'accesskey', 'class', 'contenteditable', 'contextmenu', 'dir', 'draggable',
+    'dropzone', 'hidden', 'id', 'lang', 'role', 'spellcheck', 'style',
+    'tabindex', 'title', 'translate', 'xml:lang', 'xml:space',
+    'onabort', 'onblur', 'oncanplay', 'oncanplaythrough', 'onchange',
+    'onclick', 'oncontextmenu', 'ondblclick', 'ondrag', 'ondragend',
+    'ondragenter', 'ondragleave', 'ondragover', 'ondragstart', 'ondrop',
+    'ondurationchange', 'onemptied', 'onended', 'onerror', 'onfocus',
+    'oninput', 'oninvalid', 'onkeydown', 'onkeypress', 'onkeyup', 'onload',
+    'onloadeddata', 'onloadedmetadata', 'onloadstart', 'onmousedown',
+    'onmousemove', 'onmouseout', 'onmouseover', 'onmouseup', 'onmousewheel',
+    'onpause', 'onplay', 'onplaying', 'onprogress', 'onratechange', 'onreset',
+    'onscroll', 'onseeked', 'onseeking', 'onselect', 'onshow', 'onstalled',
+    'onsubmit', 'onsuspend', 'ontimeupdate', 'onvolumechange', 'onwaiting'
+    ])
+
+# Custom data and accessibility attributes can have any name with these
+# prefixes.
+_PREFIXES = ('xmlns', 'data-', 'aria-')
+
 class A(xmlcomposer.Element):
     self_closing=False
+    allowed_attributes = _GLOBAL | frozenset([
+        'download', 'href', 'hreflang', 'media', 'ping', 'rel', 'target',
+        'type'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Abbr(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Address(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Area(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'alt', 'coords', 'download', 'href', 'hreflang', 'media', 'ping',
+        'rel', 'shape', 'target', 'type'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Article(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Aside(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Audio(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'autoplay', 'controls', 'crossorigin', 'loop', 'mediagroup', 'muted',
+        'preload', 'src'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class B(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Base(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset(['href', 'target'])
+    attribute_prefixes = _PREFIXES
 
 class Bdo(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Blockquote(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['cite'])
+    attribute_prefixes = _PREFIXES
 
 class Body(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'onafterprint', 'onbeforeprint', 'onbeforeunload', 'onhashchange',
+        'onmessage', 'onoffline', 'ononline', 'onpagehide', 'onpageshow',
+        'onpopstate', 'onresize', 'onstorage', 'onunload'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Br(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Button(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'autofocus', 'disabled', 'form', 'formaction', 'formenctype',
+        'formmethod', 'formnovalidate', 'formtarget', 'name', 'type', 'value'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Canvas(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['height', 'width'])
+    attribute_prefixes = _PREFIXES
 
 class Caption(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Cite(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Code(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Col(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset(['span'])
+    attribute_prefixes = _PREFIXES
 
 class Colgroup(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['span'])
+    attribute_prefixes = _PREFIXES
 
 class Command(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'checked', 'command', 'disabled', 'icon', 'label', 'radiogroup', 'type'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Datalist(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Dd(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Del(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['cite', 'datetime'])
+    attribute_prefixes = _PREFIXES
 
 class Details(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['open'])
+    attribute_prefixes = _PREFIXES
 
 class Dfn(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Dialog(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['open'])
+    attribute_prefixes = _PREFIXES
 
 class Div(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Dl(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Dt(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Em(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Embed(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'height', 'src', 'type', 'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Fieldset(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['disabled', 'form', 'name'])
+    attribute_prefixes = _PREFIXES
 
 class Figure(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Footer(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Form(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'accept-charset', 'action', 'autocomplete', 'enctype', 'method',
+        'name', 'novalidate', 'target'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class H1(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class H2(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class H3(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class H4(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class H5(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class H6(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Head(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Header(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Hgroup(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Hr(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Html(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['manifest'])
+    attribute_prefixes = _PREFIXES
 
 class I(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Iframe(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'height', 'name', 'sandbox', 'seamless', 'src', 'srcdoc', 'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Img(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'alt', 'crossorigin', 'height', 'ismap', 'src', 'usemap', 'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Input(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'accept', 'alt', 'autocomplete', 'autofocus', 'checked', 'dirname',
+        'disabled', 'form', 'formaction', 'formenctype', 'formmethod',
+        'formnovalidate', 'formtarget', 'height', 'list', 'max', 'maxlength',
+        'min', 'multiple', 'name', 'pattern', 'placeholder', 'readonly',
+        'required', 'size', 'src', 'step', 'type', 'value', 'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Ins(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['cite', 'datetime'])
+    attribute_prefixes = _PREFIXES
 
 class Kbd(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Keygen(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'autofocus', 'challenge', 'disabled', 'form', 'keytype', 'name'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Label(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['for', 'form'])
+    attribute_prefixes = _PREFIXES
 
 class Legend(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Li(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['value'])
+    attribute_prefixes = _PREFIXES
 
 class Link(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'crossorigin', 'href', 'hreflang', 'media', 'rel', 'sizes', 'type'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Map(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['name'])
+    attribute_prefixes = _PREFIXES
 
 class Mark(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Mathml(xmlcomposer.Element):
     self_closing = False
 
 class Menu(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['label', 'type'])
+    attribute_prefixes = _PREFIXES
 
 class Meta(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'charset', 'content', 'http-equiv', 'name'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Meter(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'high', 'low', 'max', 'min', 'optimum', 'value'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Nav(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Noscript(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Object(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'data', 'form', 'height', 'name', 'type', 'typemustmatch', 'usemap',
+        'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Ol(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['reversed', 'start', 'type'])
+    attribute_prefixes = _PREFIXES
 
 class Optgroup(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['disabled', 'label'])
+    attribute_prefixes = _PREFIXES
 
 class Option(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'disabled', 'label', 'selected', 'value'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Output(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['for', 'form', 'name'])
+    attribute_prefixes = _PREFIXES
 
 class P(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Param(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset(['name', 'value'])
+    attribute_prefixes = _PREFIXES
 
 class Pre(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Progress(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['max', 'value'])
+    attribute_prefixes = _PREFIXES
 
 class Q(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['cite'])
+    attribute_prefixes = _PREFIXES
 
 class Rp(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Rt(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Ruby(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Samp(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Script(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'async', 'charset', 'crossorigin', 'defer', 'src', 'type'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Section(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Select(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'autofocus', 'disabled', 'form', 'multiple', 'name', 'required', 'size'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Small(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Source(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset(['media', 'src', 'type'])
+    attribute_prefixes = _PREFIXES
 
 class Span(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Strong(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Style(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['media', 'scoped', 'type'])
+    attribute_prefixes = _PREFIXES
 
 class Sub(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Sup(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Svg(xmlcomposer.Element):
     self_closing = False
 
 class Table(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['border'])
+    attribute_prefixes = _PREFIXES
 
 class Tbody(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Td(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['colspan', 'headers', 'rowspan'])
+    attribute_prefixes = _PREFIXES
 
 class Textarea(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'autofocus', 'cols', 'dirname', 'disabled', 'form', 'maxlength',
+        'name', 'placeholder', 'readonly', 'required', 'rows', 'wrap'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Tfoot(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Th(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'abbr', 'colspan', 'headers', 'rowspan', 'scope'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Thead(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Time(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset(['datetime', 'pubdate'])
+    attribute_prefixes = _PREFIXES
 
 class Title(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Tr(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Track(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL | frozenset([
+        'default', 'kind', 'label', 'src', 'srclang'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Ul(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Var(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
 class Video(xmlcomposer.Element):
     self_closing = False
+    allowed_attributes = _GLOBAL | frozenset([
+        'autoplay', 'controls', 'crossorigin', 'height', 'loop', 'mediagroup',
+        'muted', 'poster', 'preload', 'src', 'width'
+        ])
+    attribute_prefixes = _PREFIXES
 
 class Wbr(xmlcomposer.Element):
-    pass
+    allowed_attributes = _GLOBAL
+    attribute_prefixes = _PREFIXES
 
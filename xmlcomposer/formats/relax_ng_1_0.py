@@ -5,85 +5,148 @@ __namespace__='http://relaxng.org/ns/structure/1.0'
 
 class AnyName(xmlcomposer.Element):
     tag_name = 'anyName'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Attribute(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'name', 'ns'
+        ])
 
 class Choice(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Data(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns', 'type'
+        ])
 
 class Define(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'combine', 'datatypeLibrary', 'name', 'ns'
+        ])
 
 class Div(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Element(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'name', 'ns'
+        ])
 
 class Empty(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Except(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class ExternalRef(xmlcomposer.Element):
     tag_name = 'externalRef'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'href', 'ns'
+        ])
 
 class Grammar(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Group(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Include(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'href', 'ns'
+        ])
 
 class Interleave(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class List(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Mixed(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Name(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class NotAllowed(xmlcomposer.Element):
     tag_name = 'notAllowed'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class NsName(xmlcomposer.Element):
     tag_name = 'nsName'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class OneOrMore(xmlcomposer.Element):
     tag_name = 'oneOrMore'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Optional(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Param(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'name', 'ns'
+        ])
 
 class ParentRef(xmlcomposer.Element):
     tag_name = 'parentRef'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'name', 'ns'
+        ])
 
 class Ref(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'name', 'ns'
+        ])
 
 class Start(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'combine', 'datatypeLibrary', 'ns'
+        ])
 
 class Text(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
 class Value(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns', 'type'
+        ])
 
 class ZeroOrMore(xmlcomposer.Element):
     tag_name = 'zeroOrMore'
+    allowed_attributes = frozenset([
+        'datatypeLibrary', 'ns'
+        ])
 
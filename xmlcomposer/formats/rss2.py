@@ -5,92 +5,111 @@ __namespace__='http://backend.userland.com/rss2'
 
 
 class Author(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Category(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'domain'
+        ])
 
 class Channel(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Cloud(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'domain', 'path', 'port', 'protocol', 'registerProcedure'
+        ])
 
 class Comments(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Copyright(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Description(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Docs(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Enclosure(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'length', 'type', 'url'
+        ])
 
 class Generator(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Guid(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'isPermaLink'
+        ])
 
 class Height(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Image(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Item(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Language(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class LastBuildDate(xmlcomposer.Element):
     tag_name = 'lastBuildDate'
+    allowed_attributes = frozenset()
 
 class Link(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class ManagingEditor(xmlcomposer.Element):
     tag_name = 'managingEditor'
+    allowed_attributes = frozenset()
 
 class Name(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class PubDate(xmlcomposer.Element):
     tag_name = 'pubDate'
+    allowed_attributes = frozenset()
 
 class Rss(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'version'
+        ])
 
 class SkipDays(xmlcomposer.Element):
     tag_name = 'skipDays'
+    allowed_attributes = frozenset()
 
 class SkipHours(xmlcomposer.Element):
     tag_name = 'skipHours'
+    allowed_attributes = frozenset()
 
 class Source(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset([
+        'url'
+        ])
 
 class TextInput(xmlcomposer.Element):
     tag_name = 'textInput'
+    allowed_attributes = frozenset()
 
 class Title(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Ttl(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class Url(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
 class WebMaster(xmlcomposer.Element):
     tag_name = 'webMaster'
+    allowed_attributes = frozenset()
 
 class Width(xmlcomposer.Element):
-    pass
+    allowed_attributes = frozenset()
 
@@ -3,166 +3,299 @@ import xmlcomposer
 
 __namespace__ = 'http://www.w3.org/1999/xhtml'
 
-class A(xmlcomposer.Element): pass
+# Attribute groups shared by many elements, named after the DTD entities.
+_CORE = frozenset(['class', 'id', 'style', 'title'])
+_I18N = frozenset(['dir', 'lang', 'xml:lang'])
+_EVENTS = frozenset([
+    'onclick', 'ondblclick', 'onkeydown', 'onkeypress', 'onkeyup',
+    'onmousedown', 'onmousemove', 'onmouseout', 'onmouseover', 'onmouseup'
+    ])
+_ATTRS = _CORE | _I18N | _EVENTS
+_FOCUS = frozenset(['accesskey', 'onblur', 'onfocus', 'tabindex'])
+_CELL_ALIGN = frozenset(['align', 'char', 'charoff', 'valign'])
 
-class Abbr(xmlcomposer.Element): pass
+class A(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _FOCUS | frozenset([
+        'charset', 'coords', 'href', 'hreflang', 'name', 'rel', 'rev', 'shape',
+        'type'
+        ])
 
-class Acronym(xmlcomposer.Element): pass
+class Abbr(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Address(xmlcomposer.Element): pass
+class Acronym(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Area(xmlcomposer.Element): pass
+class Address(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class B(xmlcomposer.Element): pass
+class Area(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _FOCUS | frozenset([
+        'alt', 'coords', 'href', 'nohref', 'shape'
+        ])
 
-class Base(xmlcomposer.Element): pass
+class B(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Bdo(xmlcomposer.Element): pass
+class Base(xmlcomposer.Element):
+    allowed_attributes = frozenset(['href', 'id'])
 
-class Big(xmlcomposer.Element): pass
+class Bdo(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Blockquote(xmlcomposer.Element): pass
+class Big(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Body(xmlcomposer.Element): pass
+class Blockquote(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['cite'])
 
-class Br(xmlcomposer.Element): pass
+class Body(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['onload', 'onunload'])
 
-class Button(xmlcomposer.Element): pass
+class Br(xmlcomposer.Element):
+    allowed_attributes = _CORE
 
-class Caption(xmlcomposer.Element): pass
+class Button(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _FOCUS | frozenset([
+        'disabled', 'name', 'type', 'value'
+        ])
 
-class Cite(xmlcomposer.Element): pass
+class Caption(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
+
+class Cite(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
 class Code(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
     preformatted = True
 
-class Col(xmlcomposer.Element): pass
+class Col(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN | frozenset(['span', 'width'])
 
-class Colgroup(xmlcomposer.Element): pass
+class Colgroup(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN | frozenset(['span', 'width'])
 
-class Dd(xmlcomposer.Element): pass
+class Dd(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Del(xmlcomposer.Element): pass
+class Del(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['cite', 'datetime'])
 
-class Dfn(xmlcomposer.Element): pass
+class Dfn(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Div(xmlcomposer.Element): pass
+class Div(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Dl(xmlcomposer.Element): pass
+class Dl(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Dt(xmlcomposer.Element): pass
+class Dt(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Em(xmlcomposer.Element): pass
+class Em(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Fieldset(xmlcomposer.Element): pass
+class Fieldset(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Form(xmlcomposer.Element): pass
+class Form(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'accept', 'accept-charset', 'action', 'enctype', 'method', 'onreset',
+        'onsubmit'
+        ])
 
-class H1(xmlcomposer.Element): pass
+class H1(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class H2(xmlcomposer.Element): pass
+class H2(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class H3(xmlcomposer.Element): pass
+class H3(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class H4(xmlcomposer.Element): pass
+class H4(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class H5(xmlcomposer.Element): pass
+class H5(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class H6(xmlcomposer.Element): pass
+class H6(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Head(xmlcomposer.Element): pass
+class Head(xmlcomposer.Element):
+    allowed_attributes = _I18N | frozenset(['id', 'profile'])
 
-class Hr(xmlcomposer.Element): pass
+class Hr(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
 class Html(xmlcomposer.Element):
+    allowed_attributes = _I18N | frozenset(['id', 'xmlns'])
     default_attributes = {
         'xml:lang': 'en',
         'lang': 'en'
         }
 
-class I(xmlcomposer.Element): pass
+class I(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Img(xmlcomposer.Element): pass
+class Img(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'alt', 'height', 'ismap', 'longdesc', 'src', 'usemap', 'width'
+        ])
 
-class Input(xmlcomposer.Element): pass
+class Input(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _FOCUS | frozenset([
+        'accept', 'alt', 'checked', 'disabled', 'maxlength', 'name',
+        'onchange', 'onselect', 'readonly', 'size', 'src', 'type', 'usemap',
+        'value'
+        ])
 
-class Ins(xmlcomposer.Element): pass
+class Ins(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['cite', 'datetime'])
 
-class Kbd(xmlcomposer.Element): pass
+class Kbd(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Label(xmlcomposer.Element): pass
+class Label(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'accesskey', 'for', 'onblur', 'onfocus'
+        ])
 
-class Legend(xmlcomposer.Element): pass
+class Legend(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['accesskey'])
 
-class Li(xmlcomposer.Element): pass
+class Li(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Link(xmlcomposer.Element): pass
+class Link(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'charset', 'href', 'hreflang', 'media', 'rel', 'rev', 'type'
+        ])
 
-class Map(xmlcomposer.Element): pass
+class Map(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['name'])
 
-class Meta(xmlcomposer.Element): pass
+class Meta(xmlcomposer.Element):
+    allowed_attributes = _I18N | frozenset([
+        'content', 'http-equiv', 'id', 'name', 'scheme'
+        ])
 
-class Noscript(xmlcomposer.Element): pass
+class Noscript(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Object(xmlcomposer.Element): pass
+class Object(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'archive', 'classid', 'codebase', 'codetype', 'data', 'declare',
+        'height', 'name', 'standby', 'tabindex', 'type', 'usemap', 'width'
+        ])
 
-class Ol(xmlcomposer.Element): pass
+class Ol(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Optgroup(xmlcomposer.Element): pass
+class Optgroup(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['disabled', 'label'])
 
-class Option(xmlcomposer.Element): pass
+class Option(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'disabled', 'label', 'selected', 'value'
+        ])
 
-class P(xmlcomposer.Element): pass
+class P(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Param(xmlcomposer.Element): pass
+class Param(xmlcomposer.Element):
+    allowed_attributes = frozenset([
+        'id', 'name', 'type', 'value', 'valuetype'
+        ])
 
 class Pre(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['xml:space'])
     preformatted = True
     
-class Q(xmlcomposer.Element): pass
+class Q(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset(['cite'])
 
-class Samp(xmlcomposer.Element): pass
+class Samp(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
 class Script(xmlcomposer.Element):
+    allowed_attributes = frozenset([
+        'charset', 'defer', 'id', 'src', 'type', 'xml:space'
+        ])
     preformatted = True
 
-class Select(xmlcomposer.Element): pass
+class Select(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'disabled', 'multiple', 'name', 'onblur', 'onchange', 'onfocus',
+        'size', 'tabindex'
+        ])
 
-class Small(xmlcomposer.Element): pass
+class Small(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Span(xmlcomposer.Element): pass
+class Span(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Strong(xmlcomposer.Element): pass
+class Strong(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
 class Style(xmlcomposer.Element):
+    allowed_attributes = _I18N | frozenset([
+        'id', 'media', 'title', 'type', 'xml:space'
+        ])
     preformatted = True
 
-class Sub(xmlcomposer.Element): pass
+class Sub(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Sup(xmlcomposer.Element): pass
+class Sup(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Table(xmlcomposer.Element): pass
+class Table(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | frozenset([
+        'border', 'cellpadding', 'cellspacing', 'frame', 'rules', 'summary',
+        'width'
+        ])
 
-class Tbody(xmlcomposer.Element): pass
+class Tbody(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN
 
-class Td(xmlcomposer.Element): pass
+class Td(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN | frozenset([
+        'abbr', 'axis', 'colspan', 'headers', 'rowspan', 'scope'
+        ])
 
-class Textarea(xmlcomposer.Element): pass
+class Textarea(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _FOCUS | frozenset([
+        'cols', 'disabled', 'name', 'onchange', 'onselect', 'readonly', 'rows'
+        ])
 
-class Tfoot(xmlcomposer.Element): pass
+class Tfoot(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN
 
-class Th(xmlcomposer.Element): pass
+class Th(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN | frozenset([
+        'abbr', 'axis', 'colspan', 'headers', 'rowspan', 'scope'
+        ])
 
-class Thead(xmlcomposer.Element): pass
+class Thead(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN
 
-class Title(xmlcomposer.Element): pass
+class Title(xmlcomposer.Element):
+    allowed_attributes = _I18N | frozenset(['id'])
 
-class Tr(xmlcomposer.Element): pass
+class Tr(xmlcomposer.Element):
+    allowed_attributes = _ATTRS | _CELL_ALIGN
 
 class Tt(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
     preformatted = True
 
-class Ul(xmlcomposer.Element): pass
+class Ul(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
-class Var(xmlcomposer.Element): pass
+class Var(xmlcomposer.Element):
+    allowed_attributes = _ATTRS
 
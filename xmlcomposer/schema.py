@@ -4,8 +4,14 @@
 """Code for generating XML element classes from various schema formats.
 """
 
+import hashlib
+import json
+import multiprocessing
 import os
+import re
 import sys
+import textwrap
+import time
 import urllib2
 from urlparse import urlparse, urlunparse
 from operator import attrgetter
@@ -13,6 +19,8 @@ from xml.dom import minidom
 
 from _namespace import Namespace
 from _element import Element
+from _render import HOOKS, depends_on
+import export as _export
 
 if os.name == 'posix':
     CACHE = os.path.join(os.environ['HOME'], '.config/xmlcomposer/schema/')
@@ -23,6 +31,9 @@ else:
     CACHE = os.path.join(os.getcwd(), 'xmlcomposer/cache/schema/')
 CACHE = os.path.normpath(CACHE)
 
+# The extensions of the schema types that can be loaded.
+SCHEMA_EXTENSIONS = ('.dtd', '.xsd', '.rng')
+
 def load(schema_location, namespace_id='', namespace_prefix=''):
     """Create elements from schema information at a location.
     
@@ -35,9 +46,20 @@ def load(schema_location, namespace_id='', namespace_prefix=''):
     
     The return value is a namespace loaded with element classes which
     are auto-generated from the schema.
+    
+    When called during a render, the schema is recorded as an input of it
+    (see the depends_on() function). Loads are counted and timed if metrics
+    are enabled (see the Metrics class).
     """
+    depends_on('schema', schema_location)
+    metrics = HOOKS.metrics
+    start = time.time()
     schema = SchemaDocument(schema_location)
-    return schema.parse(namespace_id, namespace_prefix)
+    namespace = schema.parse(namespace_id, namespace_prefix)
+    if metrics is not None:
+        metrics.count('schema_loads')
+        metrics.observe('schema_seconds', time.time() - start)
+    return namespace
 
 def export(schema_location, namespace_id='', export_path=None):
     """Load elements from a schema then write them to a python module.
@@ -63,10 +85,12 @@ def export(schema_location, namespace_id='', export_path=None):
         
         for element in sorted(namespace, key=attrgetter('__name__')):
             f.write('\nclass %s(xmlcomposer.Element):\n' % element.__name__)
-            if element.tag_name == element.__name__.lower():
-                f.write('    pass\n')
-            else:
-                f.write("    tag_name = '%s'\n" % element.tag_name)
+            body = []
+            if element.tag_name != element.__name__.lower():
+                body.append("    tag_name = '%s'\n" % element.tag_name)
+            if element.allowed_attributes is not None:
+                body.append(format_attribute_set(element.allowed_attributes))
+            f.write(''.join(body) or '    pass\n')
         
         f.write('\n')
         f.flush()
@@ -74,6 +98,188 @@ def export(schema_location, namespace_id='', export_path=None):
         if export_path:
             f.close()
 
+def export_all(schemas, export_dir, processes=None, force=False,
+        report=None):
+    """Export many schemas to python modules in parallel.
+    
+    The schemas arg is an iterable of (location, namespace_id, module_name)
+    tuples. Each schema is written to module_name + '.py' in the export_dir.
+    
+    The work is spread over a pool of processes. The processes arg sets
+    their number, defaulting to the number of CPUs on the system.
+    
+    The hash of each schema's source, along with that of any DTD modules it
+    includes, is recorded in a manifest in the CACHE directory. A schema
+    whose source and namespace_id are unchanged since it was last exported,
+    and whose module still exists, is skipped unless the force arg is True.
+    
+    If given, the report arg is called with a result for each schema as soon
+    as it is done. The return value is the list of all the results. Each is a
+    (location, export_path, status, seconds, error) tuple, where status is
+    one of 'exported', 'unchanged' or 'failed', and error is a message
+    describing the failure, if any.
+    """
+    if not os.path.exists(export_dir):
+        os.makedirs(export_dir)
+    manifest = _read_manifest()
+    results = []
+    jobs = []
+    for location, namespace_id, module_name in schemas:
+        export_path = os.path.abspath(
+            os.path.join(export_dir, module_name + '.py')
+            )
+        start = time.time()
+        try:
+            digest = _source_hash(location, namespace_id)
+        except Exception, e:
+            result = (location, export_path, 'failed', 0.0, str(e))
+        else:
+            if not force and os.path.exists(export_path) \
+                    and manifest.get(export_path) == digest:
+                result = (
+                    location, export_path, 'unchanged',
+                    time.time() - start, None
+                    )
+            else:
+                jobs.append((location, namespace_id, export_path, digest))
+                continue
+        results.append(result)
+        if report:
+            report(result)
+    
+    if jobs:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for result, digest in pool.imap_unordered(_export_job, jobs):
+                export_path, status = result[1:3]
+                if status == 'exported':
+                    manifest[export_path] = digest
+                else:
+                    manifest.pop(export_path, None)
+                results.append(result)
+                if report:
+                    report(result)
+        finally:
+            pool.close()
+            pool.join()
+        _write_manifest(manifest)
+    return results
+
+def find_schemas(path):
+    """Return (location, namespace_id, module_name) tuples for export_all().
+    
+    If path is a directory, it is searched recursively for schema files, and
+    no namespace ids are assigned.
+    
+    Otherwise, it is read as a manifest. Each line of the manifest holds a
+    schema location, optionally followed by a namespace id and a module name,
+    separated by whitespace. Relative file locations are taken to be relative
+    to the manifest. Blank lines and lines starting with # are ignored.
+    
+    When not specified, the module name is taken from the schema's file name.
+    """
+    schemas = []
+    if os.path.isdir(path):
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            if os.path.abspath(dir_path) == CACHE:
+                # Don't pick up copies of downloaded schemas.
+                del dir_names[:]
+                continue
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1] in SCHEMA_EXTENSIONS:
+                    location = os.path.abspath(
+                        os.path.join(dir_path, file_name)
+                        )
+                    schemas.append((location, '', module_name(location)))
+        return schemas
+    
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            location = fields[0]
+            if not urlparse(location)[0]:
+                location = os.path.join(base, location)
+            namespace_id = fields[1] if len(fields) > 1 else ''
+            if len(fields) > 2:
+                name = fields[2]
+            else:
+                name = module_name(location)
+            schemas.append((location, namespace_id, name))
+    return schemas
+
+def module_name(location):
+    """Make a python module name from the file name in a schema location.
+    """
+    name = os.path.splitext(os.path.basename(urlparse(location)[2]))[0]
+    name = re.sub(r'\W', '_', name.lower())
+    if not name or name[0].isdigit():
+        name = '_' + name
+    return name
+
+def _export_job(job):
+    """Export a single schema on behalf of export_all(), in a worker process.
+    """
+    location, namespace_id, export_path, digest = job
+    start = time.time()
+    try:
+        export(location, namespace_id, export_path)
+    except Exception, e:
+        status, error = 'failed', '%s: %s' % (e.__class__.__name__, e)
+    else:
+        status, error = 'exported', None
+    result = (location, export_path, status, time.time() - start, error)
+    return result, digest
+
+def _source_hash(location, namespace_id):
+    """Hash the source of a schema and of the DTD modules it includes.
+    """
+    schema_doc = SchemaDocument(location)
+    documents = [schema_doc]
+    if os.path.splitext(schema_doc.location)[1] == '.dtd':
+        documents = _DtdModules(schema_doc).documents
+    digest = hashlib.sha1(namespace_id)
+    for doc in documents:
+        digest.update('\n%s\n%s' % (doc.location, doc.text))
+    return digest.hexdigest()
+
+def _manifest_path():
+    return os.path.join(CACHE, 'exported.json')
+
+def _read_manifest():
+    try:
+        with open(_manifest_path(), 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def _write_manifest(manifest):
+    text = json.dumps(
+        manifest, indent=1, sort_keys=True, separators=(',', ': ')
+        )
+    _export.to_file([text], _manifest_path(), perms=0644)
+
+
+def format_attribute_set(names):
+    """Return python source assigning names to an allowed_attributes set.
+    """
+    if not names:
+        return '    allowed_attributes = frozenset()\n'
+    lines = textwrap.wrap(
+        ', '.join(repr(name) for name in sorted(names)),
+        width=79,
+        initial_indent=' ' * 8,
+        subsequent_indent=' ' * 8,
+        break_long_words=False,
+        break_on_hyphens=False,
+        )
+    return '    allowed_attributes = frozenset([\n%s\n        ])\n' % (
+        '\n'.join(lines)
+        )
+
 
 class SchemaDocument(object):
     
@@ -109,6 +315,13 @@ class SchemaDocument(object):
         return location, base
     
     def open_location(self):
+        if self.location.startswith('file:'):
+            # Local files are read directly so changes are always seen.
+            f = urllib2.urlopen(self.location)
+            text = f.read()
+            f.close()
+            return text
+        
         cache_relative_path = self.location.split('//', 1)[1]
         cache_path = os.path.join(CACHE, cache_relative_path)
         if os.path.isfile(cache_path):
@@ -129,10 +342,16 @@ class SchemaDocument(object):
 
 class DtdParser(object):
     
+    # Splits an ATTLIST declaration into names, enumerations and literals.
+    _attlist_regex = re.compile(r'\([^)]*\)|"[^"]*"|\'[^\']*\'|[^\s]+')
+    
     def __init__(self, schema_doc, namespace):
         self.entities = {}
         self.elements = []
+        self.attlists = []
         self.opened_urls = []
+        # The schema and every module it includes, in the order opened.
+        self.documents = []
         for declaration in self.yield_declarations(schema_doc):
             self.process_declaration(declaration, schema_doc)
         self.fill_namespace(namespace)
@@ -143,6 +362,7 @@ class DtdParser(object):
         else:
             text = schema_doc.text
             self.opened_urls.append(schema_doc.location)
+            self.documents.append(schema_doc)
         
         while text:
             parts = text.split('>', 1)
@@ -157,57 +377,214 @@ class DtdParser(object):
         if declaration.startswith('ELEMENT'):
             name = declaration.split(None, 2)[1]
             self.elements.append(name)
+        elif declaration.startswith('ATTLIST'):
+            # Entities may be declared after the ATTLIST that uses them, so
+            # these are parsed when the namespace is filled.
+            self.attlists.append(declaration.split(None, 1)[1])
         elif declaration.startswith('ENTITY %'):
-            if ' SYSTEM ' in declaration:
-                mod_uri = declaration.split(None, 4)[4]
-            elif ' PUBLIC ' in declaration:
-                mod_uri = declaration.split(None, 4)[4].split('"')[3]
-            else:
+            mod_uri = self.module_location(declaration)
+            if mod_uri is None:
                 name, contents = declaration.split(None, 3)[2:]
                 name = self.substitute_entities(name)
                 contents = contents.replace('"', '')
                 self.entities[name] = contents
                 return
-            mod_doc = SchemaDocument(mod_uri, schema_doc.base)
-            for mod_declaration in self.yield_declarations(mod_doc):
-                self.process_declaration(mod_declaration, mod_doc)
+            self.open_module(mod_uri, schema_doc)
+    
+    @staticmethod
+    def module_location(declaration):
+        """Return the location of the module an entity declaration includes.
+        
+        None is returned if the entity is not an external one.
+        """
+        if ' SYSTEM ' in declaration:
+            return declaration.split(None, 4)[4].strip().strip('"\'')
+        elif ' PUBLIC ' in declaration:
+            return declaration.split(None, 4)[4].split('"')[3]
+        return None
+    
+    def open_module(self, location, schema_doc):
+        mod_doc = SchemaDocument(location, schema_doc.base)
+        for mod_declaration in self.yield_declarations(mod_doc):
+            self.process_declaration(mod_declaration, mod_doc)
     
     def fill_namespace(self, namespace):
+        attributes = self.parse_attlists()
         for name in self.elements:
             name = self.substitute_entities(name)
             class_name = name[0].title() + name[1:]
-            attribs = {'__module__': namespace, 'tag_name': name}
+            attribs = {
+                '__module__': namespace,
+                'tag_name': name,
+                'allowed_attributes': frozenset(attributes.get(name, ())),
+                }
             new_class = type(class_name, (Element,), attribs)
             setattr(namespace, class_name, new_class)
     
+    def parse_attlists(self):
+        """Return a dictionary mapping element names to attribute names.
+        """
+        attributes = {}
+        for attlist in self.attlists:
+            tokens = self._attlist_regex.findall(
+                self.substitute_entities(attlist)
+                )
+            if not tokens:
+                continue
+            names = attributes.setdefault(tokens[0], set())
+            index = 1
+            while index + 1 < len(tokens):
+                names.add(tokens[index])
+                if tokens[index + 1] == 'NOTATION':
+                    index += 1
+                if tokens[index + 2:index + 3] == ['#FIXED']:
+                    index += 1
+                index += 3
+        return attributes
+    
     def substitute_entities(self, text):
-        while '%' in text:
-            entity_name = text.split('%', 1)[1].split(';', 1)[0]
+        start = 0
+        while '%' in text[start:]:
+            start = text.index('%', start)
+            entity_name = text[start + 1:].split(';', 1)[0]
             if self.entities.has_key(entity_name):
                 sub = self.entities[entity_name]
                 text = text.replace('%%%s;' % entity_name, sub)
+            else:
+                # Not an entity reference, i.e. a literal such as "100%".
+                start += 1
         return text
 
 
+class _DtdModules(DtdParser):
+    """Opens every module a DTD includes, without parsing its elements.
+    
+    This finds the documents to hash for export_all(), cheaply enough to do
+    before handing the parsing itself to the worker processes.
+    """
+    def __init__(self, schema_doc):
+        self.opened_urls = []
+        self.documents = []
+        for declaration in self.yield_declarations(schema_doc):
+            self.process_declaration(declaration, schema_doc)
+    
+    def process_declaration(self, declaration, schema_doc):
+        if declaration.startswith('ENTITY %'):
+            mod_uri = self.module_location(declaration)
+            if mod_uri is not None:
+                self.open_module(mod_uri, schema_doc)
+
+
 class XsdParser(object):
     uri = 'http://www.w3.org/2001/XMLSchema'
     
+    # Named definitions that attribute declarations can be pulled in from.
+    definitions = ('attributeGroup', 'complexType')
+    
+    # Maps a tag to the (attribute, definition) pairs that refer to
+    # definitions by name.
+    references = {
+        'element': (('type', 'complexType'),),
+        'extension': (('base', 'complexType'),),
+        'restriction': (('base', 'complexType'),),
+        'attributeGroup': (('ref', 'attributeGroup'),),
+        }
+    
+    # Tags that permit attributes with any name.
+    wildcards = ('anyAttribute',)
+    
     def __init__(self, schema_doc, namespace):
         doc = minidom.parseString(schema_doc.text)
         elements = doc.getElementsByTagName('element')
         if not elements:
             elements = doc.getElementsByTagNameNS(self.uri, 'element')
+        self.defined = self.find_definitions(doc)
         
         for element in elements:
             name = str(element.getAttribute('name'))
             if not name:
                 continue
             class_name = name[0].title() + name[1:]
-            attribs = {'__module__': namespace, 'tag_name': name}
+            attribs = {
+                '__module__': namespace,
+                'tag_name': name,
+                'allowed_attributes': self.find_attributes(element),
+                }
             new_class = type(class_name, (Element,), attribs)
             setattr(namespace, class_name, new_class)
+    
+    def find_definitions(self, doc):
+        """Map (tag, name) pairs to the named definitions in the schema.
+        """
+        defined = {}
+        for tag in self.definitions:
+            nodes = doc.getElementsByTagName(tag)
+            if not nodes:
+                nodes = doc.getElementsByTagNameNS(self.uri, tag)
+            for node in nodes:
+                name = str(node.getAttribute('name'))
+                if name:
+                    defined.setdefault((tag, name), []).append(node)
+        return defined
+    
+    def find_attributes(self, element):
+        """Return the frozenset of attribute names permitted on an element.
+        
+        None is returned if the schema allows attributes with any name.
+        """
+        names = set()
+        try:
+            self.collect_attributes(element, names, set())
+        except _Wildcard:
+            return None
+        return frozenset(names)
+    
+    def collect_attributes(self, node, names, seen):
+        if node in seen:
+            return
+        seen.add(node)
+        
+        for attribute, tag in self.references.get(node.localName, ()):
+            reference = str(node.getAttribute(attribute)).split(':')[-1]
+            for definition in self.defined.get((tag, reference), ()):
+                self.collect_attributes(definition, names, seen)
+        
+        for child in node.childNodes:
+            if child.nodeType != child.ELEMENT_NODE:
+                continue
+            elif child.localName in self.wildcards:
+                raise _Wildcard()
+            elif child.localName == 'attribute':
+                name = self.attribute_name(child)
+                if not name:
+                    raise _Wildcard()
+                names.add(name)
+            elif child.localName != 'element':
+                # Nested elements declare their own attributes.
+                self.collect_attributes(child, names, seen)
+    
+    def attribute_name(self, node):
+        return str(node.getAttribute('name') or node.getAttribute('ref'))
 
 
 class RngParser(XsdParser):
     uri = 'http://relaxng.org/ns/structure/1.0'
+    definitions = ('define',)
+    references = {
+        'ref': (('name', 'define'),),
+        'parentRef': (('name', 'define'),),
+        }
+    wildcards = ()
+    
+    def attribute_name(self, node):
+        name = node.getAttribute('name')
+        if not name:
+            for child in node.getElementsByTagName('name'):
+                name = ''.join(text.data for text in child.childNodes)
+                break
+        return str(name).strip()
 
+
+class _Wildcard(Exception):
+    """Raised internally when a schema permits any attribute name.
+    """
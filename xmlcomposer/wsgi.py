@@ -0,0 +1,107 @@
+# Copyright (c) 1999, 2012 Michael Saavedra
+# This file may be redistributed under the terms of the GNU LPGL v. 3 or later.
+
+"""Serving generated output from WSGI applications.
+
+Handing the generator from generate() straight to a WSGI server makes the
+server write each line separately. A StreamingResponse instead gathers the
+lines into chunks of a useful size, while still sending what is ready at
+each flush point (see the Renderer.generate() method) before generation
+waits on a CallBack.
+
+>>> from xmlcomposer import Document, Element
+>>> class Page(Element): pass
+>>> def app(environ, start_response):
+...     page = Document(Page('Hello %s!' % environ['REMOTE_USER']))
+...     return respond(start_response, page)
+>>> def start_response(status, headers):
+...     print status, headers
+>>> response = app({'REMOTE_USER': 'Bob'}, start_response)
+200 OK [('Content-Type', 'text/html; charset=utf-8')]
+>>> list(response)
+['<page>Hello Bob!</page>\\n']
+>>> response.close()
+"""
+
+from _layout import DEFAULT_LAYOUT
+from _namespace import BASE_SCOPE
+from _render import Renderer, FLUSH
+
+# The size a StreamingResponse gathers lines into before sending them on.
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+
+class StreamingResponse(object):
+    """A WSGI response body that produces the output of a TextBlock.
+    
+    The block, layout, scope and session args are those of the
+    Renderer.generate() method, and the renderer arg is the Renderer to
+    generate the output with, by default a plain Renderer. The output is
+    produced in chunks of at least chunk_size bytes, except where a flush
+    point ends a chunk early, and at the end. If the output holds unicode
+    strings, each chunk is encoded with the encoding arg.
+    
+    The WSGI server calls close() once the response is sent, or when the
+    client goes away, which stops generation and releases anything the
+    render holds.
+    """
+    def __init__(self, block, session=None, layout=DEFAULT_LAYOUT,
+            scope=BASE_SCOPE, renderer=None, chunk_size=DEFAULT_CHUNK_SIZE,
+            encoding='utf-8'):
+        if renderer is None:
+            renderer = Renderer()
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self._lines = renderer.generate(block, layout, scope, session, True)
+        self._chunks = self._generate_chunks()
+    
+    def __iter__(self):
+        return self._chunks
+    
+    def _generate_chunks(self):
+        chunk = []
+        size = 0
+        try:
+            for line in self._lines:
+                if line is FLUSH:
+                    if not chunk:
+                        continue
+                elif size + len(line) < self.chunk_size:
+                    chunk.append(line)
+                    size += len(line)
+                    continue
+                else:
+                    chunk.append(line)
+                yield self._encode(''.join(chunk))
+                chunk = []
+                size = 0
+            if chunk:
+                yield self._encode(''.join(chunk))
+        finally:
+            self._lines.close()
+    
+    def _encode(self, chunk):
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode(self.encoding)
+        return chunk
+    
+    def close(self):
+        """Stop generating the output.
+        """
+        try:
+            self._chunks.close()
+        finally:
+            self._lines.close()
+
+
+def respond(start_response, block, session=None, status='200 OK',
+        content_type='text/html; charset=utf-8', headers=(), **kwargs):
+    """Start a WSGI response, and return a StreamingResponse as its body.
+    
+    The start_response arg is the function passed to the WSGI application,
+    and the headers arg is a sequence of (name, value) pairs to send in
+    addition to the Content-Type header. The remaining args are passed on to
+    StreamingResponse.
+    """
+    start_response(status, [('Content-Type', content_type)] + list(headers))
+    return StreamingResponse(block, session, **kwargs)